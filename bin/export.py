@@ -0,0 +1,127 @@
+# Copyright 2018 The Texar Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Main script for exporting a trained model for serving.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import yaml
+
+import tensorflow as tf
+
+from texar import utils
+from texar.run import Executor
+
+
+tf.flags.DEFINE_string("config_paths", "",
+                       "Paths to configuration files. This can be a path to a "
+                       "directory in which all files are loaded, or paths to "
+                       "multiple files separated by commas. Setting a key in "
+                       "these files is equivalent to setting the FLAG value "
+                       "with the same name. If a key is set in both config "
+                       "files and FLAG, the value in config files is used.")
+
+tf.flags.DEFINE_string("model", "",
+                       "Name of the model class.")
+tf.flags.DEFINE_string("model_hparams", "{}",
+                       "YAML configuration string for the model "
+                       "hyper-parameters.")
+
+tf.flags.DEFINE_string("data_hparams_train", "{}",
+                       "YAML configuration string for the training data "
+                       "hyper-parameters. Used to create the vocabularies "
+                       "of the model.")
+
+tf.flags.DEFINE_string("model_dir", None,
+                       "The directory where the model checkpoints are saved.")
+tf.flags.DEFINE_string("checkpoint_path", None,
+                       "Path of the checkpoint to export. If None, the "
+                       "latest checkpoint in model_dir is used.")
+tf.flags.DEFINE_string("export_dir", None,
+                       "The directory in which the SavedModel is written, "
+                       "under a timestamped subdirectory.")
+tf.flags.DEFINE_integer("num_warmup_requests", 1,
+                        "Number of warmup requests written with the "
+                        "SavedModel. Set to 0 to disable warmup.")
+tf.flags.DEFINE_boolean("as_text", False,
+                        "Whether to write the SavedModel proto in text "
+                        "format.")
+
+FLAGS = tf.flags.FLAGS
+
+def _process_config():
+    # Loads configs
+    config = utils.load_config(FLAGS.config_paths)
+
+    # Parses YAML FLAGS
+    FLAGS.model_hparams = yaml.load(FLAGS.model_hparams)
+    FLAGS.data_hparams_train = yaml.load(FLAGS.data_hparams_train)
+
+    # Merges
+    final_config = {}
+    for flag_key in dir(FLAGS):
+        if flag_key in {'h', 'help', 'helpshort'}: # Filters out help flags
+            continue
+        flag_value = getattr(FLAGS, flag_key)
+        config_value = config.get(flag_key, None)
+        if isinstance(flag_value, dict) and isinstance(config_value, dict):
+            final_config[flag_key] = utils.dict_patch(config_value, flag_value)
+        elif flag_key in config:
+            final_config[flag_key] = config_value
+        else:
+            final_config[flag_key] = flag_value
+
+    # Processes
+    if final_config['model_dir'] is None \
+            and final_config['checkpoint_path'] is None:
+        raise ValueError('Either `model_dir` or `checkpoint_path` is '
+                         'required.')
+    if final_config['export_dir'] is None:
+        raise ValueError('`export_dir` is required.')
+
+    tf.logging.info("Final Config:\n%s", yaml.dump(final_config))
+
+    return final_config
+
+def main(_):
+    """The entrypoint."""
+
+    config = _process_config()
+
+    run_config = tf.estimator.RunConfig(model_dir=config['model_dir'])
+
+    kwargs = {
+        'data_hparams': config['data_hparams_train'],
+        'hparams': config['model_hparams']
+    }
+    model = utils.check_or_get_instance_with_redundant_kwargs(
+        config['model'], kwargs=kwargs,
+        module_paths=['texar.models', 'texar.custom'])
+
+    exor = Executor(
+        model=model,
+        data_hparams={'train': config['data_hparams_train']},
+        config=run_config)
+
+    exor.export(
+        export_dir=config['export_dir'],
+        checkpoint_path=config['checkpoint_path'],
+        num_warmup_requests=config['num_warmup_requests'],
+        as_text=config['as_text'])
+
+if __name__ == "__main__":
+    tf.logging.set_verbosity(tf.logging.INFO)
+    tf.app.run(main=main)
@@ -0,0 +1,69 @@
+# Copyright 2018 The Texar Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Post-training int8 weight quantization script.
+
+Converts the dense-layer kernels and embedding tables of a trained
+checkpoint into int8 weights with per-channel scales. Optimizer slots are
+copied unchanged. Load the output checkpoint into an inference graph built
+within `texar.utils.quantized_inference_scope`, which keeps the weights in
+int8, and use `texar.utils.evaluate_quantization` to compare the metrics,
+latency and memory of the two models.
+"""
+
+from __future__ import print_function
+
+import argparse
+
+import tensorflow as tf
+
+from texar.utils.quantization import quantize_checkpoint
+
+
+def main():
+  tf.logging.set_verbosity(tf.logging.INFO)
+
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--checkpoint", required=True,
+                      help="The checkpoint (or model directory) to quantize.")
+  parser.add_argument("--output", required=True,
+                      help="The path prefix of the quantized checkpoint.")
+  parser.add_argument("--include", default=None,
+                      help="Only quantize variables matching this regex.")
+  parser.add_argument("--exclude", default=None,
+                      help="Do not quantize variables matching this regex.")
+  parser.add_argument("--row_wise", default="embedder",
+                      help="Variables matching this regex are scaled per row.")
+  parser.add_argument("--min_size", type=int, default=1024,
+                      help="The minimal number of elements to quantize.")
+  args = parser.parse_args()
+
+  checkpoint = args.checkpoint
+  if tf.gfile.IsDirectory(checkpoint):
+    checkpoint = tf.train.latest_checkpoint(checkpoint)
+
+  info = quantize_checkpoint(
+      checkpoint, args.output, include=args.include, exclude=args.exclude,
+      row_wise=args.row_wise, min_size=args.min_size)
+
+  for name in info["quantized_variables"]:
+    tf.logging.info("Quantized %s (max abs error %.3g)"
+                    % (name, info["max_abs_error"][name]))
+  tf.logging.info("Size: %.2f MB -> %.2f MB" % (
+      info["original_bytes"] / 1e6, info["quantized_bytes"] / 1e6))
+  tf.logging.info("Saved quantized checkpoint to %s" % args.output)
+
+
+if __name__ == "__main__":
+  main()
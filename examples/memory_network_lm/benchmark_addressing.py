@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Copyright 2018 The Texar Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks the approximate memory addressing of
+:class:`~texar.modules.MemNetRNNLike` against exact addressing on CPU.
+
+For each memory size, builds two `MemNetRNNLike` modules of the same
+weights, one with exact addressing and one with approximate addressing,
+and reports:
+
+- the recall of the exact top-k slots of the first hop among the slots \
+attended by approximate addressing;
+- the relative error of the logits;
+- the time of a forward pass of each module, where approximate \
+addressing reads the index cached in variables;
+- the time of rebuilding the cached index.
+
+The memory and queries are kept in variables so that no data is fed in the
+timed runs. The word embeddings of the memory are random Gaussian vectors,
+or, if `--embedding_file` is given, a `.npy` embedding matrix (e.g.,
+pre-trained word embeddings) of shape `[vocab_size, memory_dim]`.
+
+To run:
+
+$ python benchmark_addressing.py --memory_sizes=1000,10000,100000
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=invalid-name, protected-access
+
+import time
+import numpy as np
+import tensorflow as tf
+
+from texar.modules import MemNetRNNLike
+from texar.modules.memory.memory_network import MemNetSingleLayer
+
+flags = tf.flags
+
+flags.DEFINE_string("memory_sizes", "1000,10000,100000",
+                    "Comma-separated memory sizes to benchmark.")
+flags.DEFINE_integer("batch_size", 4, "Batch size.")
+flags.DEFINE_integer("vocab_size", 10000,
+                     "Vocabulary size of the memory. Ignored if "
+                     "--embedding_file is given.")
+flags.DEFINE_integer("memory_dim", 150,
+                     "Dimension of memory embeddings. Ignored if "
+                     "--embedding_file is given.")
+flags.DEFINE_string("embedding_file", None,
+                    "Optional .npy file of the word embeddings of the "
+                    "memory.")
+flags.DEFINE_integer("n_hops", 3, "Number of hops.")
+flags.DEFINE_integer("top_k", 32, "Number of attended slots.")
+flags.DEFINE_integer("num_clusters", 256, "Number of clusters.")
+flags.DEFINE_integer("num_probes", 8, "Number of clusters searched.")
+flags.DEFINE_integer("num_kmeans_steps", 3, "Number of k-means steps.")
+flags.DEFINE_float("capacity_factor", 2., "Capacity of cluster lists.")
+flags.DEFINE_integer("num_runs", 20, "Number of timed runs.")
+
+FLAGS = flags.FLAGS
+
+
+def _time(sess, fetches):
+    sess.run(fetches)
+    start = time.time()
+    for _ in range(FLAGS.num_runs):
+        sess.run(fetches)
+    return (time.time() - start) / FLAGS.num_runs * 1000.
+
+
+def _memnet_hparams(memory_size, memory_dim, addressing_type):
+    embed_fn_hparams = {
+        "embedding": {"dim": memory_dim},
+        "temporal_embedding": {"dim": memory_dim},
+    }
+    return {
+        "n_hops": FLAGS.n_hops,
+        "memory_size": memory_size,
+        "relu_dim": memory_dim // 2,
+        "A": embed_fn_hparams,
+        "C": embed_fn_hparams,
+        "addressing": {
+            "type": addressing_type,
+            "top_k": FLAGS.top_k,
+            "num_clusters": FLAGS.num_clusters,
+            "num_probes": FLAGS.num_probes,
+            "num_kmeans_steps": FLAGS.num_kmeans_steps,
+            "capacity_factor": FLAGS.capacity_factor,
+            "exact_max_memory_size": 0,
+        },
+        "name": "memnet_{}".format(addressing_type),
+    }
+
+
+def benchmark(memory_size, embeddings):
+    """Benchmarks a single memory size.
+    """
+    if embeddings is not None:
+        vocab_size, memory_dim = embeddings.shape
+    else:
+        vocab_size, memory_dim = FLAGS.vocab_size, FLAGS.memory_dim
+    rng = np.random.RandomState(0)
+    memory_ = rng.randint(vocab_size, size=[FLAGS.batch_size, memory_size])
+    query_ = rng.randn(FLAGS.batch_size, memory_dim).astype(np.float32)
+
+    tf.reset_default_graph()
+    with tf.device('/cpu:0'):
+        # The data is fed once when initializing the variables
+        memory_init = tf.placeholder(tf.int32, memory_.shape)
+        query_init = tf.placeholder(tf.float32, query_.shape)
+        memory = tf.Variable(memory_init, trainable=False)
+        query = tf.Variable(query_init, trainable=False)
+
+        memnet = MemNetRNNLike(
+            raw_memory_dim=vocab_size,
+            hparams=_memnet_hparams(memory_size, memory_dim, "exact"))
+        logits = memnet(memory=memory, query=query)
+
+        memnet_approx = MemNetRNNLike(
+            raw_memory_dim=vocab_size,
+            hparams=_memnet_hparams(memory_size, memory_dim, "approximate"))
+        # The index is cached in variables, which are initialized after the
+        # weights are copied
+        index = memnet_approx.build_memory_index(memory=memory)
+        cached_index = {
+            name: tf.Variable(value, trainable=False,
+                              collections=[tf.GraphKeys.LOCAL_VARIABLES])
+            for name, value in index.items()}
+        rebuild_index_op = tf.group(*[
+            tf.assign(cached_index[name], value)
+            for name, value in index.items()])
+        logits_approx = memnet_approx(memory_index=cached_index, query=query)
+
+        # Slots attended by the first hop
+        scores = tf.squeeze(
+            tf.matmul(memnet_approx._A(memory), tf.expand_dims(query, 2)), 2)
+        _, exact_slots = tf.nn.top_k(scores, k=FLAGS.top_k)
+        _, approx_slots = MemNetSingleLayer._approximate_address(
+            query, cached_index, FLAGS.top_k, FLAGS.num_probes,
+            return_slots=True)
+
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer(),
+                 {memory_init: memory_, query_init: query_})
+        sess.run([tf.assign(v_approx, v) for v, v_approx in zip(
+            memnet.trainable_variables, memnet_approx.trainable_variables)])
+        if embeddings is not None:
+            sess.run([tf.assign(v, embeddings)
+                      for v in memnet.trainable_variables +
+                      memnet_approx.trainable_variables
+                      if 'word_embedder' in v.name])
+        sess.run(tf.local_variables_initializer())
+
+        logits_, logits_approx_, exact_slots_, approx_slots_ = sess.run(
+            [logits, logits_approx, exact_slots, approx_slots])
+        recall = np.mean([len(np.intersect1d(e, a)) / float(FLAGS.top_k)
+                          for e, a in zip(exact_slots_, approx_slots_)])
+        error = np.linalg.norm(logits_ - logits_approx_) / \
+            np.linalg.norm(logits_)
+        exact_ms = _time(sess, logits)
+        approx_ms = _time(sess, logits_approx)
+        rebuild_ms = _time(sess, rebuild_index_op)
+
+    print('memory_size=%d: recall@%d=%.3f, relative error=%.4f, '
+          'forward: exact %.2fms, approximate %.2fms (%.1fx), index '
+          'rebuild %.2fms' % (
+              memory_size, FLAGS.top_k, recall, error, exact_ms, approx_ms,
+              exact_ms / approx_ms, rebuild_ms))
+
+
+def main(_):
+    """Entrypoint.
+    """
+    embeddings = None
+    if FLAGS.embedding_file:
+        embeddings = np.load(FLAGS.embedding_file).astype(np.float32)
+    for memory_size in FLAGS.memory_sizes.split(','):
+        benchmark(int(memory_size), embeddings)
+
+
+if __name__ == '__main__':
+    tf.app.run(main)
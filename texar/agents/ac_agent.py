@@ -132,6 +132,7 @@ class ActorCriticAgent(EpisodicAgentBase):
                 'actor_hparams': None,
                 'critic_type': 'DQNAgent',
                 'critic_hparams': None,
+                'use_gae': False,
                 'name': 'actor_critic_agent'
             }
 
@@ -161,6 +162,15 @@ class ActorCriticAgent(EpisodicAgentBase):
             argument to the constructor, an critic is created with
             :python:`critic_class(**critic_kwargs, hparams=critic_hparams)`.
 
+        "use_gae" : bool
+            Whether to update the actor once per episode with generalized
+            advantage estimation (GAE), instead of once per step with the
+            advantage of the taken action. If `True`, the state values
+            of the whole episode are computed from the critic in a single
+            batch (as the mean of the Q-values of each state), and the
+            advantages are computed in one call. The GAE lambda is the
+            `"gae_lambda"` hyperparameter of the actor.
+
         "name" : str
             Name of the agent.
         """
@@ -169,6 +179,7 @@ class ActorCriticAgent(EpisodicAgentBase):
             'actor_hparams': None,
             'critic_type': 'DQNAgent',
             'critic_hparams': None,
+            'use_gae': False,
             'name': 'actor_critic_agent'
         }
 
@@ -177,10 +188,15 @@ class ActorCriticAgent(EpisodicAgentBase):
         self._critic._reset()
 
     def _observe(self, reward, terminal, train_policy, feed_dict):
-        self._train_actor(
-            observ=self._observ,
-            action=self._action,
-            feed_dict=feed_dict)
+        if self._hparams.use_gae:
+            self._actor._rewards.append(reward)
+            if terminal and train_policy:
+                self._train_actor_gae(feed_dict=feed_dict)
+        else:
+            self._train_actor(
+                observ=self._observ,
+                action=self._action,
+                feed_dict=feed_dict)
         self._critic._observe(reward, terminal, train_policy, feed_dict)
 
     def _train_actor(self, observ, action, feed_dict):
@@ -197,6 +213,12 @@ class ActorCriticAgent(EpisodicAgentBase):
 
         self._actor._train_policy(feed_dict=feed_dict_)
 
+    def _train_actor_gae(self, feed_dict):
+        qvalues = self._critic._qvalues_from_target(
+            observ=self._actor._observs, batch=True)
+        values = np.mean(qvalues, axis=-1)
+        self._actor._train_policy(feed_dict=feed_dict, values=values)
+
     def get_action(self, observ, feed_dict=None):
         self._observ = observ
         self._action = self._actor.get_action(observ, feed_dict=feed_dict)
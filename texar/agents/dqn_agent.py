@@ -375,10 +375,11 @@ class DQNAgent(EpisodicAgentBase):
             feed_dict={self._observ_inputs: np.array([observ]),
                        tx.global_mode(): tf.estimator.ModeKeys.PREDICT})
 
-    def _qvalues_from_target(self, observ):
+    def _qvalues_from_target(self, observ, batch=False):
+        observ = np.array(observ) if batch else np.array([observ])
         return self._sess.run(
             self._target_outputs['qvalues'],
-            feed_dict={self._observ_inputs: np.array([observ]),
+            feed_dict={self._observ_inputs: observ,
                        tx.global_mode(): tf.estimator.ModeKeys.PREDICT})
 
     def _update_observ_action(self, observ, action):
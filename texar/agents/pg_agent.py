@@ -25,7 +25,8 @@ from texar.agents.episodic_agent_base import EpisodicAgentBase
 from texar.utils import utils
 from texar.core import optimization as opt
 from texar.losses import pg_losses as losses
-from texar.losses.rewards import discount_reward
+from texar.losses.rewards import discount_reward, \
+    generalized_advantage_estimation
 
 
 class PGAgent(EpisodicAgentBase):
@@ -173,6 +174,7 @@ class PGAgent(EpisodicAgentBase):
                 'policy_hparams': None,
                 'discount_factor': 0.95,
                 'normalize_reward': False,
+                'gae_lambda': 1.,
                 'optimization': default_optimization_hparams(),
                 'name': 'pg_agent',
             }
@@ -197,6 +199,12 @@ class PGAgent(EpisodicAgentBase):
             Whether to normalize the discounted reward, by
             `(discounted_reward - mean) / std`.
 
+        "gae_lambda" : float
+            The lambda parameter of generalized advantage estimation
+            (see :func:`~texar.losses.generalized_advantage_estimation`).
+            Used only when state values are given to update the policy
+            (e.g., by an actor-critic agent).
+
         "optimization" : dict
             Hyperparameters of optimization for updating the policy net.
             See :func:`~texar.core.default_optimization_hparams` for details.
@@ -209,6 +217,7 @@ class PGAgent(EpisodicAgentBase):
             'policy_hparams': None,
             'discount_factor': 0.95,
             'normalize_reward': False,
+            'gae_lambda': 1.,
             'optimization': opt.default_optimization_hparams(),
             'name': 'pg_agent',
         }
@@ -241,15 +250,26 @@ class PGAgent(EpisodicAgentBase):
         if terminal and train_policy:
             self._train_policy(feed_dict=feed_dict)
 
-    def _train_policy(self, feed_dict=None):
+    def _train_policy(self, feed_dict=None, values=None):
         """Updates the policy.
 
         Args:
-            TODO
+            feed_dict (dict, optional): Additional feed dict.
+            values (optional): A list of the estimated values of the
+                observed states of the episode. If given, the advantages
+                are computed with generalized advantage estimation in one
+                call. Otherwise, the discounted rewards are used.
         """
-        qvalues = discount_reward(
-            [self._rewards], discount=self._hparams.discount_factor,
-            normalize=self._hparams.normalize_reward)
+        if values is None:
+            qvalues = discount_reward(
+                [self._rewards], discount=self._hparams.discount_factor,
+                normalize=self._hparams.normalize_reward)
+        else:
+            qvalues = generalized_advantage_estimation(
+                [self._rewards], [values],
+                discount=self._hparams.discount_factor,
+                gae_lambda=self._hparams.gae_lambda,
+                normalize=self._hparams.normalize_reward)
         qvalues = qvalues[0, :]
 
         fetches = dict(loss=self._train_op)
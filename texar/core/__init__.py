@@ -25,3 +25,4 @@ from texar.core.layers import *
 from texar.core.replay_memories import *
 from texar.core.explorations import *
 from texar.core.optimization import *
+from texar.core.output_layers import *
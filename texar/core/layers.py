@@ -21,8 +21,12 @@ from __future__ import division
 
 import copy
 
+import numpy as np
 import tensorflow as tf
 import tensorflow.contrib.rnn as rnn
+from tensorflow.python.framework import function
+from tensorflow.python.framework import ops
+from tensorflow.python.util import nest
 
 from texar.hyperparams import HParams
 from texar.utils import utils
@@ -38,6 +42,8 @@ __all__ = [
     "default_rnn_cell_hparams",
     "get_rnn_cell",
     "get_rnn_cell_trainable_variables",
+    "dropout",
+    "recompute_grad",
     "default_regularizer_hparams",
     "get_regularizer",
     "get_initializer",
@@ -50,6 +56,7 @@ __all__ = [
     "get_pooling_layer_hparams",
     "MergeLayer",
     "SequentialLayer",
+    "MultiWidthConv1D",
     "default_conv1d_kwargs",
     "default_conv2d_kwargs",
     "default_conv3d_kwargs",
@@ -92,6 +99,7 @@ def default_rnn_cell_hparams():
             },
             "residual": False,
             "highway": False,
+            "recompute": False,
         }
 
     Here:
@@ -164,6 +172,14 @@ def default_rnn_cell_hparams():
         If True, apply highway connection on the inputs and
         outputs of cell in each layer except the first layer. Ignored if
         "num_layers" = 1.
+
+    "recompute" : bool
+        If `True`, the computation inside the cell of each layer is
+        recomputed in the backward pass instead of storing its intermediate
+        activations, which reduces memory use in training deep stacks at
+        the cost of extra computation. See :func:`~texar.core.recompute_grad`.
+        Dropout and residual/highway connections are applied outside of
+        the recomputed cell.
     """
     return {
         "type": "LSTMCell",
@@ -183,6 +199,7 @@ def default_rnn_cell_hparams():
         },
         "residual": False,
         "highway": False,
+        "recompute": False,
         "@no_typecheck": ["type"]
     }
 
@@ -236,6 +253,11 @@ def get_rnn_cell(hparams=None, mode=None):
         cell = utils.check_or_get_instance(
             cell_type, cell_kwargs, cell_modules, rnn.RNNCell)
 
+        # Dropout and the connections below are applied outside of the
+        # recomputation
+        if hparams["recompute"]:
+            cell = _RecomputeWrapper(cell)
+
         # Optionally add dropout
         if d_hp["input_keep_prob"] < 1.0 or \
                 d_hp["output_keep_prob"] < 1.0 or \
@@ -295,6 +317,226 @@ def get_rnn_cell_trainable_variables(cell):
         # (tf==v1.3). So try to access through the cell in the wrapper.
             cell_ = cell._cell  # pylint: disable=protected-access
 
+# Types of the stateful random ops, which give different values when
+# :func:`recompute_grad` recomputes them
+_RANDOM_OP_TYPES = frozenset([
+    'RandomUniform', 'RandomUniformInt', 'RandomStandardNormal',
+    'TruncatedNormal', 'Multinomial', 'RandomShuffle', 'RandomGamma',
+    'RandomPoisson', 'RandomPoissonV2'])
+
+# The seeds of the stateless random ops of the functions being called by
+# :func:`recompute_grad`, innermost last. Each entry is a list
+# `[seed, number of random ops created so far]`.
+_recompute_seeds = []
+
+def _stateful_random_ops(graph, num_ops_before, outputs):
+    """Returns the stateful random ops that are created in :attr:`graph`
+    after its first :attr:`num_ops_before` ops and that :attr:`outputs`
+    depend on. E.g., random variable initializers are excluded.
+    """
+    new_op_set = set(graph.get_operations()[num_ops_before:])
+    visited = set()
+    stack = [t.op for t in outputs]
+    while stack:
+        op = stack.pop()
+        if op in visited or op not in new_op_set:
+            continue
+        visited.add(op)
+        stack.extend(t.op for t in op.inputs)
+        stack.extend(op.control_inputs)
+    return [op for op in visited if op.type in _RANDOM_OP_TYPES]
+
+def _call_with_seed(fn, inputs, seed):
+    _recompute_seeds.append([tf.to_int32(seed), 0])
+    try:
+        return fn(*inputs)
+    finally:
+        _recompute_seeds.pop()
+
+def dropout(inputs, rate=0.5, noise_shape=None, seed=None, training=False):
+    """Applies dropout to :attr:`inputs`, in the same way as
+    :tf_main:`tf.layers.dropout <layers/dropout>`.
+
+    Within a function called by :func:`recompute_grad`, the dropout mask
+    is drawn with a stateless random op from the seed that
+    :func:`recompute_grad` passes to the function, so that the
+    recomputation in the backward pass uses the same mask as the forward
+    pass. Otherwise, this is equivalent to `tf.layers.dropout`.
+
+    Args:
+        inputs: A float Tensor.
+        rate (float): The dropout rate, between 0 and 1.
+        noise_shape (list, optional): The shape of the binary dropout mask
+            that is broadcast to the shape of :attr:`inputs`. `None`
+            entries take the sizes of :attr:`inputs`.
+        seed (int, optional): The random seed. Ignored within
+            :func:`recompute_grad`.
+        training: A Python bool or a bool Tensor. Whether to apply
+            dropout, e.g., the output of :func:`~texar.utils.is_train_mode`.
+
+    Returns:
+        A Tensor of the same shape as :attr:`inputs`.
+    """
+    if not _recompute_seeds:
+        return tf.layers.dropout(inputs, rate=rate, noise_shape=noise_shape,
+                                 seed=seed, training=training)
+    if rate == 0.:
+        return inputs
+
+    seed_state = _recompute_seeds[-1]
+    # A different seed for each dropout op of the function
+    op_seed = seed_state[0] + tf.constant([0, seed_state[1]])
+    seed_state[1] += 1
+
+    def _dropped():
+        with tf.name_scope("dropout", values=[inputs]):
+            shape = tf.shape(inputs)
+            if noise_shape is not None:
+                # `None` entries take the size of the inputs, as in
+                # `tf.layers.dropout`
+                shape = tf.stack([
+                    shape[i] if dim is None else dim
+                    for i, dim in enumerate(noise_shape)])
+            random = tf.contrib.stateless.stateless_random_uniform(
+                shape, op_seed, dtype=inputs.dtype)
+            keep_prob = 1. - rate
+            mask = tf.floor(keep_prob + random)
+            return inputs / keep_prob * mask
+
+    if isinstance(training, bool):
+        return _dropped() if training else inputs
+    return tf.cond(training, _dropped, lambda: tf.identity(inputs))
+
+def recompute_grad(fn, inputs, variables):
+    """Calls :attr:`fn` on :attr:`inputs` without keeping the intermediate
+    activations of :attr:`fn` for the backward pass. Instead, :attr:`fn`
+    is called again in the backward pass to recompute them (i.e., gradient
+    checkpointing). Only :attr:`inputs` and the outputs are kept, which
+    reduces the activation memory of a stack of blocks to that of the block
+    boundaries, at the cost of one more forward pass of each block.
+
+    :attr:`fn` is called again under the current variable scope with
+    `reuse=True`, so it must get its variables with
+    :tf_main:`tf.get_variable <get_variable>` or reuse them, e.g., through
+    Texar modules or `tf.layers` layers. The variables must be reference
+    (i.e., non-resource) variables, which is the default. Tensors captured
+    by :attr:`fn` (other than :attr:`inputs`) receive no gradients.
+
+    :attr:`fn` must compute the same outputs when it is called again. To
+    use dropout in :attr:`fn`, use :func:`~texar.core.dropout`, which draws
+    the masks from a random seed that is passed to both calls of
+    :attr:`fn`. Other random ops, e.g., `tf.nn.dropout`, raise an error.
+
+    Args:
+        fn (callable): A function that takes :attr:`inputs` as positional
+            arguments and returns a Tensor or a list of Tensors.
+        inputs (list): A list of Tensors.
+        variables (list or callable): The trainable variables used by
+            :attr:`fn`, e.g., the variables of the modules or the RNN
+            cell called in :attr:`fn`, or a function returning them that is
+            called after :attr:`fn` (e.g., if :attr:`fn` creates the
+            variables).
+
+    Returns:
+        The outputs of :attr:`fn`.
+
+    Raises:
+        ValueError: If :attr:`fn` contains stateful random ops.
+    """
+    inputs = [tf.convert_to_tensor(x) for x in inputs]
+    var_scope = tf.get_variable_scope()
+    # Float, as int32 arguments of functions are not supported on GPUs
+    seed = tf.floor(tf.random_uniform([2], maxval=2.**24))
+
+    graph = tf.get_default_graph()
+    num_ops = len(graph.get_operations())
+    outputs = _call_with_seed(fn, inputs, seed)
+    is_list = isinstance(outputs, (list, tuple))
+    outputs = list(outputs) if is_list else [outputs]
+    random_ops = _stateful_random_ops(graph, num_ops, outputs)
+    if random_ops:
+        raise ValueError(
+            '`fn` of `recompute_grad` must not contain stateful random ops, '
+            'which give different values in the recomputation, but got %s. '
+            'Use `texar.core.dropout` for dropout.'
+            % sorted(op.name for op in random_ops))
+
+    if callable(variables):
+        variables = variables()
+    variables = list(variables)
+    var_values = [tf.convert_to_tensor(var) for var in variables]
+    num_inputs = len(inputs)
+    num_vars = len(variables)
+
+    def _grad_fn(op, *output_grads):
+        fn_inputs = list(op.inputs[:num_inputs])
+        fn_seed = op.inputs[num_inputs + num_vars]
+        # The tensors through which the recomputation reads the variables.
+        # Within a while loop (e.g., an RNN), these are the loop-invariant
+        # entries of the variables into the backward loop, so that the
+        # gradients are of the current time step.
+        var_reads = [tf.identity(var).op.inputs[0] for var in variables]
+        with tf.control_dependencies(output_grads):
+            with tf.variable_scope(var_scope, reuse=True):
+                recomputed = _call_with_seed(fn, fn_inputs, fn_seed)
+        if not is_list:
+            recomputed = [recomputed]
+        grads = tf.gradients(list(recomputed), fn_inputs + var_reads,
+                             grad_ys=list(output_grads))
+        return grads + [None] * (1 + len(outputs))
+
+    arg_types = [t.dtype for t in inputs + var_values + [seed] + outputs]
+
+    @function.Defun(*arg_types,
+                    func_name='recompute_grad_%d' % ops.uid(),
+                    python_grad_func=_grad_fn,
+                    shape_func=lambda _: [t.get_shape() for t in outputs])
+    def _identity(*args):
+        return tuple(tf.identity(t) for t in args[num_inputs + num_vars + 1:])
+
+    rets = _identity(*(inputs + var_values + [seed] + outputs))
+    rets = list(rets) if isinstance(rets, (list, tuple)) else [rets]
+    for ret, output in zip(rets, outputs):
+        ret.set_shape(output.get_shape())
+    return rets if is_list else rets[0]
+
+class _RecomputeWrapper(rnn.RNNCell):
+    """Cell wrapper that recomputes the wrapped cell in the backward pass.
+    See :func:`recompute_grad`.
+    """
+
+    def __init__(self, cell):
+        super(_RecomputeWrapper, self).__init__()
+        self._cell = cell
+
+    @property
+    def state_size(self):
+        return self._cell.state_size
+
+    @property
+    def output_size(self):
+        return self._cell.output_size
+
+    def zero_state(self, batch_size, dtype):
+        with tf.name_scope(type(self).__name__ + "ZeroState",
+                           values=[batch_size]):
+            return self._cell.zero_state(batch_size, dtype)
+
+    @property
+    def trainable_weights(self):
+        return get_rnn_cell_trainable_variables(self._cell)
+
+    def __call__(self, inputs, state, scope=None):
+        def _fn(inputs_, *flat_state):
+            state_ = nest.pack_sequence_as(state, list(flat_state))
+            outputs, new_state = self._cell(inputs_, state_, scope=scope)
+            return [outputs] + nest.flatten(new_state)
+
+        rets = recompute_grad(
+            _fn, [inputs] + nest.flatten(state),
+            variables=lambda: get_rnn_cell_trainable_variables(self._cell))
+        return rets[0], nest.pack_sequence_as(state, rets[1:])
+
 def default_regularizer_hparams():
     """Returns the hyperparameters and their default values of a variable
     regularizer:
@@ -963,6 +1205,137 @@ class SequentialLayer(tf.layers.Layer):
         return self._layers
 
 
+class MultiWidthConv1D(tf.layers.Layer):
+    """A subclass of :tf_main:`tf.layers.Layer <layers/Layer>`.
+    Parallel 1D convolutions of different kernel widths, each followed by
+    reduce pooling over time, with the pooled outputs concatenated.
+
+    The result equals a :class:`MergeLayer` that concatenates the
+    :class:`SequentialLayer` (Conv1D, :class:`MaxReducePooling1D` or
+    :class:`AverageReducePooling1D`) of each width, but all widths are
+    computed with a single convolution whose kernels are zero-padded to
+    the largest width, and a single pooling.
+
+    Args:
+        filters (int): Number of filters of each kernel width.
+        kernel_size (list): A list of `int`, the kernel widths.
+        pooling (str): Either `"max"` or `"average"`.
+        padding (str): Either `"valid"` or `"same"`, as in
+            :tf_main:`tf.layers.Conv1D <layers/Conv1D>`.
+        activation (optional): Activation function applied to the
+            convolution outputs.
+        use_bias (bool): Whether to add a bias to the convolution outputs.
+        kernel_initializer (optional): Initializer of the kernels.
+        bias_initializer (optional): Initializer of the biases.
+        kernel_regularizer (optional): Regularizer of the kernels.
+        bias_regularizer (optional): Regularizer of the biases.
+        trainable (bool): Whether the layer should be trained.
+        name (str, optional): Name of the layer.
+
+    Inputs are of shape `[batch_size, time, dim]`, and outputs are of shape
+    `[batch_size, len(kernel_size) * filters]`.
+    """
+
+    def __init__(self,
+                 filters,
+                 kernel_size,
+                 pooling='max',
+                 padding='valid',
+                 activation=None,
+                 use_bias=True,
+                 kernel_initializer=None,
+                 bias_initializer=tf.zeros_initializer(),
+                 kernel_regularizer=None,
+                 bias_regularizer=None,
+                 trainable=True,
+                 name=None,
+                 **kwargs):
+        super(MultiWidthConv1D, self).__init__(
+            trainable=trainable, name=name, **kwargs)
+        if pooling not in ('max', 'average'):
+            raise ValueError("Unknown pooling: '%s'" % pooling)
+        if padding.lower() not in ('valid', 'same'):
+            raise ValueError("Unknown padding: '%s'" % padding)
+        self._filters = filters
+        self._kernel_size = list(kernel_size)
+        self._pooling = pooling
+        self._padding = padding.lower()
+        self._activation = activation
+        self._use_bias = use_bias
+        self._kernel_initializer = kernel_initializer
+        self._bias_initializer = bias_initializer
+        self._kernel_regularizer = kernel_regularizer
+        self._bias_regularizer = bias_regularizer
+        self._kernels = []
+        self._biases = []
+
+    def build(self, input_shape):
+        input_dim = tf.TensorShape(input_shape)[-1].value
+        # Creates the variables of each width in the same order as the
+        # parallel Conv1D layers
+        for i, width in enumerate(self._kernel_size):
+            self._kernels.append(self.add_variable(
+                'kernel_%d' % i,
+                shape=[width, input_dim, self._filters],
+                initializer=self._kernel_initializer,
+                regularizer=self._kernel_regularizer))
+            if self._use_bias:
+                self._biases.append(self.add_variable(
+                    'bias_%d' % i,
+                    shape=[self._filters],
+                    initializer=self._bias_initializer,
+                    regularizer=self._bias_regularizer))
+        self.built = True
+
+    def compute_output_shape(self, input_shape):
+        input_shape = tf.TensorShape(input_shape).as_list()
+        return tf.TensorShape(
+            [input_shape[0], len(self._kernel_size) * self._filters])
+
+    def call(self, inputs):
+        max_width = max(self._kernel_size)
+        min_width = min(self._kernel_size)
+        kernels = []
+        for width, kernel in zip(self._kernel_size, self._kernels):
+            # Aligns the window of each width with that of its own conv
+            left = 0
+            if self._padding == 'same':
+                left = (max_width - 1) // 2 - (width - 1) // 2
+            kernels.append(
+                tf.pad(kernel, [[left, max_width - width - left], [0, 0],
+                                [0, 0]]))
+        kernel = tf.concat(kernels, axis=2)
+
+        if self._padding == 'same':
+            left = (max_width - 1) // 2
+            paddings = [[0, 0], [left, max_width - 1 - left], [0, 0]]
+        else:
+            paddings = [[0, 0], [0, max_width - min_width], [0, 0]]
+        outputs = tf.nn.conv1d(tf.pad(inputs, paddings), kernel, stride=1,
+                               padding='VALID')
+        if self._use_bias:
+            outputs = tf.nn.bias_add(outputs, tf.concat(self._biases, 0))
+        if self._activation is not None:
+            outputs = self._activation(outputs)
+
+        if self._padding == 'same':
+            if self._pooling == 'max':
+                return tf.reduce_max(outputs, axis=1)
+            return tf.reduce_mean(outputs, axis=1)
+
+        # With 'valid' padding, narrower kernels have more output positions,
+        # the trailing ones of the wider kernels are masked out
+        widths = np.repeat(self._kernel_size, self._filters)
+        num_valid = tf.shape(inputs)[1] - tf.constant(widths, tf.int32) + 1
+        positions = tf.expand_dims(tf.range(tf.shape(outputs)[1]), 1)
+        mask = tf.cast(positions < num_valid, outputs.dtype)
+        if self._pooling == 'max':
+            return tf.reduce_max(
+                outputs * mask + (1. - mask) * outputs.dtype.min, axis=1)
+        return tf.reduce_sum(outputs * mask, axis=1) / \
+            tf.cast(num_valid, outputs.dtype)
+
+
 def _common_default_conv_dense_kwargs():
     """Returns the default keyword argument values that are common to
     convolution layers.
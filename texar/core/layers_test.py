@@ -125,6 +125,140 @@ class GetRNNCellTest(tf.test.TestCase):
                 feed_dict={mode: tf.estimator.ModeKeys.EVAL})
             self.assertEqual(output_test.shape[0], batch_size)
 
+    def test_recompute(self):
+        """Tests gradients of a cell stack recomputed in the backward pass.
+        """
+        hparams = {
+            "kwargs": {
+                "num_units": 16
+            },
+            "num_layers": 3,
+        }
+        inputs = tf.random_uniform([4, 7, 8])
+        outputs = {}
+        grads = {}
+        for recompute in [False, True]:
+            hparams["recompute"] = recompute
+            cell = layers.get_rnn_cell(hparams)
+            with tf.variable_scope('rnn_{}'.format(recompute)) as vs:
+                outputs[recompute], _ = tf.nn.dynamic_rnn(
+                    cell, inputs, dtype=tf.float32)
+            variables = tf.trainable_variables(vs.name)
+            self.assertEqual(len(variables), 6)
+            grads[recompute] = tf.gradients(
+                tf.reduce_sum(outputs[recompute] ** 2), variables + [inputs])
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            # Copies the variables so that the two stacks are the same
+            for var, var_r in zip(tf.trainable_variables('rnn_False'),
+                                  tf.trainable_variables('rnn_True')):
+                sess.run(var_r.assign(var))
+            inputs_ = sess.run(inputs)
+            feed_dict = {inputs: inputs_}
+            outputs_, grads_ = sess.run([outputs, grads], feed_dict)
+            np.testing.assert_allclose(outputs_[True], outputs_[False],
+                                       rtol=1e-5, atol=1e-5)
+            for grad, grad_r in zip(grads_[False], grads_[True]):
+                np.testing.assert_allclose(grad_r, grad, rtol=1e-4, atol=1e-5)
+
+    def test_recompute_grad_dropout(self):
+        """Tests that the recomputation of :func:`recompute_grad` uses the
+        dropout mask of the forward pass, with the dropout switched by a
+        mode placeholder.
+        """
+        rate = 0.5
+        inputs = tf.random_uniform([16, 32], minval=1., maxval=2.)
+        mode = tf.placeholder(tf.string)
+
+        def _fn(x):
+            w = tf.get_variable('w', [32], initializer=tf.ones_initializer())
+            return layers.dropout(x * w, rate=rate,
+                                  training=tx.utils.is_train_mode(mode))
+
+        with tf.variable_scope('recompute_dropout') as vs:
+            outputs = layers.recompute_grad(
+                _fn, [inputs], variables=vs.trainable_variables)
+        w = tf.trainable_variables(vs.name)[0]
+        grad_x, grad_w = tf.gradients(tf.reduce_sum(outputs), [inputs, w])
+        # Gradients given the mask of the forward pass
+        mask = tf.to_float(tf.not_equal(outputs, 0.)) / (1. - rate)
+        expected_grad_x = mask * w
+        expected_grad_w = tf.reduce_sum(mask * inputs, axis=0)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            for _ in range(3):
+                grad_x_, grad_w_, expected_grad_x_, expected_grad_w_ = \
+                    sess.run([grad_x, grad_w, expected_grad_x,
+                              expected_grad_w],
+                             {mode: tf.estimator.ModeKeys.TRAIN})
+                self.assertLess(np.sum(grad_x_ == 0.), grad_x_.size)
+                self.assertGreater(np.sum(grad_x_ == 0.), 0)
+                np.testing.assert_allclose(grad_x_, expected_grad_x_)
+                np.testing.assert_allclose(grad_w_, expected_grad_w_,
+                                           rtol=1e-5)
+
+            grad_x_ = sess.run(grad_x, {mode: tf.estimator.ModeKeys.EVAL})
+            np.testing.assert_allclose(grad_x_, np.ones([16, 32]))
+
+    def test_recompute_grad_stateful_random(self):
+        """Tests that :func:`recompute_grad` rejects stateful random ops.
+        """
+        inputs = tf.ones([4, 8])
+        with self.assertRaises(ValueError):
+            layers.recompute_grad(
+                lambda x: tf.nn.dropout(x, keep_prob=0.5), [inputs],
+                variables=[])
+
+    def test_recompute_grad_while_loop(self):
+        """Tests :func:`recompute_grad` called within a while loop, with
+        dropout.
+        """
+        num_steps = 5
+        inputs = tf.random_uniform([4, 8])
+        mode = tf.placeholder(tf.string)
+
+        def _loop(recompute):
+            with tf.variable_scope('loop_{}'.format(recompute)):
+                w = tf.get_variable('w', [8, 8])
+
+            def _fn(x):
+                y = tf.tanh(tf.matmul(x, w))
+                return layers.dropout(y, rate=0.3,
+                                      training=tx.utils.is_train_mode(mode))
+
+            def _body(i, x):
+                if recompute:
+                    x = layers.recompute_grad(_fn, [x], variables=[w])
+                else:
+                    x = _fn(x)
+                return i + 1, x
+
+            _, outputs = tf.while_loop(
+                lambda i, _: i < num_steps, _body, [0, inputs])
+            return w, outputs
+
+        grads = {}
+        for recompute in [False, True]:
+            w, outputs = _loop(recompute)
+            grads[recompute] = tf.gradients(
+                tf.reduce_sum(outputs ** 2), [w, inputs])
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run(tf.trainable_variables('loop_True')[0].assign(
+                tf.trainable_variables('loop_False')[0]))
+            feed_dict = {inputs: sess.run(inputs),
+                         mode: tf.estimator.ModeKeys.EVAL}
+            grads_ = sess.run(grads, feed_dict)
+            for grad, grad_r in zip(grads_[False], grads_[True]):
+                np.testing.assert_allclose(grad_r, grad, rtol=1e-4, atol=1e-5)
+
+            feed_dict[mode] = tf.estimator.ModeKeys.TRAIN
+            for grad_r in sess.run(grads[True], feed_dict):
+                self.assertTrue(np.all(np.isfinite(grad_r)))
+
 
 class GetActivationFnTest(tf.test.TestCase):
     """Tests :func:`texar.core.layers.get_activation_fn`.
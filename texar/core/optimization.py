@@ -20,7 +20,10 @@ from __future__ import print_function
 from __future__ import division
 
 import re
+import collections
+
 import tensorflow as tf
+from tensorflow.python.framework import ops
 
 from texar.hyperparams import HParams
 from texar.utils import utils
@@ -65,6 +68,7 @@ def default_optimization_hparams():
                 "kwargs": {}
             },
             "gradient_noise_scale": None,
+            "accumulation_steps": 1,
             "name": None
         }
 
@@ -144,8 +148,25 @@ def default_optimization_hparams():
         :python:`clipped_grads = [clip_fn(t=grad, **kwargs) for grad in grads]`
         (e.g., for :tf_main:`tf.clip_by_value <clip_by_value>`).
 
+        Sparse gradients (:tf_main:`IndexedSlices <IndexedSlices>`, e.g.,
+        those of embedding lookups) are passed to the function with
+        duplicate indices summed. The TensorFlow clipping functions above
+        keep them sparse.
+
     "gradient_noise_scale" : float, optional
-        Adds 0-mean normal noise scaled by this value to gradient.
+        Adds 0-mean normal noise scaled by this value to gradient. For
+        sparse gradients, noise is added only to the rows present in the
+        gradient, so that they are kept sparse.
+
+    "accumulation_steps" : int
+        Number of micro-batches to accumulate gradients over before each
+        update. If `> 1`, each run of the training op created by
+        :func:`~texar.core.get_train_op` adds the gradients of the current
+        micro-batch to non-trainable buffers, and every
+        :attr:`"accumulation_steps"`-th run applies the averaged gradients
+        (with gradient noise and clipping) and resets the buffers. The
+        global step, and hence learning rate decay, counts the updates
+        rather than the micro-batches.
     """
     return {
         "optimizer": {
@@ -166,6 +187,7 @@ def default_optimization_hparams():
             "kwargs": {}
         },
         "gradient_noise_scale": None,
+        "accumulation_steps": 1,
         # TODO(zhiting): allow module-level control of gradient_multipliers
         "name": None
     }
@@ -350,6 +372,139 @@ def get_gradient_clip_fn(hparams=None):
 
     return grad_clip_fn
 
+def _deduplicate_indexed_slices(values, indices):
+    """Sums `values` associated with any non-unique `indices`.
+
+    Returns:
+        A tuple of `(summed_values, unique_indices)`.
+    """
+    unique_indices, new_index_positions = tf.unique(indices)
+    summed_values = tf.unsorted_segment_sum(
+        values, new_index_positions, tf.shape(unique_indices)[0])
+    return summed_values, unique_indices
+
+def _add_scaled_noise_to_gradients(grads_and_vars, gradient_noise_scale):
+    """Adds scaled noise to gradients. Unlike the counterpart in
+    :tf_main:`tf.contrib.layers.optimize_loss <contrib/layers/optimize_loss>`,
+    noise of sparse gradients is added to the values only, which keeps the
+    gradients sparse.
+    """
+    noisy_grads_and_vars = []
+    for grad, var in grads_and_vars:
+        if grad is None:
+            noisy_grads_and_vars.append((grad, var))
+            continue
+        if isinstance(grad, tf.IndexedSlices):
+            noise = tf.truncated_normal(
+                tf.shape(grad.values), dtype=grad.values.dtype)
+            grad = tf.IndexedSlices(
+                grad.values + noise * gradient_noise_scale,
+                grad.indices, grad.dense_shape)
+        else:
+            noise = tf.truncated_normal(tf.shape(grad), dtype=grad.dtype)
+            grad = grad + noise * gradient_noise_scale
+        noisy_grads_and_vars.append((grad, var))
+    return noisy_grads_and_vars
+
+def _get_gradient_transform_fn(hparams):
+    """Creates a function that adds gradient noise and clips gradients
+    according to the hyperparameters, keeping sparse gradients
+    (:tf_main:`IndexedSlices <IndexedSlices>`) sparse.
+
+    Returns:
+        function or `None`: A function that takes and returns a list of
+        `(gradients, variables)` tuples, or `None` if neither gradient noise
+        nor gradient clipping is specified.
+    """
+    grad_clip_fn = get_gradient_clip_fn(hparams["gradient_clip"])
+    gradient_noise_scale = hparams["gradient_noise_scale"]
+    if grad_clip_fn is None and gradient_noise_scale is None:
+        return None
+
+    def _transform_fn(grads_and_vars):
+        # Duplicate indices are summed first so that noise and clipping
+        # (e.g., the norm of the gradient) act on the same values as they
+        # would on the dense gradient.
+        grads_and_vars_ = []
+        for grad, var in grads_and_vars:
+            if isinstance(grad, tf.IndexedSlices):
+                values, indices = _deduplicate_indexed_slices(
+                    grad.values, grad.indices)
+                grad = tf.IndexedSlices(values, indices, grad.dense_shape)
+            grads_and_vars_.append((grad, var))
+
+        if gradient_noise_scale is not None:
+            grads_and_vars_ = _add_scaled_noise_to_gradients(
+                grads_and_vars_, gradient_noise_scale)
+        if grad_clip_fn is not None:
+            grads_and_vars_ = grad_clip_fn(grads_and_vars_)
+        return grads_and_vars_
+
+    return _transform_fn
+
+def _get_accumulated_train_op(loss, variables, optimizer, learning_rate,
+                              global_step, increment_global_step,
+                              grad_transform_fn, hparams):
+    """Creates a training op that accumulates gradients over
+    `hparams["accumulation_steps"]` runs before each update.
+    A helper function of :func:`get_train_op`.
+    """
+    # pylint: disable=too-many-locals
+    accumulation_steps = hparams["accumulation_steps"]
+    if global_step is None:
+        global_step = tf.train.get_global_step()
+
+    with tf.variable_scope(hparams["name"], "OptimizeLoss",
+                           [loss, global_step]):
+        if not isinstance(optimizer, tf.train.Optimizer):
+            optimizer = get_optimizer(learning_rate, global_step, hparams)
+        if variables is None:
+            variables = tf.trainable_variables()
+
+        grads_and_vars = [
+            (grad, var) for grad, var in
+            optimizer.compute_gradients(loss, variables) if grad is not None]
+        if not grads_and_vars:
+            raise ValueError("No gradients for the variables to optimize.")
+
+        accum_ops, accum_grads_and_vars = [], []
+        for grad, var in grads_and_vars:
+            accum_grad = tf.Variable(
+                tf.zeros(var.shape, dtype=var.dtype.base_dtype),
+                trainable=False, name=var.op.name + "/accum_grad")
+            # Sparse gradients only touch the rows in the micro-batch
+            if isinstance(grad, tf.IndexedSlices):
+                accum_ops.append(
+                    tf.scatter_add(accum_grad, grad.indices, grad.values))
+            else:
+                accum_ops.append(tf.assign_add(accum_grad, grad))
+            accum_grads_and_vars.append((accum_grad, var))
+
+        accum_counter = tf.Variable(
+            0, trainable=False, dtype=tf.int32, name="accum_counter")
+        with tf.control_dependencies(accum_ops):
+            counter = tf.assign_add(accum_counter, 1)
+
+        def _apply_fn():
+            grads_and_vars_ = [(accum_grad / accumulation_steps, var)
+                               for accum_grad, var in accum_grads_and_vars]
+            if grad_transform_fn is not None:
+                grads_and_vars_ = grad_transform_fn(grads_and_vars_)
+            apply_op = optimizer.apply_gradients(
+                grads_and_vars_,
+                global_step=global_step if increment_global_step else None)
+            with tf.control_dependencies([apply_op]):
+                reset_ops = [tf.assign(accum_grad, tf.zeros_like(accum_grad))
+                             for accum_grad, _ in accum_grads_and_vars]
+            with tf.control_dependencies(reset_ops):
+                return tf.identity(loss)
+
+        train_tensor = tf.cond(
+            tf.equal(counter % accumulation_steps, 0),
+            _apply_fn, lambda: tf.identity(loss))
+
+    return train_tensor
+
 def _get_static_lr(learning_rate=None, optimizer_class=None, hparams=None):
     """Return the base static learning_rate.
         A helper function for creating the optimization function.
@@ -415,6 +570,17 @@ def get_train_op(loss, variables=None,
     This is a wrapper of :tf_main:`tf.contrib.layers.optimize_loss
     <contrib/layers/optimize_loss>`.
 
+    Gradient noise and gradient clipping keep sparse gradients (e.g., those
+    of :class:`~texar.modules.WordEmbedder` lookups) as
+    :tf_main:`IndexedSlices <IndexedSlices>`, so that optimizers with sparse
+    updates (e.g., :class:`~texar.core.AdamWeightDecayOptimizer` with
+    `lazy=True`, or :tf_main:`LazyAdamOptimizer
+    <contrib/opt/LazyAdamOptimizer>`) only touch the rows used in the batch.
+
+    If :attr:`"accumulation_steps"` in :attr:`hparams` is `> 1`, gradients
+    are accumulated over that many runs of the training op before each
+    update. See :func:`~texar.core.default_optimization_hparams`.
+
     Args:
         loss: A scalar Tensor representing the loss to minimize.
         variables (optional): A list of Variables to optimize. If
@@ -445,7 +611,12 @@ def get_train_op(loss, variables=None,
         train_op: the operator used for variables optimization.
     """
     hparams = HParams(hparams, default_optimization_hparams())
-    grad_clip_fn = get_gradient_clip_fn(hparams["gradient_clip"])
+    grad_transform_fn = _get_gradient_transform_fn(hparams)
+
+    if hparams["accumulation_steps"] > 1:
+        return _get_accumulated_train_op(
+            loss, variables, optimizer, learning_rate, global_step,
+            increment_global_step, grad_transform_fn, hparams)
 
     if not isinstance(optimizer, tf.train.Optimizer):
         opt_hparams = hparams["optimizer"]
@@ -458,8 +629,8 @@ def get_train_op(loss, variables=None,
             global_step=global_step,
             learning_rate=learning_rate,
             optimizer=optimizer_fn,
-            gradient_noise_scale=hparams["gradient_noise_scale"],
-            clip_gradients=grad_clip_fn,
+            gradient_noise_scale=None,
+            clip_gradients=grad_transform_fn,
             learning_rate_decay_fn=lr_decay_fn,
             variables=variables,
             name=hparams["name"],
@@ -471,8 +642,8 @@ def get_train_op(loss, variables=None,
             global_step=global_step,
             learning_rate=None,
             optimizer=optimizer,
-            gradient_noise_scale=hparams["gradient_noise_scale"],
-            clip_gradients=grad_clip_fn,
+            gradient_noise_scale=None,
+            clip_gradients=grad_transform_fn,
             variables=variables,
             name=hparams["name"],
             increment_global_step=increment_global_step)
@@ -486,6 +657,27 @@ class AdamWeightDecayOptimizer(tf.train.Optimizer):
     Except that in `apply_gradient` function, we add the support to increment
     the passed global step parameter, to make it more compatible to
     tf.train.Optimizer implementation.
+
+    If `lazy` is `True`, sparse gradients (e.g., of embedding lookups) are
+    applied lazily: only the rows of the variable, and of the moment
+    estimates, that appear in the gradient are updated (and weight-decayed).
+    This makes the cost of each step scale with the number of rows in the
+    batch rather than the size of the variable. Otherwise, sparse gradients
+    are converted to dense ones, and all rows are updated.
+
+    If `fused` is `True`, variables with dense gradients are grouped by
+    dtype and by whether weight decay applies, and each group is updated
+    with a few ops on flat buffers, instead of a set of ops per variable.
+    Note that every step concatenates the gradients (and, with weight
+    decay, the parameters) of each group into one buffer, i.e., copies all
+    of them once, which trades memory traffic for fewer ops. The moment
+    estimates of each group are stored in a single flat variable under the
+    variable scope of the optimizer name, named after the first variable of
+    the group and the group key (e.g.,
+    `"AdamWeightDecayOptimizer/dense/kernel/float32_decay/adam_m"`), so
+    checkpoints are not interchangeable between the fused and unfused
+    versions. The sizes of the variables of each group are stored along,
+    and the update fails if a restored group does not match them.
     """
 
     def __init__(self,
@@ -495,6 +687,8 @@ class AdamWeightDecayOptimizer(tf.train.Optimizer):
                  beta_2=0.999,
                  epsilon=1e-6,
                  exclude_from_weight_decay=None,
+                 lazy=False,
+                 fused=False,
                  name="AdamWeightDecayOptimizer"):
         """Constructs a AdamWeightDecayOptimizer."""
         super(AdamWeightDecayOptimizer, self).__init__(False, name)
@@ -505,6 +699,10 @@ class AdamWeightDecayOptimizer(tf.train.Optimizer):
         self.beta_2 = beta_2
         self.epsilon = epsilon
         self.exclude_from_weight_decay = exclude_from_weight_decay
+        self.lazy = lazy
+        self.fused = fused
+        self._exclude_from_weight_decay_re = [
+            re.compile(r) for r in exclude_from_weight_decay or []]
 
     # pylint: disable=too-many-locals
     def apply_gradients(self, grads_and_vars, global_step=None, name=None):
@@ -512,24 +710,29 @@ class AdamWeightDecayOptimizer(tf.train.Optimizer):
         # pylint: disable=redefined-argument-from-local
         with tf.name_scope(name, self._name) as name:
             assignments = []
+            fused_groups = collections.OrderedDict()
             for (grad, param) in grads_and_vars:
                 if grad is None or param is None:
                     continue
 
                 param_name = self._get_variable_name(param.name)
 
-                m = tf.get_variable(
-                    name=param_name + "/adam_m",
-                    shape=param.shape.as_list(),
-                    dtype=tf.float32,
-                    trainable=False,
-                    initializer=tf.zeros_initializer())
-                v = tf.get_variable(
-                    name=param_name + "/adam_v",
-                    shape=param.shape.as_list(),
-                    dtype=tf.float32,
-                    trainable=False,
-                    initializer=tf.zeros_initializer())
+                if isinstance(grad, tf.IndexedSlices):
+                    if self.lazy:
+                        m, v = self._get_moments(
+                            param_name, param.shape.as_list())
+                        assignments.extend(self._apply_lazy_sparse(
+                            grad, param, param_name, m, v))
+                        continue
+                    grad = tf.convert_to_tensor(grad)
+
+                if self.fused:
+                    group = (param.dtype.base_dtype,
+                             self._do_use_weight_decay(param_name))
+                    fused_groups.setdefault(group, []).append((grad, param))
+                    continue
+
+                m, v = self._get_moments(param_name, param.shape.as_list())
 
                 # Standard Adam update.
                 next_m = (tf.multiply(self.beta_1, m)\
@@ -561,6 +764,10 @@ class AdamWeightDecayOptimizer(tf.train.Optimizer):
                      m.assign(next_m),
                      v.assign(next_v)])
 
+            for (dtype, use_weight_decay), group in fused_groups.items():
+                assignments.extend(self._apply_fused(
+                    group, dtype, use_weight_decay))
+
             update_ops = assignments
             if global_step is None:
                 apply_updates = self._finish(update_ops, name)
@@ -572,14 +779,109 @@ class AdamWeightDecayOptimizer(tf.train.Optimizer):
 
         return apply_updates
 
+    def _get_moments(self, name, shape, dtype=tf.float32):
+        """Gets or creates the first and second moment estimates.
+        """
+        # Creates the moments outside any control flow, e.g., when
+        # the update is conditional with gradient accumulation.
+        with ops.init_scope():
+            m = tf.get_variable(
+                name=name + "/adam_m",
+                shape=shape,
+                dtype=dtype,
+                trainable=False,
+                initializer=tf.zeros_initializer())
+            v = tf.get_variable(
+                name=name + "/adam_v",
+                shape=shape,
+                dtype=dtype,
+                trainable=False,
+                initializer=tf.zeros_initializer())
+        return m, v
+
+    def _apply_fused(self, grads_and_vars, dtype, use_weight_decay):
+        """Applies Adam update to a group of variables of the same dtype and
+        weight decay setting, using flat buffers.
+        """
+        grads, params = zip(*grads_and_vars)
+        sizes = [param.shape.num_elements() for param in params]
+        if any(size is None for size in sizes):
+            raise ValueError(
+                "`fused=True` requires variables of fully-defined shapes.")
+
+        # Deterministic names that do not depend on the name scope, e.g.,
+        # on the number of `apply_gradients` calls in the graph
+        group_name = "%s/%s%s" % (
+            self._get_variable_name(params[0].name), dtype.name,
+            "_decay" if use_weight_decay else "")
+        with tf.variable_scope(self._name):
+            m, v = self._get_moments(group_name, [sum(sizes)], dtype=dtype)
+            with ops.init_scope():
+                group_sizes = tf.get_variable(
+                    name=group_name + "/fused_sizes",
+                    dtype=tf.int64,
+                    trainable=False,
+                    initializer=tf.constant(sizes, dtype=tf.int64))
+
+        # Fails if the moments are restored from a different group
+        check_sizes = tf.assert_equal(
+            group_sizes, tf.constant(sizes, dtype=tf.int64),
+            message="The restored fused moments of %s are of a different "
+                    "group of variables." % group_name)
+        with tf.control_dependencies([check_sizes]):
+            flat_grad = tf.concat(
+                [tf.reshape(grad, [-1]) for grad in grads], 0)
+
+        next_m = (tf.multiply(self.beta_1, m)
+                  + tf.multiply(1.0 - self.beta_1, flat_grad))
+        next_v = (tf.multiply(self.beta_2, v)
+                  + tf.multiply(1.0 - self.beta_2, tf.square(flat_grad)))
+
+        update = next_m / (tf.sqrt(next_v) + self.epsilon)
+
+        if use_weight_decay:
+            flat_param = tf.concat(
+                [tf.reshape(param, [-1]) for param in params], 0)
+            update += self.weight_decay_rate * flat_param
+
+        updates_with_lr = tf.split(self.learning_rate * update, sizes)
+
+        assignments = [m.assign(next_m), v.assign(next_v)]
+        for param, update_with_lr in zip(params, updates_with_lr):
+            assignments.append(param.assign_sub(
+                tf.reshape(update_with_lr, tf.shape(param))))
+        return assignments
+
+    def _apply_lazy_sparse(self, grad, param, param_name, m, v):
+        """Applies Adam update of the sparse :attr:`grad` to the rows of
+        :attr:`param`, :attr:`m`, and :attr:`v` indexed by the gradient.
+        """
+        values, indices = _deduplicate_indexed_slices(
+            grad.values, grad.indices)
+
+        next_m = (tf.multiply(self.beta_1, tf.gather(m, indices))
+                  + tf.multiply(1.0 - self.beta_1, values))
+        next_v = (tf.multiply(self.beta_2, tf.gather(v, indices))
+                  + tf.multiply(1.0 - self.beta_2, tf.square(values)))
+
+        update = next_m / (tf.sqrt(next_v) + self.epsilon)
+
+        if self._do_use_weight_decay(param_name):
+            update += self.weight_decay_rate * tf.gather(param, indices)
+
+        update_with_lr = self.learning_rate * update
+
+        return [tf.scatter_sub(param, indices, update_with_lr),
+                tf.scatter_update(m, indices, next_m),
+                tf.scatter_update(v, indices, next_v)]
+
     def _do_use_weight_decay(self, param_name):
         """Whether to use L2 weight decay for `param_name`."""
         if not self.weight_decay_rate:
             return False
-        if self.exclude_from_weight_decay:
-            for r in self.exclude_from_weight_decay:
-                if re.search(r, param_name) is not None:
-                    return False
+        for r in self._exclude_from_weight_decay_re:
+            if r.search(param_name) is not None:
+                return False
         return True
 
     def _get_variable_name(self, param_name):
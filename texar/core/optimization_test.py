@@ -8,11 +8,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+
 import numpy as np
 
 import tensorflow as tf
 
 import texar.core.optimization as opt
+from texar.hyperparams import HParams
 from texar.utils import utils
 
 
@@ -154,5 +157,155 @@ class OptimizationTest(tf.test.TestCase):
         train_op = opt.get_train_op(loss)
         self.assertTrue(tf.contrib.framework.is_tensor(train_op))
 
+    def test_accumulation_steps(self):
+        """Tests gradient accumulation in get_train_op.
+        """
+        for opt_type in ["GradientDescentOptimizer",
+                         "AdamWeightDecayOptimizer"]:
+            with tf.Graph().as_default():
+                var = tf.Variable([1., 1.])
+                scale = tf.placeholder(tf.float32, [])
+                loss = tf.reduce_sum(var) * scale
+                global_step = tf.train.get_or_create_global_step()
+                hparams = {
+                    "optimizer": {
+                        "type": opt_type,
+                        "kwargs": {"learning_rate": 0.1}
+                    },
+                    "gradient_clip": {
+                        "type": "clip_by_global_norm",
+                        "kwargs": {"clip_norm": 10.}
+                    },
+                    "accumulation_steps": 2
+                }
+                train_op = opt.get_train_op(loss, hparams=hparams)
+
+                with self.test_session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    sess.run(train_op, feed_dict={scale: 1.})
+                    var_, step_ = sess.run([var, global_step])
+                    np.testing.assert_array_equal(var_, [1., 1.])
+                    self.assertEqual(step_, 0)
+
+                    sess.run(train_op, feed_dict={scale: 3.})
+                    var_, step_ = sess.run([var, global_step])
+                    self.assertEqual(step_, 1)
+                    if opt_type == "GradientDescentOptimizer":
+                        # Averaged gradient is 2.
+                        np.testing.assert_allclose(var_, [0.8, 0.8])
+                    else:
+                        self.assertTrue(np.all(var_ < 1.))
+
+    def test_fused_adam_weight_decay(self):
+        """Tests that the fused AdamWeightDecayOptimizer gives the same
+        updates as the unfused one.
+        """
+        def _run(fused):
+            with tf.Graph().as_default():
+                weight = tf.Variable(tf.ones([3, 4]), name="weight")
+                bias = tf.Variable(tf.ones([4]), name="bias")
+                loss = tf.reduce_sum(tf.square(
+                    tf.matmul(tf.ones([2, 3]), weight) + bias))
+                optimizer = opt.AdamWeightDecayOptimizer(
+                    learning_rate=0.01, weight_decay_rate=0.1,
+                    exclude_from_weight_decay=["bias"], fused=fused)
+                train_op = optimizer.minimize(loss)
+                with self.test_session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    for _ in range(3):
+                        sess.run(train_op)
+                    return sess.run([weight, bias])
+
+        for fused_, unfused_ in zip(_run(True), _run(False)):
+            np.testing.assert_allclose(fused_, unfused_, rtol=1e-5)
+
+        # A second fused update in the same graph creates its own moments,
+        # named after the variables
+        with tf.Graph().as_default():
+            weights = [tf.Variable(tf.ones([3]), name="weight_{}".format(i))
+                       for i in range(2)]
+            optimizer = opt.AdamWeightDecayOptimizer(
+                learning_rate=0.01, fused=True)
+            for weight in weights:
+                optimizer.minimize(tf.reduce_sum(tf.square(weight)))
+            self.assertEqual(len(tf.global_variables()), 2 + 3 * 2)
+            self.assertIn(
+                "AdamWeightDecayOptimizer/weight_1/float32/adam_m:0",
+                [var.name for var in tf.global_variables()])
+
+    def test_fused_adam_weight_decay_restore(self):
+        """Tests that the fused moments restored from a different group of
+        variables are rejected.
+        """
+        ckpt_path = os.path.join(self.get_temp_dir(), "fused.ckpt")
+
+        def _train_op(shapes):
+            weights = [tf.Variable(tf.ones(shape), name="w{}".format(i))
+                       for i, shape in enumerate(shapes)]
+            loss = tf.add_n([tf.reduce_sum(tf.square(w)) for w in weights])
+            optimizer = opt.AdamWeightDecayOptimizer(
+                learning_rate=0.01, fused=True)
+            train_op = optimizer.minimize(loss)
+            saver = tf.train.Saver(
+                [var for var in tf.global_variables()
+                 if var.name.startswith("AdamWeightDecayOptimizer/")])
+            return train_op, saver
+
+        with tf.Graph().as_default():
+            train_op, saver = _train_op([[2], [2], [3]])
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run(train_op)
+                saver.save(sess, ckpt_path)
+
+        # Same total size, different variable sizes
+        with tf.Graph().as_default():
+            train_op, saver = _train_op([[2], [3], [2]])
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                saver.restore(sess, ckpt_path)
+                with self.assertRaises(tf.errors.InvalidArgumentError):
+                    sess.run(train_op)
+
+    def test_sparse_gradients(self):
+        """Tests that gradient noise and clipping keep sparse gradients
+        sparse, and lazy updates of :class:`AdamWeightDecayOptimizer`.
+        """
+        embedding = tf.Variable(tf.ones([10, 4]))
+        ids = tf.constant([1, 3, 1])
+        loss = tf.reduce_sum(tf.nn.embedding_lookup(embedding, ids))
+        grads_and_vars = [(tf.gradients(loss, embedding)[0], embedding)]
+
+        hparams = opt.default_optimization_hparams()
+        hparams["gradient_clip"] = {
+            "type": "clip_by_global_norm",
+            "kwargs": {"clip_norm": 1.}
+        }
+        hparams["gradient_noise_scale"] = 0.
+        transform_fn = opt._get_gradient_transform_fn( # pylint: disable=W0212
+            HParams(hparams, None))
+        grad, _ = transform_fn(grads_and_vars)[0]
+        self.assertIsInstance(grad, tf.IndexedSlices)
+
+        optimizer = opt.AdamWeightDecayOptimizer(
+            learning_rate=0.1, weight_decay_rate=0.01, lazy=True)
+        train_op = optimizer.apply_gradients(grads_and_vars)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            grad_ = sess.run(tf.convert_to_tensor(grad))
+            self.assertAlmostEqual(np.linalg.norm(grad_), 1., places=5)
+
+            sess.run(train_op)
+            embedding_ = sess.run(embedding)
+            updated = np.zeros(10, dtype=bool)
+            updated[[1, 3]] = True
+            np.testing.assert_array_equal(embedding_[~updated], 1.)
+            # Without bias correction, the first step of each touched entry
+            # is `lr * (1 - beta_1) / sqrt(1 - beta_2)` plus weight decay.
+            step = 0.1 * (0.1 / np.sqrt(0.001) + 0.01)
+            np.testing.assert_allclose(
+                embedding_[updated], 1. - step, rtol=1e-4)
+
 if __name__ == "__main__":
     tf.test.main()
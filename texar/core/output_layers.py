@@ -0,0 +1,370 @@
+# Copyright 2018 The Texar Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Output layers that avoid the full softmax over a large vocabulary.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import tensorflow as tf
+
+from texar.utils.mode import is_train_mode
+from texar.utils.shapes import shape_list
+from texar.utils.variables import add_variable
+
+# pylint: disable=too-many-arguments, too-many-instance-attributes
+# pylint: disable=invalid-name, arguments-differ, protected-access
+
+__all__ = [
+    "SampledSoftmaxLayer",
+    "AdaptiveSoftmaxLayer",
+    "shortlist_projection",
+]
+
+def _flatten(inputs, labels=None):
+    """Reshapes :attr:`inputs` into `[num_tokens, dim]` and :attr:`labels`
+    into `[num_tokens]`.
+    """
+    inputs = tf.reshape(inputs, [-1, shape_list(inputs)[-1]])
+    if labels is not None:
+        labels = tf.reshape(labels, [-1])
+    return inputs, labels
+
+
+class SampledSoftmaxLayer(tf.layers.Layer):
+    """An output layer over a large vocabulary that is trained with
+    :tf_main:`sampled softmax <nn/sampled_softmax_loss>`.
+
+    Calling the layer computes the full logits, e.g., for decoding in
+    inference. :meth:`loss` computes the sampled softmax loss in `TRAIN`
+    mode, and the full softmax cross entropy otherwise.
+
+    When used as the `output_layer` of a decoder (e.g.,
+    :class:`~texar.modules.BasicRNNDecoder` or
+    :class:`~texar.modules.TransformerDecoder`), `"train_greedy"` decoding
+    skips the layer and returns the decoder hidden states as `logits`,
+    which can be passed to
+    :func:`~texar.losses.sequence_sparse_softmax_cross_entropy_with_projection`
+    together with the layer.
+
+    Args:
+        units (int): The vocabulary size.
+        num_sampled (int): The number of classes to sample per batch in
+            training.
+        use_bias (bool): Whether to add a bias to the logits.
+        kernel_initializer (optional): Initializer of the weights.
+        remove_accidental_hits (bool): Whether to remove sampled classes
+            that equal the target classes.
+        trainable (bool): Whether the layer should be trained.
+        name (str, optional): Name of the layer.
+
+    The default sampler is log-uniform, which assumes the vocabulary is
+    sorted by decreasing frequency.
+    """
+
+    def __init__(self,
+                 units,
+                 num_sampled,
+                 use_bias=True,
+                 kernel_initializer=None,
+                 remove_accidental_hits=True,
+                 trainable=True,
+                 name=None,
+                 **kwargs):
+        super(SampledSoftmaxLayer, self).__init__(
+            trainable=trainable, name=name, **kwargs)
+        self.units = units
+        self.num_sampled = num_sampled
+        self.use_bias = use_bias
+        self.kernel_initializer = kernel_initializer
+        self.remove_accidental_hits = remove_accidental_hits
+        self.kernel = None
+        self.bias = None
+
+    def build(self, input_shape):
+        input_shape = tf.TensorShape(input_shape)
+        dim = input_shape[-1].value
+        # `[units, dim]` as required by `tf.nn.sampled_softmax_loss`
+        self.kernel = self.add_weight(
+            'kernel', shape=[self.units, dim],
+            initializer=self.kernel_initializer, dtype=self.dtype,
+            trainable=True)
+        if self.use_bias:
+            self.bias = self.add_weight(
+                'bias', shape=[self.units],
+                initializer=tf.zeros_initializer(), dtype=self.dtype,
+                trainable=True)
+        self.built = True
+
+    def compute_output_shape(self, input_shape):
+        input_shape = tf.TensorShape(input_shape)
+        return input_shape[:-1].concatenate(self.units)
+
+    def _logits(self, inputs):
+        logits = tf.matmul(inputs, self.kernel, transpose_b=True)
+        if self.use_bias:
+            logits += self.bias
+        return logits
+
+    def call(self, inputs):
+        shape = shape_list(inputs)
+        logits = self._logits(_flatten(inputs)[0])
+        return tf.reshape(logits, shape[:-1] + [self.units])
+
+    def loss(self, inputs, labels, mode=None):
+        """Computes the loss of each token.
+
+        Args:
+            inputs: The hidden states of shape `[..., dim]`.
+            labels: The target class indexes of shape `[...]`.
+            mode (optional): A Tensor taking value in
+                :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`.
+                Sampled softmax is used in `TRAIN` mode. If `None`,
+                :func:`texar.global_mode` is used.
+
+        Returns:
+            A Tensor of the same shape as :attr:`labels`.
+        """
+        if not self.built:
+            # Creates the variables under the scope of the layer
+            self(inputs)
+        shape = shape_list(labels)
+        inputs, labels = _flatten(inputs, labels)
+        bias = self.bias if self.use_bias else \
+            tf.zeros([self.units], dtype=inputs.dtype)
+
+        def _sampled_loss():
+            return tf.nn.sampled_softmax_loss(
+                weights=self.kernel,
+                biases=bias,
+                labels=tf.expand_dims(tf.to_int64(labels), 1),
+                inputs=inputs,
+                num_sampled=self.num_sampled,
+                num_classes=self.units,
+                remove_accidental_hits=self.remove_accidental_hits)
+
+        def _full_loss():
+            return tf.nn.sparse_softmax_cross_entropy_with_logits(
+                labels=labels, logits=self._logits(inputs))
+
+        losses = tf.cond(is_train_mode(mode), _sampled_loss, _full_loss)
+        return tf.reshape(losses, shape)
+
+
+class AdaptiveSoftmaxLayer(tf.layers.Layer):
+    """An adaptive softmax output layer (Grave et al., 2017) that clusters
+    the vocabulary by frequency.
+
+    A head softmax covers the most frequent words and one entry for each
+    tail cluster. The probability of a tail word is the head probability
+    of its cluster times its probability within the cluster. Tail clusters
+    use hidden states projected to smaller dimensions, so rare words cost
+    less computation. The vocabulary must be sorted by decreasing
+    frequency.
+
+    Calling the layer computes the log-probabilities over the full
+    vocabulary (which can be used as logits, e.g., in decoding).
+    :meth:`loss` computes the loss of each token, evaluating the tail
+    clusters only for the tokens that fall in them, in both training and
+    inference.
+
+    When used as the `output_layer` of a decoder, `"train_greedy"`
+    decoding skips the layer and returns the decoder hidden states as
+    `logits`. See :class:`SampledSoftmaxLayer`.
+
+    Args:
+        units (int): The vocabulary size.
+        cutoffs (list): Increasing boundaries of the clusters, e.g.,
+            `[2000, 10000]` makes a head of words `[0, 2000)` and tail
+            clusters of words `[2000, 10000)` and `[10000, units)`.
+        div_value (float): The hidden dimension of the `i`-th tail cluster
+            is `dim // div_value**(i+1)`.
+        use_bias (bool): Whether to add biases to the logits.
+        kernel_initializer (optional): Initializer of the weights.
+        trainable (bool): Whether the layer should be trained.
+        name (str, optional): Name of the layer.
+    """
+
+    def __init__(self,
+                 units,
+                 cutoffs,
+                 div_value=4.,
+                 use_bias=True,
+                 kernel_initializer=None,
+                 trainable=True,
+                 name=None,
+                 **kwargs):
+        super(AdaptiveSoftmaxLayer, self).__init__(
+            trainable=trainable, name=name, **kwargs)
+        cutoffs = list(cutoffs)
+        if cutoffs != sorted(cutoffs) or len(set(cutoffs)) != len(cutoffs) \
+                or cutoffs[0] <= 0 or cutoffs[-1] >= units:
+            raise ValueError(
+                "`cutoffs` must be strictly increasing integers in "
+                "(0, units).")
+        self.units = units
+        self.cutoffs = cutoffs + [units]
+        self.div_value = div_value
+        self.use_bias = use_bias
+        self.kernel_initializer = kernel_initializer
+        self._head = None
+        self._tails = []
+
+    @property
+    def num_clusters(self):
+        """The number of tail clusters.
+        """
+        return len(self.cutoffs) - 1
+
+    def build(self, input_shape):
+        input_shape = tf.TensorShape(input_shape)
+        dim = input_shape[-1].value
+        head_size = self.cutoffs[0] + self.num_clusters
+        self._head = tf.layers.Dense(
+            head_size, use_bias=self.use_bias,
+            kernel_initializer=self.kernel_initializer, name='head')
+        self._head.build([None, dim])
+        self._tails = []
+        for i in range(self.num_clusters):
+            proj_dim = max(1, int(dim // (self.div_value ** (i + 1))))
+            proj = tf.layers.Dense(
+                proj_dim, use_bias=False,
+                kernel_initializer=self.kernel_initializer,
+                name='tail_%d_proj' % i)
+            proj.build([None, dim])
+            output = tf.layers.Dense(
+                self.cutoffs[i + 1] - self.cutoffs[i],
+                use_bias=self.use_bias,
+                kernel_initializer=self.kernel_initializer,
+                name='tail_%d' % i)
+            output.build([None, proj_dim])
+            self._tails.append((proj, output))
+
+        for layer in [self._head] + \
+                [l for tail in self._tails for l in tail]:
+            add_variable(layer._trainable_weights, self._trainable_weights)
+        self.built = True
+
+    def compute_output_shape(self, input_shape):
+        input_shape = tf.TensorShape(input_shape)
+        return input_shape[:-1].concatenate(self.units)
+
+    def _tail_logits(self, i, inputs):
+        proj, output = self._tails[i]
+        return output(proj(inputs))
+
+    def call(self, inputs):
+        shape = shape_list(inputs)
+        inputs = _flatten(inputs)[0]
+        head_log_probs = tf.nn.log_softmax(self._head(inputs))
+        log_probs = [head_log_probs[:, :self.cutoffs[0]]]
+        for i in range(self.num_clusters):
+            cluster_log_prob = head_log_probs[
+                :, self.cutoffs[0] + i:self.cutoffs[0] + i + 1]
+            log_probs.append(cluster_log_prob + tf.nn.log_softmax(
+                self._tail_logits(i, inputs)))
+        log_probs = tf.concat(log_probs, axis=1)
+        return tf.reshape(log_probs, shape[:-1] + [self.units])
+
+    def loss(self, inputs, labels, mode=None):
+        """Computes the negative log-likelihood of each token.
+
+        Args:
+            inputs: The hidden states of shape `[..., dim]`.
+            labels: The target class indexes of shape `[...]`.
+            mode: Unused.
+
+        Returns:
+            A Tensor of the same shape as :attr:`labels`.
+        """
+        # pylint: disable=unused-argument
+        if not self.built:
+            # Creates the variables under the scope of the layer
+            self(inputs)
+        shape = shape_list(labels)
+        inputs, labels = _flatten(inputs, labels)
+        labels = tf.to_int32(labels)
+        num_tokens = tf.shape(labels, out_type=tf.int64)
+
+        # Words in tail clusters are mapped to their cluster entries
+        head_labels = labels
+        for i in range(self.num_clusters):
+            head_labels = tf.where(
+                labels >= self.cutoffs[i],
+                tf.fill(tf.shape(labels), self.cutoffs[0] + i),
+                head_labels)
+        losses = tf.nn.sparse_softmax_cross_entropy_with_logits(
+            labels=head_labels, logits=self._head(inputs))
+
+        for i in range(self.num_clusters):
+            low, high = self.cutoffs[i], self.cutoffs[i + 1]
+            indices = tf.where(tf.logical_and(labels >= low, labels < high))
+            tail_losses = tf.nn.sparse_softmax_cross_entropy_with_logits(
+                labels=tf.gather_nd(labels, indices) - low,
+                logits=self._tail_logits(i, tf.gather_nd(inputs, indices)))
+            losses += tf.scatter_nd(indices, tail_losses, num_tokens)
+
+        return tf.reshape(losses, shape)
+
+
+def shortlist_projection(output_layer, candidate_ids):
+    """Returns the parameters of an output layer restricted to a shortlist
+    of candidate classes, e.g., a per-batch candidate vocabulary used to
+    speed up decoding in inference.
+
+    Args:
+        output_layer: A :tf_main:`tf.layers.Dense <layers/Dense>` without
+            activation, an instance of :class:`SampledSoftmaxLayer`, or a
+            Tensor of shape `[num_classes, dim]` (e.g., the word embedding
+            in the case of tied embedding).
+        candidate_ids: A 1D int Tensor of the candidate class indexes.
+
+    Returns:
+        A tuple `(kernel, bias)`, where `kernel` is of shape
+        `[dim, num_candidates]`, and `bias` is of shape `[num_candidates]`
+        or `None`. The logits of the candidates are
+        `matmul(inputs, kernel) + bias`.
+    """
+    if isinstance(output_layer, tf.layers.Dense):
+        if output_layer.activation is not None:
+            raise ValueError("`output_layer` must not have an activation.")
+        kernel = tf.gather(output_layer.kernel, candidate_ids, axis=1)
+        bias = output_layer.bias if output_layer.use_bias else None
+    elif isinstance(output_layer, SampledSoftmaxLayer):
+        kernel = tf.transpose(tf.gather(output_layer.kernel, candidate_ids))
+        bias = output_layer.bias if output_layer.use_bias else None
+    elif isinstance(output_layer, (tf.Tensor, tf.Variable)):
+        kernel = tf.transpose(tf.gather(output_layer, candidate_ids))
+        bias = None
+    else:
+        raise ValueError(
+            "Shortlisting is not supported for output layer: {}".format(
+                output_layer))
+
+    if bias is not None:
+        bias = tf.gather(bias, candidate_ids)
+    return kernel, bias
+
+def _shortlist_index(candidate_ids, class_id):
+    """Returns the position of :attr:`class_id` in :attr:`candidate_ids`,
+    asserting that it is one of the candidates.
+    """
+    is_class = tf.to_int32(tf.equal(candidate_ids, class_id))
+    assert_op = tf.assert_greater(
+        tf.reduce_sum(is_class), 0,
+        message="`candidate_ids` must contain the end token.")
+    with tf.control_dependencies([assert_op]):
+        return tf.to_int32(tf.argmax(is_class))
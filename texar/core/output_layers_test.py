@@ -0,0 +1,98 @@
+#
+"""
+Unit tests for output layers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.core.output_layers import SampledSoftmaxLayer, \
+    AdaptiveSoftmaxLayer
+from texar.modules.decoders.rnn_decoders import BasicRNNDecoder
+
+# pylint: disable=invalid-name
+
+class OutputLayersTest(tf.test.TestCase):
+    """Tests output layers.
+    """
+
+    def setUp(self):
+        tf.test.TestCase.setUp(self)
+        self._batch_size = 8
+        self._max_time = 5
+        self._dim = 32
+        self._vocab_size = 100
+        self._inputs = tf.random_uniform(
+            [self._batch_size, self._max_time, self._dim])
+        self._labels = tf.random_uniform(
+            [self._batch_size, self._max_time], maxval=self._vocab_size,
+            dtype=tf.int32)
+
+    def test_sampled_softmax(self):
+        """Tests :class:`~texar.core.SampledSoftmaxLayer`.
+        """
+        layer = SampledSoftmaxLayer(self._vocab_size, num_sampled=10)
+        logits = layer(self._inputs)
+        self.assertEqual(logits.shape, tf.TensorShape(
+            [self._batch_size, self._max_time, self._vocab_size]))
+        self.assertEqual(len(layer.trainable_variables), 2)
+
+        train_loss = layer.loss(self._inputs, self._labels,
+                                mode=tf.estimator.ModeKeys.TRAIN)
+        eval_loss = layer.loss(self._inputs, self._labels,
+                               mode=tf.estimator.ModeKeys.EVAL)
+        full_loss = tf.nn.sparse_softmax_cross_entropy_with_logits(
+            labels=self._labels, logits=logits)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            train_loss_, eval_loss_, full_loss_ = sess.run(
+                [train_loss, eval_loss, full_loss])
+            self.assertEqual(train_loss_.shape,
+                             (self._batch_size, self._max_time))
+            np.testing.assert_allclose(eval_loss_, full_loss_, rtol=1e-5)
+
+    def test_adaptive_softmax(self):
+        """Tests :class:`~texar.core.AdaptiveSoftmaxLayer`.
+        """
+        layer = AdaptiveSoftmaxLayer(self._vocab_size, cutoffs=[20, 50])
+        log_probs = layer(self._inputs)
+        self.assertEqual(log_probs.shape, tf.TensorShape(
+            [self._batch_size, self._max_time, self._vocab_size]))
+        # head, 2 x (projection, output)
+        self.assertEqual(len(layer.trainable_variables), 2 + 2 * 3)
+
+        loss = layer.loss(self._inputs, self._labels)
+        full_loss = -tf.reduce_sum(
+            log_probs * tf.one_hot(self._labels, self._vocab_size), axis=-1)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            log_probs_, loss_, full_loss_ = sess.run(
+                [log_probs, loss, full_loss])
+            np.testing.assert_allclose(
+                np.exp(log_probs_).sum(axis=-1), 1., rtol=1e-5)
+            np.testing.assert_allclose(loss_, full_loss_, rtol=1e-5)
+
+    def test_decoder_train_greedy(self):
+        """Tests decoders skip the output layer in train_greedy decoding.
+        """
+        layer = AdaptiveSoftmaxLayer(self._vocab_size, cutoffs=[20])
+        decoder = BasicRNNDecoder(output_layer=layer)
+        outputs, _, _ = decoder(
+            decoding_strategy='train_greedy',
+            inputs=self._inputs,
+            sequence_length=[self._max_time] * self._batch_size)
+        cell_dim = decoder.hparams.rnn_cell.kwargs.num_units
+        self.assertEqual(outputs.logits.shape[-1], cell_dim)
+        # cell-kernel, cell-bias, and the output layer variables
+        self.assertEqual(len(decoder.trainable_variables), 2 + 5)
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -20,10 +20,13 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from texar.utils import shapes
+
 def binary_adversarial_losses(real_data,
                               fake_data,
                               discriminator_fn,
-                              mode="max_real"):
+                              mode="max_real",
+                              single_pass=False):
     """Computes adversarial losses of real/fake binary discrimination game.
 
     .. role:: python(code)
@@ -50,19 +53,36 @@ def binary_adversarial_losses(real_data,
             - **"min_fake"**: minimizing the generator loss is to minimize the\
             probability of fake data being classified as fake.
 
+        single_pass (bool): If set, :attr:`real_data` and :attr:`fake_data`
+            are concatenated along the first dimension (with the other
+            dimensions zero-padded at the end to the larger size), and
+            `discriminator_fn` is called only once. The logits are then
+            split back. `discriminator_fn` must give the same logits
+            regardless of the padding.
+
     Returns:
         A tuple `(generator_loss, discriminator_loss)` each of which is
         a scalar Tensor, loss to be minimized.
     """
-    real_logits = discriminator_fn(real_data)
-    if isinstance(real_logits, (list, tuple)):
-        real_logits = real_logits[0]
+    if single_pass:
+        real_data = tf.convert_to_tensor(real_data)
+        fake_data = tf.convert_to_tensor(fake_data)
+        logits = discriminator_fn(
+            shapes.pad_and_concat([real_data, fake_data], 0))
+        if isinstance(logits, (list, tuple)):
+            logits = logits[0]
+        real_logits, fake_logits = tf.split(
+            logits, [tf.shape(real_data)[0], tf.shape(fake_data)[0]], axis=0)
+    else:
+        real_logits = discriminator_fn(real_data)
+        if isinstance(real_logits, (list, tuple)):
+            real_logits = real_logits[0]
+        fake_logits = discriminator_fn(fake_data)
+        if isinstance(fake_logits, (list, tuple)):
+            fake_logits = fake_logits[0]
+
     real_loss = tf.reduce_mean(tf.nn.sigmoid_cross_entropy_with_logits(
         logits=real_logits, labels=tf.ones_like(real_logits)))
-
-    fake_logits = discriminator_fn(fake_data)
-    if isinstance(fake_logits, (list, tuple)):
-        fake_logits = fake_logits[0]
     fake_loss = tf.reduce_mean(tf.nn.sigmoid_cross_entropy_with_logits(
         logits=fake_logits, labels=tf.zeros_like(fake_logits)))
 
@@ -34,6 +34,22 @@ class AdvLossesTest(tf.test.TestCase):
             self.assertAlmostEqual(gen_loss_, -gen_loss_2_)
             self.assertAlmostEqual(disc_loss_, disc_loss_2_)
 
+    def test_single_pass(self):
+        """Tests :meth:`~texar.losses.adv_losses.binary_adversarial_losses`
+        with `single_pass=True`.
+        """
+        real_data = tf.random_uniform([16, 10])
+        fake_data = tf.random_uniform([8, 7])
+        discriminator_fn = lambda x: tf.reduce_sum(x, axis=1) - 4.
+        gen_loss, disc_loss = binary_adversarial_losses(
+            real_data, fake_data, discriminator_fn)
+        gen_loss_sp, disc_loss_sp = binary_adversarial_losses(
+            real_data, fake_data, discriminator_fn, single_pass=True)
+
+        with self.test_session() as sess:
+            losses_ = sess.run([gen_loss, disc_loss, gen_loss_sp, disc_loss_sp])
+            self.assertAllClose(losses_[:2], losses_[2:])
+
 
 if __name__ == "__main__":
     tf.test.main()
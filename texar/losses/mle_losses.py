@@ -21,6 +21,8 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from texar.core.output_layers import SampledSoftmaxLayer, \
+    AdaptiveSoftmaxLayer
 from texar.losses.losses_utils import mask_and_reduce, reduce_dimensions
 from texar.utils import shapes
 
@@ -30,6 +32,7 @@ from texar.utils import shapes
 __all__ = [
     "sequence_softmax_cross_entropy",
     "sequence_sparse_softmax_cross_entropy",
+    "sequence_sparse_softmax_cross_entropy_with_projection",
     "sequence_sigmoid_cross_entropy",
     "binary_sigmoid_cross_entropy",
     "binary_sigmoid_cross_entropy_with_clas"
@@ -205,6 +208,230 @@ def sequence_sparse_softmax_cross_entropy(labels,
 
         return losses
 
+def _get_projection(output_layer, output_bias):
+    """Returns `(weights, bias, transpose_weights)` of the output projection
+    so that `logits = matmul(hidden, weights, transpose_b=transpose_weights)
+    + bias`.
+    """
+    if isinstance(output_layer, tf.layers.Dense):
+        if not output_layer.built:
+            raise ValueError("`output_layer` must have been built.")
+        if output_layer.activation is not None:
+            raise ValueError("`output_layer` must not have an activation.")
+        weights = output_layer.kernel
+        bias = output_layer.bias if output_layer.use_bias else None
+        transpose_weights = False
+    else:
+        weights = tf.convert_to_tensor(output_layer)
+        bias = output_bias
+        transpose_weights = True
+
+    weights = tf.convert_to_tensor(weights)
+    vocab_size = shapes.shape_list(weights)[1 if not transpose_weights else 0]
+    if bias is None:
+        bias = tf.zeros([vocab_size], dtype=weights.dtype)
+    return weights, tf.convert_to_tensor(bias), transpose_weights
+
+def _chunked_sparse_softmax_cross_entropy(hidden, labels, weights, bias,
+                                          transpose_weights, chunk_size):
+    """Computes sparse softmax cross entropy of the logits
+    `matmul(hidden, weights) + bias` by chunks of :attr:`chunk_size` rows,
+    where `hidden` is of shape `[num_tokens, dim]`. The logits of a chunk are
+    recomputed in the backward pass instead of being kept.
+    """
+    num_chunks = (tf.shape(hidden)[0] + chunk_size - 1) // chunk_size
+
+    @tf.custom_gradient
+    def _fused(hidden, labels, weights, bias):
+        def _chunk(i):
+            start = i * chunk_size
+            hidden_i = hidden[start:start+chunk_size]
+            labels_i = labels[start:start+chunk_size]
+            logits_i = tf.matmul(
+                hidden_i, weights, transpose_b=transpose_weights) + bias
+            return hidden_i, labels_i, logits_i
+
+        def _forward(i, losses_ta):
+            _, labels_i, logits_i = _chunk(i)
+            losses_i = tf.nn.sparse_softmax_cross_entropy_with_logits(
+                labels=labels_i, logits=logits_i)
+            return i + 1, losses_ta.write(i, losses_i)
+
+        losses_ta = tf.TensorArray(
+            hidden.dtype, size=num_chunks, infer_shape=False,
+            element_shape=tf.TensorShape([None]))
+        _, losses_ta = tf.while_loop(
+            lambda i, *_: i < num_chunks, _forward, [0, losses_ta],
+            back_prop=False)
+
+        def _grad_fn(grad_losses):
+            def _backward(i, grad_hidden_ta, grad_weights, grad_bias):
+                hidden_i, labels_i, logits_i = _chunk(i)
+                start = i * chunk_size
+                grad_logits_i = tf.nn.softmax(logits_i) - tf.one_hot(
+                    labels_i, tf.shape(bias)[0], dtype=logits_i.dtype)
+                grad_logits_i *= tf.expand_dims(
+                    grad_losses[start:start+chunk_size], 1)
+                grad_hidden_i = tf.matmul(
+                    grad_logits_i, weights,
+                    transpose_b=not transpose_weights)
+                if transpose_weights:
+                    grad_weights += tf.matmul(
+                        grad_logits_i, hidden_i, transpose_a=True)
+                else:
+                    grad_weights += tf.matmul(
+                        hidden_i, grad_logits_i, transpose_a=True)
+                grad_bias += tf.reduce_sum(grad_logits_i, axis=0)
+                return (i + 1, grad_hidden_ta.write(i, grad_hidden_i),
+                        grad_weights, grad_bias)
+
+            grad_hidden_ta = tf.TensorArray(
+                hidden.dtype, size=num_chunks, infer_shape=False,
+                element_shape=tf.TensorShape([None]).concatenate(
+                    hidden.shape[1:]))
+            _, grad_hidden_ta, grad_weights, grad_bias = tf.while_loop(
+                lambda i, *_: i < num_chunks,
+                _backward,
+                [0, grad_hidden_ta, tf.zeros_like(weights),
+                 tf.zeros_like(bias)],
+                back_prop=False)
+            return grad_hidden_ta.concat(), None, grad_weights, grad_bias
+
+        return losses_ta.concat(), _grad_fn
+
+    return _fused(hidden, labels, weights, bias)
+
+def sequence_sparse_softmax_cross_entropy_with_projection(
+        labels,
+        hidden,
+        output_layer,
+        sequence_length,
+        output_bias=None,
+        chunk_size=1024,
+        mode=None,
+        average_across_batch=True,
+        average_across_timesteps=False,
+        sum_over_batch=False,
+        sum_over_timesteps=True,
+        time_major=False,
+        name=None):
+    """Computes sparse softmax cross entropy for each time step of sequence
+    predictions, given the decoder hidden states and the output projection
+    instead of the logits.
+
+    The result is the same as applying the projection to get logits of shape
+    `[batch_size, max_time, vocab_size]` and calling
+    :func:`~texar.losses.sequence_sparse_softmax_cross_entropy`. However,
+    the logits are computed for at most :attr:`chunk_size` (non-padding)
+    time steps at a time and recomputed in the backward pass, so that peak
+    memory does not grow with `vocab_size` times the number of time steps.
+
+    Args:
+        labels: Target class indexes, of shape `[batch_size, max_time]`
+            (or `[max_time, batch_size]` if :attr:`time_major` is `True`).
+        hidden: The decoder hidden states prior to the output projection,
+            of shape `[batch_size, max_time, dim]` (or
+            `[max_time, batch_size, dim]` if :attr:`time_major` is `True`).
+            E.g., the `cell_output` of
+            :class:`~texar.modules.BasicRNNDecoder` outputs, or the outputs
+            of :class:`~texar.modules.TransformerDecoder` with
+            `output_layer=tf.identity`.
+        output_layer: The output projection. Either a built
+            :tf_main:`tf.layers.Dense <layers/Dense>` without activation,
+            or a Tensor of shape `[vocab_size, dim]`, e.g., the word
+            embedding in the case of tied embedding. Can also be an
+            instance of :class:`~texar.core.SampledSoftmaxLayer` or
+            :class:`~texar.core.AdaptiveSoftmaxLayer`, in which case the
+            losses are computed with the layer's `loss`.
+        sequence_length: A Tensor of shape `[batch_size]`. Time steps beyond
+            the respective sequence lengths will have zero losses.
+        output_bias (optional): A Tensor of shape `[vocab_size]` added to
+            the logits. Used only when :attr:`output_layer` is a Tensor.
+        chunk_size (int): Maximum number of time steps (over the whole
+            batch) whose logits are computed at a time.
+        mode (optional): A Tensor taking value in
+            :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`, used by
+            :class:`~texar.core.SampledSoftmaxLayer` to choose between
+            sampled and full softmax. If `None`, :func:`texar.global_mode`
+            is used.
+        average_across_timesteps (bool): If set, average the loss across
+            the time dimension. Must not set `average_across_timesteps`
+            and `sum_over_timesteps` at the same time.
+        average_across_batch (bool): If set, average the loss across the
+            batch dimension. Must not set `average_across_batch`'
+            and `sum_over_batch` at the same time.
+        sum_over_timesteps (bool): If set, sum the loss across the
+            time dimension. Must not set `average_across_timesteps`
+            and `sum_over_timesteps` at the same time.
+        sum_over_batch (bool): If set, sum the loss across the
+            batch dimension. Must not set `average_across_batch`
+            and `sum_over_batch` at the same time.
+        time_major (bool): The shape format of the inputs. If `True`,
+            :attr:`labels` and :attr:`hidden` must have shape
+            `[max_time, batch_size, ...]`. If `False`
+            (default), they must have shape `[batch_size, max_time, ...]`.
+        name (str, optional): A name for the operation.
+
+    Returns:
+        A Tensor containing the loss, of rank 0, 1, or 2 depending on the
+        arguments :attr:`{average_across}/{sum_over}_{timesteps}/{batch}`.
+        See :func:`~texar.losses.sequence_sparse_softmax_cross_entropy`.
+
+    Example:
+
+        .. code-block:: python
+
+            embedder = WordEmbedder(vocab_size=data.vocab.size)
+            output_layer = tf.layers.Dense(data.vocab.size)
+            output_layer.build([None, cell_dim])
+            decoder = BasicRNNDecoder(output_layer=tf.identity)
+            outputs, _, _ = decoder(
+                decoding_strategy='train_greedy',
+                inputs=embedder(data_batch['text_ids']),
+                sequence_length=data_batch['length']-1)
+
+            loss = sequence_sparse_softmax_cross_entropy_with_projection(
+                labels=data_batch['text_ids'][:, 1:],
+                hidden=outputs.cell_output,
+                output_layer=output_layer,
+                sequence_length=data_batch['length']-1)
+    """
+    with tf.name_scope(name,
+                       "sequence_sparse_softmax_cross_entropy_with_projection"):
+        time_axis = 0 if time_major else 1
+        mask = tf.sequence_mask(
+            sequence_length, tf.shape(labels)[time_axis])
+        if time_major:
+            mask = tf.transpose(mask, [1, 0])
+        # Only computes the losses of non-padding time steps
+        indices = tf.where(mask)
+        hidden = tf.gather_nd(hidden, indices)
+        if isinstance(output_layer,
+                      (SampledSoftmaxLayer, AdaptiveSoftmaxLayer)):
+            losses = output_layer.loss(
+                hidden, tf.gather_nd(labels, indices), mode=mode)
+        else:
+            weights, bias, transpose_weights = _get_projection(
+                output_layer, output_bias)
+            losses = _chunked_sparse_softmax_cross_entropy(
+                hidden, tf.gather_nd(labels, indices),
+                weights, bias, transpose_weights, chunk_size)
+        losses = tf.scatter_nd(
+            indices, losses, tf.shape(labels, out_type=tf.int64))
+        losses.set_shape(labels.shape)
+
+        losses = mask_and_reduce(
+            losses,
+            sequence_length,
+            rank=2,
+            average_across_batch=average_across_batch,
+            average_across_timesteps=average_across_timesteps,
+            sum_over_batch=sum_over_batch,
+            sum_over_timesteps=sum_over_timesteps,
+            time_major=time_major)
+
+        return losses
+
 def sequence_sigmoid_cross_entropy(labels,
                                    logits,
                                    sequence_length,
@@ -389,6 +616,7 @@ def binary_sigmoid_cross_entropy_with_clas(clas_fn,
                                            sum_over_batch=False,
                                            sum_over_classes=False,
                                            return_pos_neg_losses=False,
+                                           single_pass=False,
                                            name=None):
     """Computes sigmoid cross entropy of binary classifier.
 
@@ -420,6 +648,13 @@ def binary_sigmoid_cross_entropy_with_clas(clas_fn,
             :attr:`logits` is a 2D Tensor.
         return_pos_neg_losses (bool): If set, additionally returns the losses
             on :attr:`pos_logits` and :attr:`neg_logits`, respectively.
+        single_pass (bool): If set and both :attr:`pos_inputs` and
+            :attr:`neg_inputs` are given, the inputs are concatenated along
+            the batch dimension (with the other dimensions, e.g., the time
+            dimension, zero-padded at the end to the larger size), and
+            `clas_fn` is called only once. The logits are then split back.
+            `clas_fn` must give the same logits regardless of the padding,
+            e.g., by masking according to sequence lengths.
         name (str, optional): A name for the operation.
 
     Returns:
@@ -439,17 +674,28 @@ def binary_sigmoid_cross_entropy_with_clas(clas_fn,
         `neg_loss` is the loss on `neg_logits` only. They have
         `loss = pos_loss + neg_loss`.
     """
-    pos_logits = None
-    if pos_inputs is not None:
-        pos_logits = clas_fn(pos_inputs)
-        if isinstance(pos_logits, (list, tuple)):
-            pos_logits = pos_logits[0]
-
-    neg_logits = None
-    if neg_inputs is not None:
-        neg_logits = clas_fn(neg_inputs)
-        if isinstance(neg_logits, (list, tuple)):
-            neg_logits = neg_logits[0]
+    if single_pass and pos_inputs is not None and neg_inputs is not None:
+        pos_inputs = tf.convert_to_tensor(pos_inputs)
+        neg_inputs = tf.convert_to_tensor(neg_inputs)
+        logits = clas_fn(shapes.pad_and_concat([pos_inputs, neg_inputs], 0))
+        if isinstance(logits, (list, tuple)):
+            logits = logits[0]
+        pos_logits, neg_logits = tf.split(
+            logits,
+            [tf.shape(pos_inputs)[0], tf.shape(neg_inputs)[0]],
+            axis=0)
+    else:
+        pos_logits = None
+        if pos_inputs is not None:
+            pos_logits = clas_fn(pos_inputs)
+            if isinstance(pos_logits, (list, tuple)):
+                pos_logits = pos_logits[0]
+
+        neg_logits = None
+        if neg_inputs is not None:
+            neg_logits = clas_fn(neg_inputs)
+            if isinstance(neg_logits, (list, tuple)):
+                neg_logits = neg_logits[0]
 
     return binary_sigmoid_cross_entropy(
         pos_logits=pos_logits,
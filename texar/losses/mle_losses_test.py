@@ -86,6 +86,46 @@ class MLELossesTest(tf.test.TestCase):
             tx.losses.sequence_sparse_softmax_cross_entropy,
             self._labels, self._logits, self._sequence_length)
 
+    def test_sequence_sparse_softmax_cross_entropy_with_projection(self):
+        """Tests `sequence_sparse_softmax_cross_entropy_with_projection`
+        gives the same losses and gradients as
+        `sequence_sparse_softmax_cross_entropy`.
+        """
+        dim = 8
+        labels = tf.random_uniform(
+            [self._batch_size, self._max_time], maxval=self._num_classes,
+            dtype=tf.int32)
+        hidden = tf.random_uniform([self._batch_size, self._max_time, dim])
+        dense = tf.layers.Dense(self._num_classes)
+        dense.build([None, dim])
+        embedding = tf.random_uniform([self._num_classes, dim])
+        bias = tf.random_uniform([self._num_classes])
+
+        for output_layer, output_bias, logits in [
+                (dense, None, dense(hidden)),
+                (embedding, bias,
+                 tf.einsum('btd,vd->btv', hidden, embedding) + bias)]:
+            loss = tx.losses.sequence_sparse_softmax_cross_entropy(
+                labels, logits, self._sequence_length)
+            fused_loss = \
+                tx.losses.sequence_sparse_softmax_cross_entropy_with_projection(
+                    labels, hidden, output_layer, self._sequence_length,
+                    output_bias=output_bias, chunk_size=100)
+            params = [hidden] + (dense.trainable_variables
+                                 if output_bias is None
+                                 else [embedding, output_bias])
+            grads = tf.gradients(loss, params)
+            fused_grads = tf.gradients(fused_loss, params)
+
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                loss_, fused_loss_, grads_, fused_grads_ = sess.run(
+                    [loss, fused_loss, grads, fused_grads])
+                np.testing.assert_allclose(loss_, fused_loss_, rtol=1e-5)
+                for grad_, fused_grad_ in zip(grads_, fused_grads_):
+                    np.testing.assert_allclose(
+                        grad_, fused_grad_, rtol=1e-4, atol=1e-6)
+
     def test_sequence_sigmoid_cross_entropy(self):
         """Tests `texar.losses.test_sequence_sigmoid_cross_entropy`.
         """
@@ -110,5 +150,29 @@ class MLELossesTest(tf.test.TestCase):
                 feed_dict={labels: np.ones([self._batch_size, self._max_time])})
             self.assertEqual(rank, 0)
 
+    def test_binary_sigmoid_cross_entropy_with_clas(self):
+        """Tests `texar.losses.binary_sigmoid_cross_entropy_with_clas` with
+        and without `single_pass`.
+        """
+        pos_inputs = tf.random_uniform([self._batch_size, self._max_time])
+        neg_inputs = tf.random_uniform([3, self._max_time - 2])
+        num_calls = []
+        def _clas_fn(inputs):
+            num_calls.append(1)
+            # Insensitive to the zero-padding at the end
+            return tf.reduce_sum(inputs, axis=1), inputs
+
+        loss = tx.losses.binary_sigmoid_cross_entropy_with_clas(
+            _clas_fn, pos_inputs, neg_inputs, return_pos_neg_losses=True)
+        self.assertEqual(len(num_calls), 2)
+        loss_sp = tx.losses.binary_sigmoid_cross_entropy_with_clas(
+            _clas_fn, pos_inputs, neg_inputs, return_pos_neg_losses=True,
+            single_pass=True)
+        self.assertEqual(len(num_calls), 3)
+
+        with self.test_session() as sess:
+            loss_, loss_sp_ = sess.run([loss, loss_sp])
+            np.testing.assert_allclose(loss_, loss_sp_, rtol=1e-5)
+
 if __name__ == "__main__":
     tf.test.main()
@@ -28,12 +28,18 @@ from texar.utils.shapes import mask_sequences
 
 __all__ = [
     "discount_reward",
+    "generalized_advantage_estimation",
     "_discount_reward_py_1d",
     "_discount_reward_tensor_1d",
     "_discount_reward_py_2d",
     "_discount_reward_tensor_2d"
 ]
 
+# Number of time steps discounted with one matrix product. Longer
+# sequences are processed chunk by chunk, so the cost is linear in the
+# sequence length.
+_DISCOUNT_CHUNK_SIZE = 64
+
 def discount_reward(reward,
                     sequence_length=None,
                     discount=1.,
@@ -182,9 +188,30 @@ def _discount_reward_py_2d(reward, sequence_length=None,
         disc_reward = np.cumsum(
             reward[:, ::-1], axis=1, dtype=dtype)[:, ::-1]
     else:
-        disc_reward = np.copy(reward)
-        for i in range(reward.shape[1]-2, -1, -1):
-            disc_reward[:, i] += disc_reward[:, i+1] * discount
+        # Discounts chunks of `chunk_size` steps with a matrix product each,
+        # from the last chunk backward, adding the discounted return at the
+        # start of the following chunk.
+        max_time = reward.shape[1]
+        chunk_size = min(max_time, _DISCOUNT_CHUNK_SIZE)
+        # dmat[t, s] = discount^(s-t) for s >= t, and 0 otherwise. Powers
+        # are computed directly (instead of dividing cumulative products),
+        # which is stable for long horizons.
+        steps = np.arange(chunk_size)
+        exponents = steps[None, :] - steps[:, None]
+        dmat = np.where(exponents >= 0,
+                        np.power(discount, np.maximum(exponents, 0)), 0.)
+        dmat = dmat.T.astype(dtype)
+        tail_discount = np.power(discount, chunk_size - steps).astype(dtype)
+
+        disc_reward = np.zeros(reward.shape, dtype=dtype)
+        tail = None
+        for start in reversed(range(0, max_time, chunk_size)):
+            end = min(start + chunk_size, max_time)
+            chunk = np.dot(reward[:, start:end], dmat[:end-start, :end-start])
+            if tail is not None:
+                chunk += tail[:, None] * tail_discount[None, :end-start]
+            disc_reward[:, start:end] = chunk
+            tail = chunk[:, 0]
 
     return disc_reward
 
@@ -197,14 +224,132 @@ def _discount_reward_tensor_2d(reward, sequence_length=None,
     if discount == 1.:
         disc_reward = tf.cumsum(reward, axis=1, reverse=True)
     else:
-        # [max_time, batch_size]
-        rev_reward_T = tf.transpose(tf.reverse(reward, [1]), [1, 0])
-        rev_reward_T_cum = tf.scan(
-            fn=lambda acc, cur: cur + discount * acc,
-            elems=rev_reward_T,
-            initializer=tf.zeros_like(reward[:, 1]),
-            back_prop=False)
-        disc_reward = tf.reverse(
-            tf.transpose(rev_reward_T_cum, [1, 0]), [1])
+        # Discounts chunks of `chunk_size` steps with a matrix product each,
+        # from the last chunk backward, adding the discounted return at the
+        # start of the following chunk.
+        batch_size, max_time = tf.shape(reward)[0], tf.shape(reward)[1]
+        chunk_size = tf.minimum(max_time, _DISCOUNT_CHUNK_SIZE)
+        num_chunks = (max_time + chunk_size - 1) // chunk_size
+        padded = tf.pad(
+            reward, [[0, 0], [0, num_chunks * chunk_size - max_time]])
+        chunks = tf.transpose(
+            tf.reshape(padded, [batch_size, num_chunks, chunk_size]),
+            [1, 0, 2])
+
+        # dmat[t, s] = discount^(s-t) for s >= t, and 0 otherwise.
+        steps = tf.range(chunk_size)
+        exponents = tf.maximum(steps[None, :] - steps[:, None], 0)
+        discount_ = tf.cast(discount, reward.dtype)
+        dmat = tf.pow(discount_, tf.cast(exponents, reward.dtype))
+        dmat = tf.matrix_band_part(dmat, 0, -1)
+        tail_discount = tf.pow(
+            discount_, tf.cast(chunk_size - steps, reward.dtype))
+
+        def _discount_chunk(next_chunk, chunk):
+            return tf.matmul(chunk, dmat, transpose_b=True) + \
+                next_chunk[:, :1] * tail_discount[None, :]
+
+        disc_chunks = tf.scan(
+            _discount_chunk, chunks, initializer=tf.zeros_like(chunks[0]),
+            reverse=True)
+        disc_reward = tf.reshape(tf.transpose(disc_chunks, [1, 0, 2]),
+                                 [batch_size, -1])[:, :max_time]
 
     return disc_reward
+
+def generalized_advantage_estimation(reward,
+                                     value,
+                                     sequence_length=None,
+                                     discount=1.,
+                                     gae_lambda=1.,
+                                     bootstrap_value=None,
+                                     normalize=False,
+                                     dtype=None):
+    """Computes generalized advantage estimation (GAE) of a batch of
+    trajectories, i.e.,
+    `A_t = sum_{l>=0} (discount * gae_lambda)^l * delta_{t+l}`,
+    where `delta_t = reward_t + discount * value_{t+1} - value_t`.
+
+    :attr:`reward`, :attr:`value`, :attr:`sequence_length` and
+    :attr:`bootstrap_value` can be either Tensors or python arrays. If all
+    are python arrays (or `None`), the return will be a python array as well.
+    Otherwise tf Tensors are returned.
+
+    Args:
+        reward: A Tensor or python array of shape `[batch_size, max_time]`.
+        value: A Tensor or python array of shape `[batch_size, max_time]`,
+            the estimated values of the states at each time step.
+        sequence_length (optional): A Tensor or python array of shape
+            `[batch_size]`. Time steps beyond the respective sequence lengths
+            will be masked. If `None`, all sequences are of length `max_time`.
+        discount (float): A scalar. The discount factor.
+        gae_lambda (float): A scalar. The GAE parameter trading bias
+            (`gae_lambda=0`, one-step TD error) against variance
+            (`gae_lambda=1`, discounted reward minus :attr:`value`).
+        bootstrap_value (optional): A Tensor or python array of shape
+            `[batch_size]`, the estimated values of the states after the
+            last step of each sequence. If `None`, the sequences are treated
+            as terminated, i.e., the values are 0.
+        normalize (bool): Whether to normalize the advantages, by
+            `(advantage - mean) / std`. Here `mean` and `std` are over all
+            time steps and all samples in the batch.
+        dtype (dtype): Type of :attr:`reward`. If `None`, infer from
+            `reward` automatically.
+
+    Returns:
+        A 2D Tensor or python array of shape `[batch_size, max_time]`, the
+        advantages. The target values (e.g., for training a critic) are
+        `advantages + value` (before normalization).
+
+    Example:
+
+        .. code-block:: python
+
+            r = [[1., 1., 1.], [1., 1., 0.]]
+            v = [[2., 1.5, 1.], [1.5, 1., 0.]]
+            adv = generalized_advantage_estimation(
+                r, v, sequence_length=[3, 2], discount=0.9, gae_lambda=0.95)
+    """
+    is_tensor = tf.contrib.framework.is_tensor
+    if not any(is_tensor(x) for x in
+               (reward, value, sequence_length, bootstrap_value)):
+        reward = np.array(reward)
+        dtype = dtype or reward.dtype
+        value = np.asarray(value, dtype=dtype)
+        batch_size, max_time = reward.shape
+        if sequence_length is None:
+            sequence_length = np.full([batch_size], max_time)
+        sequence_length = np.asarray(sequence_length)
+        if bootstrap_value is None:
+            bootstrap_value = np.zeros([batch_size], dtype=dtype)
+
+        is_last = np.arange(max_time)[None, :] == (sequence_length - 1)[:, None]
+        next_value = np.concatenate(
+            [value[:, 1:], np.zeros([batch_size, 1], dtype=dtype)], axis=1)
+        next_value = np.where(
+            is_last, np.asarray(bootstrap_value, dtype=dtype)[:, None],
+            next_value)
+    else:
+        reward = tf.convert_to_tensor(reward, dtype=dtype)
+        dtype = reward.dtype
+        value = tf.convert_to_tensor(value, dtype=dtype)
+        batch_size, max_time = tf.shape(reward)[0], tf.shape(reward)[1]
+        if sequence_length is None:
+            sequence_length = tf.fill([batch_size], max_time)
+        if bootstrap_value is None:
+            bootstrap_value = tf.zeros([batch_size], dtype=dtype)
+        bootstrap_value = tf.convert_to_tensor(bootstrap_value, dtype=dtype)
+
+        is_last = tf.equal(tf.range(max_time)[None, :],
+                           tf.to_int32(sequence_length)[:, None] - 1)
+        next_value = tf.concat(
+            [value[:, 1:], tf.zeros_like(value[:, :1])], axis=1)
+        next_value = tf.where(
+            is_last, tf.ones_like(next_value) * bootstrap_value[:, None],
+            next_value)
+
+    delta = reward + discount * next_value - value
+
+    return discount_reward(
+        delta, sequence_length, discount=discount * gae_lambda,
+        normalize=normalize, dtype=dtype, tensor_rank=2)
@@ -16,7 +16,7 @@ import tensorflow as tf
 from texar.losses.rewards import \
         _discount_reward_tensor_2d, _discount_reward_tensor_1d, \
         _discount_reward_py_1d, _discount_reward_py_2d, \
-        discount_reward
+        discount_reward, generalized_advantage_estimation
 
 class RewardTest(tf.test.TestCase):
     """Tests reward related functions.
@@ -195,5 +195,63 @@ class RewardTest(tf.test.TestCase):
                     self.assertEqual(r[0, i], 0)
                 self.assertEqual(r[1, i], int(1111111111./10**i) / 10**(9-i))
 
+    def test_discount_reward_2d_long(self):
+        """Tests discounting 2D rewards longer than a chunk.
+        """
+        batch_size, max_time, discount = 3, 150, 0.95
+        reward = np.random.randn(batch_size, max_time).astype(np.float32)
+        sequence_length = np.array([150, 64, 70])
+
+        expected = np.zeros_like(reward)
+        for b in range(batch_size):
+            running = 0.
+            for t in reversed(range(sequence_length[b])):
+                running = reward[b, t] + discount * running
+                expected[b, t] = running
+
+        disc_reward_py = _discount_reward_py_2d(
+            reward, sequence_length, discount=discount)
+        np.testing.assert_allclose(disc_reward_py, expected, rtol=1e-4,
+                                   atol=1e-4)
+        disc_reward_tensor = _discount_reward_tensor_2d(
+            tf.constant(reward), sequence_length, discount=discount)
+        with self.test_session() as sess:
+            np.testing.assert_allclose(sess.run(disc_reward_tensor),
+                                       expected, rtol=1e-4, atol=1e-4)
+
+    def test_generalized_advantage_estimation(self):
+        """Tests :func:`texar.losses.rewards.generalized_advantage_estimation`
+        """
+        batch_size, max_time = 3, 50
+        discount, gae_lambda = 0.9, 0.8
+        reward = np.random.randn(batch_size, max_time)
+        value = np.random.randn(batch_size, max_time)
+        bootstrap_value = np.random.randn(batch_size)
+        sequence_length = np.array([50, 20, 1])
+
+        expected = np.zeros([batch_size, max_time])
+        for b in range(batch_size):
+            length = sequence_length[b]
+            adv = 0.
+            for t in range(length - 1, -1, -1):
+                next_value = bootstrap_value[b] if t == length - 1 \
+                    else value[b, t + 1]
+                delta = reward[b, t] + discount * next_value - value[b, t]
+                adv = delta + discount * gae_lambda * adv
+                expected[b, t] = adv
+
+        adv_py = generalized_advantage_estimation(
+            reward, value, sequence_length, discount=discount,
+            gae_lambda=gae_lambda, bootstrap_value=bootstrap_value)
+        np.testing.assert_allclose(adv_py, expected, rtol=1e-6, atol=1e-8)
+
+        adv_tensor = generalized_advantage_estimation(
+            tf.constant(reward), value, sequence_length, discount=discount,
+            gae_lambda=gae_lambda, bootstrap_value=bootstrap_value)
+        with self.test_session() as sess:
+            adv_tensor_ = sess.run(adv_tensor)
+            np.testing.assert_allclose(
+                adv_tensor_, expected, rtol=1e-6, atol=1e-8)
+
 if __name__ == "__main__":
     tf.test.main()
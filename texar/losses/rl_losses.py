@@ -21,7 +21,7 @@ from __future__ import print_function
 
 import tensorflow as tf
 
-from texar.losses.mle_losses import _mask_sequences
+from texar.utils.shapes import mask_sequences
 
 
 def reinforce_loss(sample_fn,
@@ -70,21 +70,81 @@ def reinforce_loss(sample_fn,
     rewards = rewards_local + tf.reshape(rewards_global, [batch, 1])
 
     eps = 1e-12
-    log_probs = _mask_sequences(tf.log(probs + eps), seq_lens)
+    log_probs = mask_sequences(tf.log(probs + eps), seq_lens, tensor_rank=2)
     loss = - tf.reduce_mean(
         tf.reduce_sum(log_probs * rewards, axis=1) / seq_lens)
     return loss
 
 
+def _mc_rollout_rewards(sample_fn, global_reward_fn, sequences, seq_lens,
+                        num_rollouts):
+    """Estimates the reward of each prefix of :attr:`sequences` by Monte
+    Carlo rollouts, with all prefixes and rollouts decoded in one batch.
+    Only the proper prefixes of each sequence, i.e., of lengths
+    `1, ..., seq_len-1`, are rolled out.
+
+    Returns:
+        A Tensor of shape `[batch_size, max_sequence_length]`, where the
+        `t`-th column is the mean reward of the rollouts completing the
+        prefixes of length `t+1`. Prefixes that already are the complete
+        sequences are given the reward of the sequences.
+    """
+    batch_size = tf.shape(sequences)[0]
+    max_time = tf.shape(sequences)[1]
+    num_prefixes = max_time - 1
+
+    # `[sample index, prefix length - 1]` of the prefixes to roll out
+    prefix_indices = tf.to_int32(tf.where(
+        tf.range(1, max_time)[None, :] < tf.to_int32(seq_lens)[:, None]))
+    num_valid = tf.shape(prefix_indices)[0]
+
+    # Replicates each prefix for each rollout, in the order of
+    # `[num_valid, num_rollouts]`.
+    replica_indices = tf.reshape(
+        tf.tile(prefix_indices, [1, num_rollouts]), [-1, 2])
+    given_actions = tf.gather(sequences, replica_indices[:, 0])
+    given_lengths = replica_indices[:, 1] + 1
+
+    rollouts, _, rollout_lens = sample_fn(
+        num_valid * num_rollouts,
+        given_actions=given_actions,
+        given_lengths=given_lengths)
+    rollout_rewards = global_reward_fn(rollouts, rollout_lens)
+    rollout_rewards = tf.reduce_mean(
+        tf.reshape(rollout_rewards, [num_valid, num_rollouts]), axis=1)
+    rollout_rewards = tf.scatter_nd(
+        prefix_indices, rollout_rewards, [batch_size, num_prefixes])
+
+    # shape = [batch_size, 1]
+    final_rewards = tf.cast(
+        tf.expand_dims(global_reward_fn(sequences, seq_lens), 1),
+        rollout_rewards.dtype)
+    rewards = tf.concat([rollout_rewards, final_rewards], axis=1)
+    is_complete = tf.range(1, max_time + 1)[None, :] >= \
+        tf.to_int32(seq_lens)[:, None]
+    rewards = tf.where(
+        is_complete, tf.ones_like(rewards) * final_rewards, rewards)
+    return rewards
+
 def reinforce_loss_with_MCtree(sample_fn,   # pylint: disable=invalid-name
                                global_reward_fn,
                                local_reward_fn=None,
-                               num_samples=1):
+                               num_samples=1,
+                               num_rollouts=1):
     """Computes REINFORCE loss with Monte Carlo tree search.
 
+    The reward at each position of a sampled sequence is the reward of the
+    sequence prefix up to the position, estimated as the mean global reward
+    of :attr:`num_rollouts` completions (rollouts) of the prefix. The
+    rollouts for all proper prefixes of all samples are decoded in a single
+    call of :attr:`sample_fn`, and their rewards are computed in a single
+    call of :attr:`global_reward_fn`. The batch of the call is
+    `sum(sequence_lengths - 1) * num_rollouts`.
+
     Args:
-        sample_fn: A callable that takes :attr:`num_samples`, 'given_actions'
-            and returns `(samples, probabilities, sequence_lengths)`, where:
+        sample_fn: A callable that takes :attr:`num_samples`, and optional
+            `given_actions` and `given_lengths`, and returns
+            `(samples, probabilities, sequence_lengths)`, where:
 
             `samples` is a Tensor of shape `[num_samples, max_sequence_length]`
             containing the generated samples;
@@ -96,6 +156,15 @@ def reinforce_loss_with_MCtree(sample_fn,   # pylint: disable=invalid-name
 
             `sequence_lengths` is a Tensor of shape `[num_samples]` containing
             the length of each samples.
+
+            If given, `given_actions` is an int Tensor of shape
+            `[num_samples, max_sequence_length]` and `given_lengths` is an int
+            Tensor of shape `[num_samples]`. The `i`-th sample must start with
+            `given_actions[i, :given_lengths[i]]`, and be completed by the
+            model, e.g., by decoding with
+            :class:`~texar.modules.PrefixSampleEmbeddingHelper`. The
+            returned samples of rollouts can be longer than
+            `max_sequence_length`.
         global_reward_fn: A callable that takes `(samples, sequence_lengths)`
             and returns a Tensor of shape `[num_samples]` containing the reward
             of each of the samples.
@@ -104,8 +173,49 @@ def reinforce_loss_with_MCtree(sample_fn,   # pylint: disable=invalid-name
             `[num_samples, max_sequence_length]` containing the local reward
             at each time step of samples.
         num_samples (int scalar Tensor): the number of sequences to sample.
+        num_rollouts (int): the number of rollouts of each prefix.
 
     Returns:
         A scalar Tensor of the REINFORCE loss.
+
+    Example:
+
+        .. code-block:: python
+
+            def sample_fn(num_samples, given_actions=None,
+                          given_lengths=None):
+                start_tokens = tf.fill([num_samples], bos_token_id)
+                if given_actions is None:
+                    helper = tf.contrib.seq2seq.SampleEmbeddingHelper(
+                        embedder, start_tokens, eos_token_id)
+                else:
+                    helper = tx.modules.PrefixSampleEmbeddingHelper(
+                        embedder, start_tokens, eos_token_id,
+                        given_actions, given_lengths)
+                outputs, _, lengths = decoder(
+                    helper=helper, max_decoding_length=max_length)
+                probs = tf.reduce_sum(
+                    tf.nn.softmax(outputs.logits) *
+                    tf.one_hot(outputs.sample_id, vocab_size), axis=-1)
+                return outputs.sample_id, probs, lengths
+
+            loss = tx.losses.reinforce_loss_with_MCtree(
+                sample_fn, reward_fn, num_samples=batch_size,
+                num_rollouts=4)
     """
-    raise NotImplementedError
+    # shape = [num_samples, max_sequence_length]
+    sequences, probs, seq_lens = sample_fn(num_samples)
+
+    rewards = _mc_rollout_rewards(
+        sample_fn, global_reward_fn, sequences, seq_lens, num_rollouts)
+    rewards = tf.cast(rewards, probs.dtype)
+    if local_reward_fn is not None:
+        rewards += local_reward_fn(sequences, seq_lens)
+    rewards = tf.stop_gradient(rewards)
+
+    eps = 1e-12
+    log_probs = mask_sequences(tf.log(probs + eps), seq_lens, tensor_rank=2)
+    loss = - tf.reduce_mean(
+        tf.reduce_sum(log_probs * rewards, axis=1) /
+        tf.cast(seq_lens, probs.dtype))
+    return loss
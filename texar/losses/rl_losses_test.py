@@ -0,0 +1,81 @@
+#
+"""
+Unit tests for RL losses.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+# pylint: disable=invalid-name, protected-access
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.losses import rl_losses
+
+
+class RLLossesTest(tf.test.TestCase):
+    """Tests RL losses.
+    """
+
+    def setUp(self):
+        tf.test.TestCase.setUp(self)
+        self._max_time = 5
+        self._sequences = tf.constant(
+            [[1, 2, 3, 4, 5], [2, 2, 2, 0, 0]], dtype=tf.int32)
+        self._seq_lens = tf.constant([5, 3], dtype=tf.int32)
+        self._probs = tf.Variable(tf.fill([2, self._max_time], 0.5))
+        self._num_calls = []
+
+    def _sample_fn(self, num_samples, given_actions=None, given_lengths=None):
+        """Returns the fixed samples, or completes the given prefixes with
+        zeros.
+        """
+        self._num_calls.append(num_samples)
+        if given_actions is None:
+            return self._sequences, self._probs, self._seq_lens
+        mask = tf.sequence_mask(given_lengths, self._max_time, tf.int32)
+        return (given_actions * mask, None,
+                tf.fill([num_samples], self._max_time))
+
+    def test_mc_rollout_rewards(self):
+        """Tests that the proper prefixes are rolled out in a single batch.
+        """
+        global_reward_fn = lambda samples, _: tf.to_float(
+            tf.reduce_sum(samples, axis=1))
+        rewards = rl_losses._mc_rollout_rewards(
+            self._sample_fn, global_reward_fn, self._sequences,
+            self._seq_lens, num_rollouts=3)
+        self.assertEqual(len(self._num_calls), 1)
+
+        with self.test_session() as sess:
+            self.assertEqual(sess.run(self._num_calls[0]), (4 + 2) * 3)
+            rewards_ = sess.run(rewards)
+            np.testing.assert_allclose(
+                rewards_, [[1, 3, 6, 10, 15], [2, 4, 6, 6, 6]])
+
+    def test_reinforce_loss_with_MCtree(self):
+        """Tests :func:`texar.losses.rl_losses.reinforce_loss_with_MCtree`.
+        """
+        global_reward_fn = lambda samples, _: tf.to_float(
+            tf.reduce_sum(samples, axis=1))
+        loss = rl_losses.reinforce_loss_with_MCtree(
+            self._sample_fn, global_reward_fn, num_samples=2,
+            num_rollouts=2)
+        grads = tf.gradients(loss, self._probs)
+        self.assertEqual(loss.shape, ())
+        self.assertIsNotNone(grads[0])
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            loss_ = sess.run(loss)
+            expected = -np.mean(
+                [np.log(0.5) * 35 / 5, np.log(0.5) * 12 / 3])
+            self.assertAllClose(loss_, expected, rtol=1e-5)
+
+
+if __name__ == "__main__":
+    tf.test.main()
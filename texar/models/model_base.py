@@ -73,6 +73,13 @@ class ModelBase(object):
         """
         raise NotImplementedError
 
+    def get_serving_input_fn(self, *args, **kwargs):
+        """Returns the serving input function that constructs the input
+        placeholders of the model in PREDICT mode, used in, e.g.,
+        :meth:`texar.run.Executor.export`.
+        """
+        raise NotImplementedError
+
     @property
     def hparams(self):
         """A :class:`~texar.HParams` instance. The hyperparameters
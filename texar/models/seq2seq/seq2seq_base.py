@@ -327,3 +327,28 @@ class Seq2seqBase(ModelBase):
             return features, labels
 
         return _input_fn
+
+    def get_serving_input_fn(self): #pylint:disable=arguments-differ
+        """Creates a serving input function that provides the source
+        sequences to the model in PREDICT mode, e.g., for
+        :meth:`texar.run.Executor.export`.
+
+        Returns:
+            A function that returns a
+            :tf_main:`ServingInputReceiver
+            <estimator/export/ServingInputReceiver>` when called, with
+            features "source_text_ids", an int64 Tensor of shape
+            `[batch_size, max_time]`, and "source_length", an int32 Tensor
+            of shape `[batch_size]`.
+        """
+        def _serving_input_fn():
+            features = {
+                'source_text_ids': tf.placeholder(
+                    tf.int64, [None, None], name='source_text_ids'),
+                'source_length': tf.placeholder(
+                    tf.int32, [None], name='source_length')
+            }
+            return tf.estimator.export.ServingInputReceiver(
+                features, features)
+
+        return _serving_input_fn
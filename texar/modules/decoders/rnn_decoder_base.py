@@ -32,6 +32,8 @@ from tensorflow.python.framework import tensor_shape
 from tensorflow.python.util import nest
 
 from texar.core import layers
+from texar.core.output_layers import SampledSoftmaxLayer, \
+    AdaptiveSoftmaxLayer, shortlist_projection, _shortlist_index
 from texar.utils import utils
 from texar.utils.mode import is_train_mode, is_train_mode_py
 from texar.module_base import ModuleBase
@@ -61,6 +63,8 @@ class RNNDecoderBase(ModuleBase, TFDecoder):
 
         self._helper = None
         self._initial_state = None
+        self._skip_output_layer = False
+        self._shortlist_projection = None
 
         # Make rnn cell
         with tf.variable_scope(self.variable_scope):
@@ -121,6 +125,7 @@ class RNNDecoderBase(ModuleBase, TFDecoder):
                input_time_major=False,
                helper=None,
                mode=None,
+               candidate_ids=None,
                **kwargs):
         """Performs decoding. This is a shared interface for both
         :class:`~texar.modules.BasicRNNDecoder` and
@@ -338,6 +343,19 @@ class RNNDecoderBase(ModuleBase, TFDecoder):
                 inference related hyperparameters are used (e.g.,
                 `hparams['max_decoding_length_infer']`).
                 If `None` (default), `TRAIN` mode is used.
+            candidate_ids (optional): A 1D int Tensor of candidate token
+                indexes, with statically known size, used in
+                `"infer_greedy"` and `"infer_sample"` decoding. E.g., the
+                target words of a source-to-target lexical table for the
+                batch plus the most frequent words. If given, each step
+                only projects onto the candidates instead of the full
+                vocabulary. The output `sample_id` are still token indexes
+                in the vocabulary, while the output `logits` are over the
+                candidates, in the order of :attr:`candidate_ids`. The
+                candidates must contain :attr:`end_token`, and must be
+                unique. Requires the output layer to be a
+                :tf_main:`tf.layers.Dense <layers/Dense>` or
+                :class:`~texar.core.SampledSoftmaxLayer`.
             **kwargs: Other keyword arguments for constructing helpers
                 defined by `hparams["helper_trainn"]` or
                 `hparams["helper_infer"]`.
@@ -351,6 +369,53 @@ class RNNDecoderBase(ModuleBase, TFDecoder):
             - **`sequence_lengths`**: is an int Tensor of shape `[batch_size]` \
             containing the length of each sample.
         """
+        # Sampled/adaptive softmax output layers are applied in the loss
+        self._skip_output_layer = \
+            helper is None and decoding_strategy == "train_greedy" and \
+            isinstance(self._output_layer,
+                       (SampledSoftmaxLayer, AdaptiveSoftmaxLayer))
+        if self._skip_output_layer and not self._output_layer.built:
+            # Creates the layer variables so that they are collected
+            self._output_layer(
+                tf.zeros([1, self._cell.output_size], dtype=tf.float32))
+
+        # Shortlisted output projection
+        self._shortlist_projection = None
+        id_table = None
+        if candidate_ids is not None:
+            if helper is not None or \
+                    decoding_strategy not in ('infer_greedy', 'infer_sample'):
+                raise ValueError(
+                    "`candidate_ids` is only supported in 'infer_greedy' "
+                    "and 'infer_sample' decoding.")
+            candidate_ids = tf.to_int32(candidate_ids)
+            num_candidates = candidate_ids.shape[0].value
+            if num_candidates is None:
+                raise ValueError(
+                    "The size of `candidate_ids` must be statically known.")
+            if isinstance(self._output_layer, tf.layers.Layer) and \
+                    not self._output_layer.built:
+                self._output_layer(
+                    tf.zeros([1, self._cell.output_size], dtype=tf.float32))
+            self._shortlist_projection = shortlist_projection(
+                self._output_layer, candidate_ids)
+
+            # The helper runs over candidate positions. The start tokens
+            # are appended to the lookup table so that all positions,
+            # including the start, map to token indexes.
+            start_tokens = tf.to_int32(start_tokens)
+            id_table = tf.concat([candidate_ids, start_tokens], axis=0)
+            if callable(embedding):
+                token_embedding_fn = embedding
+            else:
+                embedding_params = embedding
+                token_embedding_fn = lambda ids: tf.nn.embedding_lookup(
+                    embedding_params, ids)
+            embedding = lambda ids: token_embedding_fn(
+                tf.gather(id_table, ids))
+            start_tokens = num_candidates + tf.range(tf.size(start_tokens))
+            end_token = _shortlist_index(candidate_ids, end_token)
+
         # Helper
         if helper is not None:
             pass
@@ -410,6 +475,11 @@ class RNNDecoderBase(ModuleBase, TFDecoder):
             decoder=self, impute_finished=impute_finished,
             maximum_iterations=max_l, output_time_major=output_time_major)
 
+        if id_table is not None:
+            # Maps candidate positions back to token indexes
+            outputs = outputs._replace(
+                sample_id=tf.gather(id_table, outputs.sample_id))
+
         if not self._built:
             self._add_internal_trainable_variables()
             # Add trainable variables of `self._cell` which may be
@@ -433,10 +503,27 @@ class RNNDecoderBase(ModuleBase, TFDecoder):
         self._beam_search_cell = self._cell
         return self._cell
 
+    def _apply_output_layer(self, cell_outputs):
+        """Returns the logits of cell outputs, or the cell outputs
+        themselves if the output layer is skipped.
+        """
+        if self._skip_output_layer:
+            return cell_outputs
+        if self._shortlist_projection is not None:
+            kernel, bias = self._shortlist_projection
+            logits = tf.matmul(cell_outputs, kernel)
+            if bias is not None:
+                logits += bias
+            return logits
+        return self._output_layer(cell_outputs)
+
     def _rnn_output_size(self):
         size = self._cell.output_size
-        if self._output_layer is tf.identity:
+        if self._output_layer is tf.identity or self._skip_output_layer:
             return size
+        elif self._shortlist_projection is not None:
+            kernel = self._shortlist_projection[0]
+            return tensor_shape.TensorShape([kernel.shape[1].value])
         else:
             # To use layer's compute_output_shape, we need to convert the
             # RNNCell's output_size entries into shapes with an unknown
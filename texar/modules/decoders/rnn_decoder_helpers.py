@@ -22,10 +22,14 @@ from __future__ import print_function
 import tensorflow as tf
 from tensorflow.contrib.seq2seq import TrainingHelper as TFTrainingHelper
 from tensorflow.contrib.seq2seq import Helper as TFHelper
+from tensorflow.contrib.seq2seq import SampleEmbeddingHelper \
+    as TFSampleEmbeddingHelper
 from tensorflow.contrib.distributions import RelaxedOneHotCategorical \
     as GumbelSoftmax
 
 from texar.modules.embedders.embedder_base import EmbedderBase
+from texar.modules.embedders.embedder_utils import \
+    sparse_soft_embedding_lookup
 from texar.utils import utils
 
 # pylint: disable=not-context-manager, too-many-arguments
@@ -38,6 +42,7 @@ __all__ = [
     "_get_training_helper",
     "GumbelSoftmaxEmbeddingHelper",
     "SoftmaxEmbeddingHelper",
+    "PrefixSampleEmbeddingHelper",
 ]
 
 def default_helper_train_hparams():
@@ -211,10 +216,16 @@ class SoftmaxEmbeddingHelper(TFHelper):
         use_finish (bool): Whether to stop decoding once `end_token` is
             generated. If `False`, decoding will continue until
             `max_decoding_length` of the decoder is reached.
+        top_k (int, optional): If given, only the embeddings of the
+            :attr:`top_k` most probable tokens are mixed to get the next
+            input (see `sparse_soft_embedding_lookup` in
+            :mod:`texar.modules.embedders.embedder_utils`), which saves
+            computation and memory with large vocabularies.
+            If `None` (default), the whole embedding matrix is mixed.
     """
 
     def __init__(self, embedding, start_tokens, end_token, tau,
-                 stop_gradient=False, use_finish=True):
+                 stop_gradient=False, use_finish=True, top_k=None):
         if isinstance(embedding, EmbedderBase):
             embedding = embedding.embedding
 
@@ -235,6 +246,7 @@ class SoftmaxEmbeddingHelper(TFHelper):
         self._tau = tau
         self._stop_gradient = stop_gradient
         self._use_finish = use_finish
+        self._top_k = top_k
 
     @property
     def batch_size(self):
@@ -267,7 +279,11 @@ class SoftmaxEmbeddingHelper(TFHelper):
             finished = tf.tile([False], [self._batch_size])
         if self._stop_gradient:
             sample_ids = tf.stop_gradient(sample_ids)
-        next_inputs = tf.matmul(sample_ids, self._embedding)
+        if self._top_k is None:
+            next_inputs = tf.matmul(sample_ids, self._embedding)
+        else:
+            next_inputs = sparse_soft_embedding_lookup(
+                self._embedding, sample_ids, top_k=self._top_k)
         return (finished, next_inputs, state)
 
 
@@ -304,11 +320,19 @@ class GumbelSoftmaxEmbeddingHelper(SoftmaxEmbeddingHelper):
         use_finish (bool): Whether to stop decoding once `end_token` is
             generated. If `False`, decoding will continue until
             `max_decoding_length` of the decoder is reached.
+        top_k (int, optional): If given, only the embeddings of the
+            :attr:`top_k` most probable tokens are mixed to get the next
+            input (see `sparse_soft_embedding_lookup` in
+            :mod:`texar.modules.embedders.embedder_utils`), which saves
+            computation and memory with large vocabularies.
+            If `None` (default), the whole embedding matrix is mixed.
     """
     def __init__(self, embedding, start_tokens, end_token, tau,
-                 straight_through=False, stop_gradient=False, use_finish=True):
+                 straight_through=False, stop_gradient=False, use_finish=True,
+                 top_k=None):
         super(GumbelSoftmaxEmbeddingHelper, self).__init__(
-            embedding, start_tokens, end_token, tau, stop_gradient, use_finish)
+            embedding, start_tokens, end_token, tau, stop_gradient, use_finish,
+            top_k=top_k)
         self._straight_through = straight_through
 
     def sample(self, time, outputs, state, name=None):
@@ -326,3 +350,67 @@ class GumbelSoftmaxEmbeddingHelper(SoftmaxEmbeddingHelper):
             sample_ids = tf.stop_gradient(sample_ids_hard - sample_ids) \
                          + sample_ids
         return sample_ids
+
+
+class PrefixSampleEmbeddingHelper(TFSampleEmbeddingHelper):
+    """A helper that feeds given prefixes and then samples the rest of the
+    sequences, e.g., to complete sequence prefixes with Monte Carlo
+    rollouts (see :func:`~texar.losses.reinforce_loss_with_MCtree`).
+
+    The `i`-th output sequence starts with
+    `given_actions[i, :given_lengths[i]]`, and the following tokens are
+    sampled from the decoder outputs as in
+    :tf_main:`SampleEmbeddingHelper <contrib/seq2seq/SampleEmbeddingHelper>`.
+
+    A subclass of
+    :tf_main:`Helper <contrib/seq2seq/Helper>`.
+    Used as a helper to :class:`~texar.modules.RNNDecoderBase` :meth:`_build`
+    in inference mode.
+
+    Args:
+        embedding: A callable or the `params` argument for
+            :tf_main:`tf.nn.embedding_lookup <nn/embedding_lookup>`, e.g.,
+            an instance of :class:`~texar.modules.WordEmbedder`.
+        start_tokens: An int tensor shaped `[batch_size]`. The
+            start tokens.
+        end_token: An int scalar tensor. The token that marks end of
+            decoding.
+        given_actions: An int tensor of shape `[batch_size, max_time]`,
+            the given prefixes (excluding the start tokens).
+        given_lengths: An int tensor of shape `[batch_size]`, the length
+            of each given prefix.
+        softmax_temperature (optional): A float scalar tensor, the softmax
+            temperature of sampling.
+        seed (optional): The sampling random seed.
+
+    Example:
+
+        .. code-block:: python
+
+            helper = PrefixSampleEmbeddingHelper(
+                embedder, start_tokens, end_token, sample_ids, prefix_lengths)
+            outputs, _, lengths = decoder(
+                helper=helper, max_decoding_length=max_length)
+    """
+
+    def __init__(self, embedding, start_tokens, end_token, given_actions,
+                 given_lengths, softmax_temperature=None, seed=None):
+        super(PrefixSampleEmbeddingHelper, self).__init__(
+            embedding, start_tokens, end_token,
+            softmax_temperature=softmax_temperature, seed=seed)
+        given_actions = tf.convert_to_tensor(
+            given_actions, dtype=tf.int32, name="given_actions")
+        # Padded so that there is a column to read at all steps
+        self._given_actions = tf.pad(given_actions, [[0, 0], [0, 1]])
+        self._given_lengths = tf.convert_to_tensor(
+            given_lengths, dtype=tf.int32, name="given_lengths")
+
+    def sample(self, time, outputs, state, name=None):
+        """Returns the given tokens at steps within the prefixes, and
+        sampled tokens otherwise. Shape = `[batch_size]`.
+        """
+        sample_ids = super(PrefixSampleEmbeddingHelper, self).sample(
+            time, outputs, state, name=name)
+        column = tf.minimum(time, tf.shape(self._given_actions)[1] - 1)
+        given_ids = self._given_actions[:, column]
+        return tf.where(time < self._given_lengths, given_ids, sample_ids)
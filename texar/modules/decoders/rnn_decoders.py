@@ -26,12 +26,14 @@ import collections
 import copy
 
 import tensorflow as tf
-from tensorflow.contrib.seq2seq import AttentionWrapper
+from tensorflow.contrib.seq2seq import AttentionWrapper, \
+    AttentionWrapperState
 from tensorflow.python.util import nest
 from tensorflow.contrib.seq2seq import tile_batch
 
 from texar.modules.decoders.rnn_decoder_base import RNNDecoderBase
 from texar.utils import utils
+from texar.utils.shapes import shape_list
 
 __all__ = [
     "BasicRNNDecoderOutput",
@@ -123,6 +125,11 @@ class BasicRNNDecoder(RNNDecoderBase):
             is used with output dimension set to :attr:`vocab_size`.
             Set `output_layer=tf.identity` if you do not want to have an
             output layer after the RNN cell outputs.
+            If an instance of :class:`~texar.core.SampledSoftmaxLayer` or
+            :class:`~texar.core.AdaptiveSoftmaxLayer`, `"train_greedy"`
+            decoding skips the layer, and `logits` of the outputs are the
+            RNN cell outputs, to be passed to the loss together with the
+            layer (see :class:`~texar.core.SampledSoftmaxLayer`).
         hparams (dict, optional): Hyperparameters. Missing
             hyperparamerter will be set to default values. See
             :meth:`default_hparams` for the hyperparameter sturcture and
@@ -245,7 +252,7 @@ class BasicRNNDecoder(RNNDecoderBase):
 
     def step(self, time, inputs, state, name=None):
         cell_outputs, cell_state = self._cell(inputs, state)
-        logits = self._output_layer(cell_outputs)
+        logits = self._apply_output_layer(cell_outputs)
         sample_ids = self._helper.sample(
             time=time, outputs=logits, state=cell_state)
         (finished, next_inputs, next_state) = self._helper.next_inputs(
@@ -283,6 +290,87 @@ class BasicRNNDecoder(RNNDecoderBase):
                 lambda _: dtype, self._cell.output_size))
 
 
+class _BeamBroadcastAttentionWrapper(tf.nn.rnn_cell.RNNCell):
+    """Runs an :tf_main:`AttentionWrapper <contrib/seq2seq/AttentionWrapper>`
+    built on a `[batch_size, ...]` memory for beam search inputs and states
+    of `[batch_size * beam_width, ...]`, without tiling the memory.
+
+    The beams are laid out in the order of
+    :tf_main:`tile_batch <contrib/seq2seq/tile_batch>`, i.e., the beams of
+    a batch entry are contiguous. At each step, inputs and states are
+    reshaped to `[batch_size, beam_width, ...]` and the wrapped cell runs
+    on each beam, so that only the public API of the cell is used and the
+    variables of the cell are reused.
+    """
+
+    def __init__(self, cell, beam_width):
+        super(_BeamBroadcastAttentionWrapper, self).__init__()
+        self._cell = cell
+        self._beam_width = beam_width
+
+    @property
+    def state_size(self):
+        return self._cell.state_size
+
+    @property
+    def output_size(self):
+        return self._cell.output_size
+
+    def _split_beams(self, x):
+        """Reshapes `[batch_size * beam_width, ...]` into
+        `[batch_size, beam_width, ...]`.
+        """
+        x_shape = shape_list(x)
+        return tf.reshape(x, [-1, self._beam_width] + x_shape[1:])
+
+    def _merge_beams(self, xs):
+        """Merges a list of `beam_width` tensors of `[batch_size, ...]` into
+        `[batch_size * beam_width, ...]`.
+        """
+        x = tf.stack(xs, axis=1)
+        x_shape = shape_list(x)
+        return tf.reshape(x, [-1] + x_shape[2:])
+
+    @staticmethod
+    def _map_state(fn, *states):
+        """Applies :attr:`fn` to the batch-major fields of
+        `AttentionWrapperState` :attr:`states`.
+        """
+        def _map(field):
+            return nest.map_structure(
+                fn, *[getattr(state, field) for state in states])
+        return AttentionWrapperState(
+            cell_state=_map('cell_state'),
+            attention=_map('attention'),
+            time=states[0].time,
+            alignments=_map('alignments'),
+            alignment_history=states[0].alignment_history,
+            attention_state=_map('attention_state'))
+
+    def zero_state(self, batch_size, dtype):
+        with tf.name_scope(type(self).__name__ + "ZeroState",
+                           values=[batch_size]):
+            state = self._cell.zero_state(
+                batch_size // self._beam_width, dtype)
+            return self._map_state(
+                lambda x: tile_batch(x, self._beam_width), state)
+
+    def call(self, inputs, state):
+        split_inputs = self._split_beams(inputs)
+        split_state = self._map_state(self._split_beams, state)
+        outputs, states = [], []
+        for i in range(self._beam_width):
+            beam_state = self._map_state(lambda x, i=i: x[:, i], split_state)
+            beam_outputs, beam_state = self._cell(
+                split_inputs[:, i], beam_state)
+            outputs.append(beam_outputs)
+            states.append(beam_state)
+
+        next_state = self._map_state(
+            lambda *xs: self._merge_beams(xs), *states)
+        return self._merge_beams(outputs), next_state
+
+
 class AttentionRNNDecoder(RNNDecoderBase):
     """RNN decoder with attention mechanism.
 
@@ -309,6 +397,11 @@ class AttentionRNNDecoder(RNNDecoderBase):
             is used with output dimension set to :attr:`vocab_size`.
             Set `output_layer=tf.identity` if you do not want to have an
             output layer after the RNN cell outputs.
+            If an instance of :class:`~texar.core.SampledSoftmaxLayer` or
+            :class:`~texar.core.AdaptiveSoftmaxLayer`, `"train_greedy"`
+            decoding skips the layer, and `logits` of the outputs are the
+            RNN cell outputs, to be passed to the loss together with the
+            layer (see :class:`~texar.core.SampledSoftmaxLayer`).
         cell_input_fn (callable, optional): A callable that produces RNN cell
             inputs. If `None` (default), the default is used:
             `lambda inputs, attention: tf.concat([inputs, attention], -1)`,
@@ -425,6 +518,7 @@ class AttentionRNNDecoder(RNNDecoderBase):
                     "attention_layer_size": None,
                     "alignment_history": False,
                     "output_attention": True,
+                    "beam_search_broadcast_memory": False,
                 },
                 # The following hyperparameters are the same as with
                 # `BasicRNNDecoder`
@@ -515,6 +609,20 @@ class AttentionRNNDecoder(RNNDecoderBase):
                     This flag only controls whether the attention mechanism
                     is propagated up to the next cell in an RNN stack or to
                     the top RNN output.
+
+                "beam_search_broadcast_memory": bool
+                    If `True`, beam search decoding (e.g.,
+                    :func:`~texar.modules.beam_search_decode`) keeps the
+                    memory, attention keys and memory masks at
+                    `[batch_size, ...]` and shares them across beams,
+                    instead of tiling the memory `beam_width` times. Memory
+                    cost then scales with the batch size rather than with
+                    `batch_size * beam_width`. Results are the same as
+                    tiling.
+
+                    The decoder cell then runs once per beam on
+                    `[batch_size, ...]` inputs at each step. Ignored, i.e.,
+                    the memory is tiled, if "alignment_history" is `True`.
         """
         hparams = RNNDecoderBase.default_hparams()
         hparams["name"] = "attention_rnn_decoder"
@@ -526,6 +634,7 @@ class AttentionRNNDecoder(RNNDecoderBase):
             "attention_layer_size": None,
             "alignment_history": False,
             "output_attention": True,
+            "beam_search_broadcast_memory": False,
         }
         return hparams
 
@@ -533,6 +642,12 @@ class AttentionRNNDecoder(RNNDecoderBase):
     def _get_beam_search_cell(self, beam_width):
         """Returns the RNN cell for beam search decoding.
         """
+        if self._hparams.attention.beam_search_broadcast_memory and \
+                not self._hparams.attention.alignment_history:
+            self._beam_search_cell = _BeamBroadcastAttentionWrapper(
+                self._cell, beam_width)
+            return self._beam_search_cell
+
         with tf.variable_scope(self.variable_scope, reuse=True):
             attn_kwargs = copy.copy(self._attn_kwargs)
 
@@ -573,7 +688,7 @@ class AttentionRNNDecoder(RNNDecoderBase):
     def step(self, time, inputs, state, name=None):
         wrapper_outputs, wrapper_state = self._cell(inputs, state)
         # Essentisally the same as in BasicRNNDecoder.step()
-        logits = self._output_layer(wrapper_outputs)
+        logits = self._apply_output_layer(wrapper_outputs)
         sample_ids = self._helper.sample(
             time=time, outputs=logits, state=wrapper_state)
         (finished, next_inputs, next_state) = self._helper.next_inputs(
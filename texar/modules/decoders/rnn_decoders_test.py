@@ -10,12 +10,15 @@ from __future__ import unicode_literals
 import numpy as np
 
 import tensorflow as tf
+from tensorflow.python.util import nest
 
 from texar.modules.decoders.rnn_decoders import BasicRNNDecoderOutput
 from texar.modules.decoders.rnn_decoders import BasicRNNDecoder
 from texar.modules.decoders.rnn_decoders import AttentionRNNDecoderOutput
 from texar.modules.decoders.rnn_decoders import AttentionRNNDecoder
 from texar.modules.decoders.rnn_decoder_helpers import get_helper
+from texar.modules.decoders.rnn_decoder_helpers import \
+    PrefixSampleEmbeddingHelper
 from texar import context
 
 # pylint: disable=no-member, too-many-locals, too-many-instance-attributes
@@ -200,6 +203,79 @@ class BasicRNNDecoderTest(tf.test.TestCase):
             self.assertEqual(final_state_[0].shape,
                              (self._batch_size, cell_dim))
 
+    def test_decode_infer_shortlist(self):
+        """Tests inference decoding over a candidate vocabulary.
+        """
+        decoder = BasicRNNDecoder(vocab_size=self._vocab_size)
+        candidate_ids = tf.constant([0, 2, self._vocab_size-1])
+        outputs, _, sequence_lengths = decoder(
+            decoding_strategy='infer_greedy',
+            embedding=self._embedding,
+            start_tokens=[self._vocab_size-2]*self._batch_size,
+            end_token=self._vocab_size-1,
+            max_decoding_length=self._max_time,
+            candidate_ids=candidate_ids)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, sequence_lengths_ = sess.run(
+                [outputs, sequence_lengths],
+                feed_dict={context.global_mode():
+                           tf.estimator.ModeKeys.PREDICT})
+            max_length = max(sequence_lengths_)
+            self.assertEqual(
+                outputs_.logits.shape, (self._batch_size, max_length, 3))
+            self.assertTrue(
+                np.all(np.isin(outputs_.sample_id, [0, 2, self._vocab_size-1])))
+
+    def test_decode_infer_shortlist_without_end_token(self):
+        """Tests that the candidate vocabulary must contain the end token.
+        """
+        decoder = BasicRNNDecoder(vocab_size=self._vocab_size)
+        outputs, _, _ = decoder(
+            decoding_strategy='infer_greedy',
+            embedding=self._embedding,
+            start_tokens=[self._vocab_size-2]*self._batch_size,
+            end_token=self._vocab_size-1,
+            max_decoding_length=self._max_time,
+            candidate_ids=tf.constant([0, 1, 2]))
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            with self.assertRaises(tf.errors.InvalidArgumentError):
+                sess.run(outputs,
+                         feed_dict={context.global_mode():
+                                    tf.estimator.ModeKeys.PREDICT})
+
+    def test_decode_infer_given_prefix(self):
+        """Tests sampling completions of given prefixes with
+        :class:`~texar.modules.PrefixSampleEmbeddingHelper`.
+        """
+        decoder = BasicRNNDecoder(vocab_size=self._vocab_size)
+        given_actions = tf.random_uniform(
+            [self._batch_size, 5], maxval=self._vocab_size, dtype=tf.int32)
+        given_lengths = tf.random_uniform(
+            [self._batch_size], maxval=6, dtype=tf.int32)
+        helper = PrefixSampleEmbeddingHelper(
+            self._embedding, [0]*self._batch_size, self._vocab_size,
+            given_actions, given_lengths)
+        outputs, _, sequence_lengths = decoder(
+            helper=helper, max_decoding_length=self._max_time)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, sequence_lengths_, given_actions_, given_lengths_ = \
+                sess.run([outputs, sequence_lengths, given_actions,
+                          given_lengths],
+                         feed_dict={context.global_mode():
+                                    tf.estimator.ModeKeys.PREDICT})
+            np.testing.assert_array_equal(
+                sequence_lengths_, [self._max_time]*self._batch_size)
+            for i in range(self._batch_size):
+                length = given_lengths_[i]
+                np.testing.assert_array_equal(
+                    outputs_.sample_id[i, :length], given_actions_[i, :length])
+
 
 class AttentionRNNDecoderTest(tf.test.TestCase):
     """Tests :class:`~texar.modules.decoders.rnn_decoders.AttentionRNNDecoder`.
@@ -367,5 +443,71 @@ class AttentionRNNDecoderTest(tf.test.TestCase):
         # Test if beam_cell is sharing variables with decoder cell.
         self.assertEqual(len(beam_cell.trainable_variables), 0)
 
+    def test_beam_search_broadcast_memory(self):
+        """Tests the beam search cell that shares the memory across
+        beams gives the same results as the one that tiles the memory.
+        """
+        for attention_hparams in [
+                {"type": "LuongAttention",
+                 "kwargs": {"num_units": self._attention_dim, "scale": True}},
+                {"type": "BahdanauAttention",
+                 "kwargs": {"num_units": self._attention_dim,
+                            "normalize": True},
+                 "attention_layer_size": self._attention_dim}]:
+            self._test_beam_search_broadcast_memory(attention_hparams)
+
+    def _test_beam_search_broadcast_memory(self, attention_hparams):
+        seq_length = np.random.randint(
+            self._max_time, size=[self._batch_size]) + 1
+        encoder_values_length = tf.constant(seq_length)
+        decoder = AttentionRNNDecoder(
+            memory=self._encoder_output,
+            memory_sequence_length=encoder_values_length,
+            vocab_size=self._vocab_size,
+            hparams={"attention": attention_hparams})
+
+        helper_train = get_helper(
+            decoder.hparams.helper_train.type,
+            inputs=self._inputs,
+            sequence_length=[self._max_time]*self._batch_size,
+            **decoder.hparams.helper_train.kwargs.todict())
+        _, _, _ = decoder(helper=helper_train)
+        num_trainable_variables = len(decoder.trainable_variables)
+
+        beam_width = 3
+        cell_input = tf.random_uniform([self._batch_size * beam_width,
+                                        self._emb_dim])
+        outputs, cell_states = [], []
+        for broadcast in [False, True]:
+            decoder.hparams.attention.beam_search_broadcast_memory = broadcast
+            beam_cell = decoder._get_beam_search_cell(beam_width)
+            cell_state = beam_cell.zero_state(self._batch_size * beam_width,
+                                              tf.float32)
+            for _ in range(2):
+                output, cell_state = beam_cell(cell_input, cell_state)
+            outputs.append(output)
+            cell_states.append(cell_state)
+            self.assertEqual(len(beam_cell.trainable_variables), 0)
+        self.assertEqual(len(decoder.trainable_variables),
+                         num_trainable_variables)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            (tiled_output_, broadcast_output_), \
+                (tiled_state_, broadcast_state_) = sess.run(
+                    [outputs, cell_states])
+            np.testing.assert_allclose(
+                tiled_output_, broadcast_output_, rtol=1e-5, atol=1e-6)
+            np.testing.assert_allclose(
+                tiled_state_.alignments, broadcast_state_.alignments,
+                rtol=1e-5, atol=1e-6)
+            np.testing.assert_allclose(
+                tiled_state_.attention, broadcast_state_.attention,
+                rtol=1e-5, atol=1e-6)
+            nest.map_structure(
+                lambda x, y: np.testing.assert_allclose(
+                    x, y, rtol=1e-5, atol=1e-6),
+                tiled_state_.cell_state, broadcast_state_.cell_state)
+
 if __name__ == "__main__":
     tf.test.main()
@@ -28,16 +28,19 @@ import tensorflow as tf
 from tensorflow.python.util import nest
 
 from texar.core import layers
+from texar.core.output_layers import SampledSoftmaxLayer, \
+    AdaptiveSoftmaxLayer, shortlist_projection, _shortlist_index
 from texar.module_base import ModuleBase
 from texar.modules.networks.networks import FeedForwardNetwork
 from texar.modules.embedders.position_embedders import SinusoidsPositionEmbedder
 from texar.modules.encoders.transformer_encoders import \
     default_transformer_poswise_net_hparams
 from texar.modules.encoders.multihead_attention import \
-    MultiheadAttentionEncoder
+    MultiheadAttentionEncoder, init_self_attention_cache
 from texar.utils import beam_search
 from texar.utils.shapes import shape_list, mask_sequences
 from texar.utils import transformer_attentions as attn
+from texar.utils import transformer_utils
 from texar.utils.mode import is_train_mode
 
 __all__ = [
@@ -45,6 +48,9 @@ __all__ = [
     "TransformerDecoder"
 ]
 
+# The maximum length of the preallocated self attention cache
+_MAX_PREALLOCATED_CACHE_LENGTH = 16384
+
 
 class TransformerDecoderOutput(
         collections.namedtuple("TransformerDecoderOutput",
@@ -76,11 +82,25 @@ class TransformerDecoder(ModuleBase):
             hyperparamerter will be set to default values. See
             :meth:`default_hparams` for the hyperparameter sturcture and
             default values.
+        output_layer (optional): An instance of
+            :tf_main:`tf.layers.Layer <layers/Layer>`, or
+            :tf_main:`tf.identity <identity>`, that is applied to the
+            decoder outputs to get logits. If `None` (default), the output
+            layer is built as specified in :attr:`hparams` (e.g., tied with
+            :attr:`embedding`). Set `output_layer=tf.identity` to get the
+            decoder hidden states as `logits` in `train_greedy` decoding,
+            e.g., to compute the loss from the hidden states without
+            materializing the full logits (see
+            :func:`~texar.losses.sequence_sparse_softmax_cross_entropy_with_projection`).
+            If an instance of :class:`~texar.core.SampledSoftmaxLayer` or
+            :class:`~texar.core.AdaptiveSoftmaxLayer`, `train_greedy`
+            decoding skips the layer and returns the hidden states as
+            `logits` as well, while inference decoding applies the layer.
 
     .. document private functions
     .. automethod:: _build
     """
-    def __init__(self, embedding, hparams=None):
+    def __init__(self, embedding, hparams=None, output_layer=None):
         ModuleBase.__init__(self, hparams)
 
         with tf.variable_scope(self.variable_scope):
@@ -95,19 +115,32 @@ class TransformerDecoder(ModuleBase):
             self._embedding = embedding
             self._vocab_size = self._embedding.get_shape().as_list()[0]
 
-            self.output_layer = \
-                self._build_output_layer(shape_list(self._embedding)[-1])
+            self._output_bias = None
+            self._tied_output_layer = \
+                output_layer is None and self._hparams.embedding_tie
+            if output_layer is None:
+                self.output_layer = \
+                    self._build_output_layer(shape_list(self._embedding)[-1])
+            elif output_layer is tf.identity or \
+                    isinstance(output_layer, tf.layers.Layer):
+                self.output_layer = output_layer
+            else:
+                raise ValueError(
+                    "`output_layer` must be either `tf.identity` or "
+                    "an instance of `tf.layers.Layer`.")
             self.multihead_attentions = {
                 'self_att': [],
                 'encdec_att': []
             }
             self.poswise_networks = []
+            self_attention_hparams = self._hparams.multihead_attention.todict()
+            self_attention_hparams['local_attention']['causal'] = True
             for i in range(self._hparams.num_blocks):
                 layer_name = 'layer_{}'.format(i)
                 with tf.variable_scope(layer_name):
                     with tf.variable_scope("self_attention"):
                         multihead_attention = MultiheadAttentionEncoder(
-                            self._hparams.multihead_attention)
+                            self_attention_hparams)
                         self.multihead_attentions['self_att'].append(
                             multihead_attention)
                     # pylint: disable=protected-access
@@ -154,12 +187,21 @@ class TransformerDecoder(ModuleBase):
                 "multihead_attention": {
                     "num_units": 512,
                     "num_heads": 8,
+                    "local_attention": {
+                        "block_size": None,
+                        "num_neighbor_blocks": 1,
+                        "num_global_tokens": 0,
+                    },
                 },
                 "initializer": None,
                 # Additional for TransformerDecoder
                 "embedding_tie": True,
                 "output_layer_bias": False,
                 "max_decoding_length": 1e10,
+                "preallocate_cache": False,
+                "beam_search_backpointers": False,
+                "compact_finished": False,
+                "recompute": False,
                 "name": "transformer_decoder"
             }
 
@@ -199,6 +241,12 @@ class TransformerDecoder(ModuleBase):
             See :func:
                 `~texar.modules.encoder.MultiheadAttentionEncoder.
                 default_harams` for details.
+
+            Setting "local_attention.block_size" uses block-sparse local
+            self attention in "train_greedy" decoding, whose cost is linear
+            in the sequence length. Self attention is always causal, and
+            incremental decoding masks each step to the same window. It does
+            not support :attr:`segment_ids` in :meth:`_build`.
             `
         "initializer" : dict, optional
             Hyperparameters of the default initializer that initializes
@@ -222,6 +270,40 @@ class TransformerDecoder(ModuleBase):
             Length penalty coefficient. Refer to
             https://arxiv.org/abs/1609.08144 for more details.
 
+        "preallocate_cache" : bool
+            Whether to preallocate fixed-size self attention key/value
+            buffers of length `max_decoding_length` in inference decoding.
+            If `True`, the keys and values of each step are written into
+            the buffers at the step index, instead of being concatenated
+            to a growing cache, and attention runs over the positions
+            already decoded. Requires setting `max_decoding_length`
+            (in :meth:`_build` or the hparam) explicitly to a value no
+            larger than 16384.
+
+        "beam_search_backpointers" : bool
+            Whether beam search keeps only the token ids and parent beams
+            of each step, and reconstructs the sequences with a backtrace
+            at the end (see
+            :func:`~texar.utils.beam_search.beam_search_with_backpointers`).
+            Otherwise, the decoded sequences are grown and reordered at
+            each step.
+
+        "compact_finished" : bool
+            Whether to remove the finished batch items, together with their
+            caches, from the inference decoding loop, so that later steps
+            only compute on the unfinished ones. In greedy and sample
+            decoding, the positions after the end of a sequence then have
+            zero-valued `sample_id` and `logits`. In beam search, a batch
+            item is removed once its best sequences are determined. Not
+            supported together with "beam_search_backpointers".
+
+        "recompute" : bool
+            If `True`, the intermediate activations of each block are
+            recomputed in the backward pass of "train_greedy" decoding
+            instead of being stored, and only the block outputs are kept.
+            See :func:`~texar.core.recompute_grad`. Inference decoding is
+            not affected.
+
         "name" : str
             Name of the module.
         """
@@ -232,6 +314,10 @@ class TransformerDecoder(ModuleBase):
             "embedding_tie": True,
             "output_layer_bias": False,
             "max_decoding_length": 1e10,
+            "preallocate_cache": False,
+            "beam_search_backpointers": False,
+            "compact_finished": False,
+            "recompute": False,
             "embedding_dropout": 0.1,
             "residual_dropout": 0.1,
             "poswise_feedforward": default_transformer_poswise_net_hparams(),
@@ -240,6 +326,11 @@ class TransformerDecoder(ModuleBase):
                 'dropout_rate': 0.1,
                 'output_dim': 512,
                 'num_heads': 8,
+                'local_attention': {
+                    'block_size': None,
+                    'num_neighbor_blocks': 1,
+                    'num_global_tokens': 0,
+                },
             },
             "dim": 512,
             "name": "transformer_decoder",
@@ -250,39 +341,71 @@ class TransformerDecoder(ModuleBase):
         token_emb = tf.nn.embedding_lookup(self._embedding, tokens)
         return token_emb
 
-    def _symbols_to_logits_fn(self, embedding_fn, max_length):
+    def _symbols_to_logits_fn(self, embedding_fn, output_fn=None):
         """Returns a function that accepts the decoded tokens and related
         decoding status, and returns the logits of next token.
+
+        :attr:`output_fn` maps the decoder outputs to logits. If `None`,
+        :attr:`output_layer` is used.
         """
-        positions = tf.expand_dims(tf.range(max_length, dtype=tf.int32), 0)
-        timing_signal = self.position_embedder(positions)
+        if output_fn is None:
+            output_fn = self.output_layer
         #you can use the comment to prevent the model to decode <UNK> token
         #biases = np.ones([1, self._vocab_size])
         #biases[0][3] = -np.inf
-        def _impl(ids, step, cache):
+        def _impl(ids, step, cache, memory_cache):
             """The function is called in dynamic decoding.
 
             `ids` should be next_id of shape `[batch_size, decoded_lenth]`
 
+            `memory_cache` holds the decoding states that do not change
+            across steps (see :meth:`_init_memory_cache`).
+
             Returned logits is of shape `[batch_size, vocab_size]`
             """
             ids = ids[:, -1:]
             inputs = embedding_fn(ids)
             # Multiply embedding by sqrt of its dimention
             inputs *= self._embedding.shape.as_list()[-1]**0.5
-            inputs += timing_signal[:, step:step+1]
+            inputs += self.position_embedder(step=step)
             outputs = self._self_attention_stack(
                 inputs,
-                memory=cache['memory'],
+                memory=memory_cache['memory'],
+                decoder_self_attention_bias=None,
                 cache=cache,
+                memory_cache=memory_cache,
+                step=step,
             )
-            logits = self.output_layer(outputs)
+            logits = output_fn(outputs)
             logits = tf.squeeze(logits, axis=[1])
             #logits = tf.multiply(logits, biases)
             return logits, cache
 
         return _impl
 
+    def _shortlist_output_fn(self, candidate_ids):
+        """Returns a function that maps the decoder outputs to the logits
+        of the candidate tokens :attr:`candidate_ids` only.
+        """
+        if self._tied_output_layer:
+            kernel, bias = shortlist_projection(
+                self._embedding, candidate_ids)
+            if self._output_bias is not None:
+                bias = tf.gather(self._output_bias, candidate_ids)
+        else:
+            kernel, bias = shortlist_projection(
+                self.output_layer, candidate_ids)
+
+        def _outputs_to_logits(outputs):
+            shape = shape_list(outputs)
+            outputs = tf.reshape(outputs, [-1, shape[-1]])
+            logits = tf.matmul(outputs, kernel)
+            if bias is not None:
+                logits += bias
+            return tf.reshape(logits, shape[:-1] + [tf.size(candidate_ids)])
+
+        return _outputs_to_logits
+
     def _build(self,    # pylint: disable=arguments-differ
                memory,
                memory_sequence_length=None,
@@ -295,7 +418,11 @@ class TransformerDecoder(ModuleBase):
                start_tokens=None,
                end_token=None,
                max_decoding_length=None,
-               mode=None):
+               mode=None,
+               candidate_ids=None,
+               segment_ids=None,
+               positions=None,
+               memory_segment_ids=None):
         """Performs decoding.
 
         The decoder supports 4 decoding strategies. For the first 3 strategies,
@@ -374,6 +501,35 @@ class TransformerDecoder(ModuleBase):
                 `TRAIN`, `EVAL`, and `PREDICT`. Controls dropout mode.
                 If `None` (default), :func:`texar.global_mode`
                 is used.
+            candidate_ids (optional): A 1D int Tensor of candidate token
+                indexes for inference decoding, e.g., the target words of
+                a source-to-target lexical table for the batch plus the
+                most frequent words. If given, each decoding step only
+                projects onto the candidates instead of the full vocabulary.
+                The returned `sample_id` are still token indexes in the
+                vocabulary, while the returned `logits` are over the
+                candidates, in the order of :attr:`candidate_ids`.
+                The candidates must contain :attr:`end_token`, and must be
+                unique. Ignored in "train_greedy" decoding.
+            segment_ids (optional): An int Tensor of shape
+                `[batch_size, target_max_time]` for packed target sequences,
+                where each row contains several examples, e.g., as produced
+                by :func:`~texar.utils.transformer_utils.pack_sequences`.
+                Tokens only attend to previous tokens of the same segment,
+                and segment id `0` denotes padding. Only used in
+                "train_greedy" decoding. Requires :attr:`memory_segment_ids`
+                unless :attr:`memory_attention_bias` is provided.
+            positions (optional): An int Tensor of shape
+                `[batch_size, target_max_time]`, the positions of tokens
+                within their segments. Only used when :attr:`segment_ids`
+                is given. If `None`, positions are inferred from
+                :attr:`segment_ids`.
+            memory_segment_ids (optional): An int Tensor of shape
+                `[batch_size, memory_max_time]`, the segment ids of the
+                packed memory. If given, tokens only attend to memory
+                positions of the same segment, and :attr:`segment_ids` is
+                required. Ignored if :attr:`memory_attention_bias` is
+                provided.
 
         Returns:
 
@@ -398,7 +554,28 @@ class TransformerDecoder(ModuleBase):
                 `[batch_size, beam_width]` containing the log probability \
                 of each sequence sample.
         """
-        if memory_attention_bias is None:
+        is_train_greedy = \
+            beam_width <= 1 and decoding_strategy == 'train_greedy'
+        if segment_ids is not None:
+            if not is_train_greedy:
+                raise ValueError(
+                    "`segment_ids` is only supported in 'train_greedy' "
+                    "decoding.")
+            segment_ids = tf.to_int32(segment_ids)
+            if memory_attention_bias is None and memory_segment_ids is None:
+                raise ValueError(
+                    "`memory_segment_ids` (or `memory_attention_bias`) is "
+                    "required if `segment_ids` is given, so that tokens "
+                    "only attend to the memory of their own segments.")
+
+        if memory_attention_bias is None and memory_segment_ids is not None:
+            if segment_ids is None:
+                raise ValueError(
+                    "`segment_ids` is required if `memory_segment_ids` "
+                    "is given.")
+            memory_attention_bias = attn.attention_bias_segment(
+                segment_ids, tf.to_int32(memory_segment_ids))
+        elif memory_attention_bias is None:
             if memory_sequence_length is None:
                 raise ValueError(
                     "`memory_sequence_length` is required if "
@@ -412,19 +589,46 @@ class TransformerDecoder(ModuleBase):
             memory_attention_bias = attn.attention_bias_ignore_padding(
                 enc_padding)
 
-        if beam_width <= 1 and decoding_strategy == 'train_greedy':
-            if sequence_length is not None:
+        if is_train_greedy:
+            inputs_padding = None
+            if segment_ids is not None:
+                inputs_padding = tf.to_float(tf.equal(segment_ids, 0))
+                inputs = inputs * tf.expand_dims(1. - inputs_padding, -1)
+            elif sequence_length is not None:
                 inputs = mask_sequences(inputs, sequence_length, tensor_rank=3)
-
-            decoder_self_attention_bias = (
-                attn.attention_bias_lower_triangle(
-                    shape_list(inputs)[1]))
+                inputs_padding = 1 - tf.sequence_mask(
+                    sequence_length, tf.shape(inputs)[1], dtype=tf.float32)
+
+            if self._hparams.multihead_attention.local_attention.block_size:
+                if segment_ids is not None:
+                    raise ValueError(
+                        '`segment_ids` is not supported with local '
+                        'attention.')
+                # Causal masking is applied within each attention block
+                decoder_self_attention_bias = None
+            else:
+                decoder_self_attention_bias = (
+                    attn.attention_bias_lower_triangle(
+                        shape_list(inputs)[1]))
+            if segment_ids is not None:
+                decoder_self_attention_bias += attn.attention_bias_segment(
+                    segment_ids)
             target_inputs = inputs * self._hparams.dim**0.5
 
             _, lengths, _ = shape_list(target_inputs)
-            positions = tf.expand_dims(tf.range(lengths, dtype=tf.int32), 0)
+            if segment_ids is None:
+                positions = tf.expand_dims(
+                    tf.range(lengths, dtype=tf.int32), 0)
+            elif positions is None:
+                positions = transformer_utils.get_segment_positions(
+                    segment_ids)
             pos_embeds = self.position_embedder(positions)
 
+            pad_remover = None
+            if inputs_padding is not None:
+                pad_remover = transformer_utils.PadRemover(
+                    inputs_padding)
+
             inputs = target_inputs + pos_embeds
 
             decoder_output = self._self_attention_stack(
@@ -433,8 +637,16 @@ class TransformerDecoder(ModuleBase):
                 decoder_self_attention_bias=decoder_self_attention_bias,
                 memory_attention_bias=memory_attention_bias,
                 cache=None,
-                mode=mode)
-            logits = self.output_layer(decoder_output)
+                mode=mode,
+                pad_remover=pad_remover)
+            if isinstance(self.output_layer,
+                          (SampledSoftmaxLayer, AdaptiveSoftmaxLayer)):
+                # The layer is applied in the loss
+                if not self.output_layer.built:
+                    self.output_layer(tf.zeros([1, self._hparams.dim]))
+                logits = decoder_output
+            else:
+                logits = self.output_layer(decoder_output)
             preds = tf.to_int32(tf.argmax(logits, axis=-1))
             output = TransformerDecoderOutput(
                 logits=logits,
@@ -446,6 +658,8 @@ class TransformerDecoder(ModuleBase):
 
             if max_decoding_length is None:
                 max_decoding_length = self._hparams.max_decoding_length
+            if candidate_ids is not None:
+                candidate_ids = tf.to_int32(candidate_ids)
 
             if beam_width <= 1:
                 logits, preds, sequence_length = self._infer_decoding(
@@ -456,6 +670,7 @@ class TransformerDecoder(ModuleBase):
                     memory=memory,
                     memory_attention_bias=memory_attention_bias,
                     decoding_strategy=decoding_strategy,
+                    candidate_ids=candidate_ids,
                 )
                 output = TransformerDecoderOutput(
                     logits=logits,
@@ -472,6 +687,7 @@ class TransformerDecoder(ModuleBase):
                     decode_length=max_decoding_length,
                     memory=memory,
                     memory_attention_bias=memory_attention_bias,
+                    candidate_ids=candidate_ids,
                 )
                 predictions = {
                     'sample_id': sample_id,
@@ -481,6 +697,9 @@ class TransformerDecoder(ModuleBase):
 
         if not self._built:
             self._add_internal_trainable_variables()
+            if isinstance(self.output_layer, tf.layers.Layer):
+                self._add_trainable_variable(
+                    self.output_layer.trainable_variables)
             self._built = True
 
         return rets
@@ -491,63 +710,108 @@ class TransformerDecoder(ModuleBase):
                               decoder_self_attention_bias=None,
                               memory_attention_bias=None,
                               cache=None,
-                              mode=None):
+                              memory_cache=None,
+                              mode=None,
+                              step=None,
+                              pad_remover=None):
         """Stacked multihead attention module.
+
+        If :attr:`pad_remover` is given, the position-wise feed-forward
+        networks are applied to non-padding positions only.
         """
         inputs = tf.layers.dropout(inputs,
                                    rate=self._hparams.embedding_dropout,
                                    training=is_train_mode(mode))
         if cache is not None:
             memory_attention_bias = \
-                cache['memory_attention_bias']
+                memory_cache['memory_attention_bias']
         else:
-            assert decoder_self_attention_bias is not None
+            assert decoder_self_attention_bias is not None or \
+                self._hparams.multihead_attention.local_attention.block_size
 
         x = inputs
         for i in range(self._hparams.num_blocks):
             layer_name = 'layer_{}'.format(i)
             layer_cache = cache[layer_name] if cache is not None else None
-            with tf.variable_scope(layer_name):
-                with tf.variable_scope("self_attention"):
-                    multihead_attention = \
-                        self.multihead_attentions['self_att'][i]
-                    selfatt_output = multihead_attention(
-                        queries=layers.layer_normalize(x),
-                        memory=None,
-                        memory_attention_bias=decoder_self_attention_bias,
-                        cache=layer_cache,
-                        mode=mode,
-                    )
-                    x = x + tf.layers.dropout(
-                        selfatt_output,
-                        rate=self._hparams.residual_dropout,
-                        training=is_train_mode(mode),
-                    )
-                if memory is not None:
-                    with tf.variable_scope('encdec_attention'):
-                        multihead_attention = \
-                            self.multihead_attentions['encdec_att'][i]
-                        encdec_output = multihead_attention(
-                            queries=layers.layer_normalize(x),
-                            memory=memory,
-                            memory_attention_bias=memory_attention_bias,
-                            mode=mode,
-                        )
-                        x = x + tf.layers.dropout(
-                            encdec_output,
-                            rate=self._hparams.residual_dropout,
-                            training=is_train_mode(mode))
-                poswise_network = self.poswise_networks[i]
-                with tf.variable_scope('past_poswise_ln'):
-                    sub_output = tf.layers.dropout(
-                        poswise_network(layers.layer_normalize(x)),
-                        rate=self._hparams.residual_dropout,
-                        training=is_train_mode(mode),
-                    )
-                    x = x + sub_output
+            layer_memory_cache = memory_cache[layer_name] \
+                if memory_cache is not None else None
+            with tf.variable_scope(layer_name) as block_scope:
+                if self._hparams.recompute and cache is None:
+                    # Memory is an input of the blocks to get its gradients
+                    block_inputs = [x] if memory is None else [x, memory]
+                    x = layers.recompute_grad(
+                        lambda x_, memory_=None, i_=i: self._block(
+                            i_, x_, memory_, decoder_self_attention_bias,
+                            memory_attention_bias, mode=mode,
+                            pad_remover=pad_remover),
+                        block_inputs, variables=block_scope.trainable_variables)
+                else:
+                    x = self._block(
+                        i, x, memory, decoder_self_attention_bias,
+                        memory_attention_bias, layer_cache=layer_cache,
+                        layer_memory_cache=layer_memory_cache, mode=mode,
+                        step=step, pad_remover=pad_remover)
 
         return layers.layer_normalize(x)
 
+    def _block(self, i, x, memory, decoder_self_attention_bias,
+               memory_attention_bias, layer_cache=None,
+               layer_memory_cache=None, mode=None, step=None,
+               pad_remover=None):
+        """Applies the :attr:`i`-th block (self attention, encoder-decoder
+        attention and position-wise feed-forward network) on :attr:`x`.
+        """
+        with tf.variable_scope("self_attention"):
+            multihead_attention = \
+                self.multihead_attentions['self_att'][i]
+            selfatt_output = multihead_attention(
+                queries=layers.layer_normalize(x),
+                memory=None,
+                memory_attention_bias=decoder_self_attention_bias,
+                cache=layer_cache,
+                mode=mode,
+                step=step,
+            )
+            x = x + layers.dropout(
+                selfatt_output,
+                rate=self._hparams.residual_dropout,
+                training=is_train_mode(mode),
+            )
+        if memory is not None:
+            with tf.variable_scope('encdec_attention'):
+                multihead_attention = \
+                    self.multihead_attentions['encdec_att'][i]
+                encdec_output = multihead_attention(
+                    queries=layers.layer_normalize(x),
+                    memory=memory,
+                    memory_attention_bias=memory_attention_bias,
+                    cache=layer_memory_cache,
+                    mode=mode,
+                )
+                x = x + layers.dropout(
+                    encdec_output,
+                    rate=self._hparams.residual_dropout,
+                    training=is_train_mode(mode))
+        poswise_network = self.poswise_networks[i]
+        with tf.variable_scope('past_poswise_ln'):
+            y = layers.layer_normalize(x)
+            if pad_remover:
+                original_shape = shape_list(y)
+                y = tf.reshape(y, [-1, self._hparams.dim])
+                y = tf.expand_dims(pad_remover.remove(y), axis=0)
+                # [1, batch_size*seq_length, hidden_dim]
+            sub_output = layers.dropout(
+                poswise_network(y),
+                rate=self._hparams.residual_dropout,
+                training=is_train_mode(mode),
+            )
+            if pad_remover:
+                sub_output = tf.reshape(pad_remover.restore(
+                    tf.squeeze(sub_output, axis=0)), original_shape)
+            x = x + sub_output
+
+        return x
+
     def _build_output_layer(self, dim):
         if self._hparams.embedding_tie:
             if self._hparams.output_layer_bias:
@@ -556,6 +820,7 @@ class TransformerDecoder(ModuleBase):
                         'affine_bias', [self._vocab_size])
             else:
                 affine_bias = None
+            self._output_bias = affine_bias
 
             def _outputs_to_logits(outputs):
                 shape = shape_list(outputs)
@@ -574,21 +839,61 @@ class TransformerDecoder(ModuleBase):
             layer.build([None, dim])
             return layer
 
-    def _init_cache(self, memory, memory_attention_bias):
-        cache = {
+    def _init_cache(self, memory, decode_length):
+        """Returns the self attention cache of each layer, which is updated
+        at each decoding step.
+        """
+        cache = {}
+        batch_size = tf.shape(memory)[0]
+        depth = self._hparams.multihead_attention.num_units
+        num_heads = self._hparams.multihead_attention.num_heads
+        if self._hparams.preallocate_cache:
+            if tf.contrib.framework.is_tensor(decode_length):
+                assert_op = tf.assert_less_equal(
+                    decode_length,
+                    tf.cast(_MAX_PREALLOCATED_CACHE_LENGTH,
+                            decode_length.dtype),
+                    message='"preallocate_cache" requires '
+                            '`max_decoding_length` to be at most %d.'
+                            % _MAX_PREALLOCATED_CACHE_LENGTH)
+                with tf.control_dependencies([assert_op]):
+                    max_length = tf.to_int32(decode_length)
+            else:
+                # Also rejects inf and nan
+                if not 0 < decode_length <= _MAX_PREALLOCATED_CACHE_LENGTH:
+                    raise ValueError(
+                        '"preallocate_cache" requires an explicit '
+                        '`max_decoding_length` in (0, %d], but got %s.'
+                        % (_MAX_PREALLOCATED_CACHE_LENGTH, decode_length))
+                max_length = tf.to_int32(decode_length)
+        else:
+            max_length = None
+        for l in range(self._hparams.num_blocks):
+            cache['layer_{}'.format(l)] = init_self_attention_cache(
+                batch_size, num_heads, depth, max_length=max_length)
+        return cache
+
+    def _init_memory_cache(self, memory, memory_attention_bias):
+        """Projects :attr:`memory` into the encoder-decoder attention keys and
+        values of all layers once before decoding.
+
+        The returned cache stays unchanged across decoding steps and has
+        batch size `batch_size` even in beam search, where the queries of
+        the beams attend to the shared memory row.
+        """
+        memory_cache = {
             'memory': memory,
             'memory_attention_bias': memory_attention_bias,
         }
-        batch_size = tf.shape(memory)[0]
-        depth = self._hparams.multihead_attention.num_units
         for l in range(self._hparams.num_blocks):
-            cache['layer_{}'.format(l)] = {
-                'self_keys': tf.zeros([batch_size, 0, depth]),
-                'self_values': tf.zeros([batch_size, 0, depth]),
-                'memory_keys': tf.zeros([batch_size, 0, depth]),
-                'memory_values': tf.zeros([batch_size, 0, depth]),
+            multihead_attention = self.multihead_attentions['encdec_att'][l]
+            memory_keys, memory_values = \
+                multihead_attention.project_memory(memory)
+            memory_cache['layer_{}'.format(l)] = {
+                'memory_keys': memory_keys,
+                'memory_values': memory_values,
             }
-        return cache
+        return memory_cache
 
     def _infer_decoding(self,
                         embedding_fn,
@@ -597,33 +902,44 @@ class TransformerDecoder(ModuleBase):
                         decode_length,
                         memory,
                         memory_attention_bias,
-                        decoding_strategy):
+                        decoding_strategy,
+                        candidate_ids=None):
         """Performs "infer_greedy" or "infer_sample" decoding.
         """
+        if self._hparams.compact_finished:
+            return self._infer_decoding_compact(
+                embedding_fn, start_tokens, end_token, decode_length, memory,
+                memory_attention_bias, decoding_strategy, candidate_ids)
+
+        if candidate_ids is None:
+            vocab_size = self._vocab_size
+            output_fn = None
+        else:
+            vocab_size = tf.size(candidate_ids)
+            output_fn = self._shortlist_output_fn(candidate_ids)
+
         batch_size = tf.shape(start_tokens)[0]
         finished = tf.fill([batch_size], False)
         seq_length = tf.zeros([batch_size], dtype=tf.int32)
         step = tf.constant(0)
         decoded_ids = tf.zeros([batch_size, 0], dtype=tf.int32)
-        logits_list = tf.zeros([batch_size, 0, self._vocab_size],
+        logits_list = tf.zeros([batch_size, 0, vocab_size],
                                dtype=tf.float32)
         next_id = tf.expand_dims(start_tokens, 1)
 
-        cache = self._init_cache(memory, memory_attention_bias)
+        cache = self._init_cache(memory, decode_length)
+        memory_cache = self._init_memory_cache(memory, memory_attention_bias)
         symbols_to_logits_fn = self._symbols_to_logits_fn(
             embedding_fn,
-            max_length=decode_length+1
+            output_fn=output_fn
         )
 
         def _body(step, finished, next_id, decoded_ids, cache, logits_list,
                   seq_length):
-            logits, cache = symbols_to_logits_fn(next_id, step, cache)
-
-            if decoding_strategy == 'infer_greedy':
-                next_id = tf.argmax(logits, -1, output_type=tf.int32)
-            elif decoding_strategy == 'infer_sample':
-                sample_id_sampler = tf.distributions.Categorical(logits=logits)
-                next_id = sample_id_sampler.sample()
+            logits, cache = symbols_to_logits_fn(
+                next_id, step, cache, memory_cache)
+            next_id = self._sample_next_id(
+                logits, decoding_strategy, candidate_ids)
 
             cur_finished = tf.equal(next_id, end_token)
 
@@ -669,6 +985,112 @@ class TransformerDecoder(ModuleBase):
 
         return logits_list, decoded_ids, seq_length
 
+    @staticmethod
+    def _sample_next_id(logits, decoding_strategy, candidate_ids=None):
+        if decoding_strategy == 'infer_greedy':
+            next_id = tf.argmax(logits, -1, output_type=tf.int32)
+        elif decoding_strategy == 'infer_sample':
+            sample_id_sampler = tf.distributions.Categorical(logits=logits)
+            next_id = sample_id_sampler.sample()
+        if candidate_ids is not None:
+            # Maps candidate positions back to token indexes
+            next_id = tf.gather(candidate_ids, next_id)
+        return next_id
+
+    def _infer_decoding_compact(self,
+                                embedding_fn,
+                                start_tokens,
+                                end_token,
+                                decode_length,
+                                memory,
+                                memory_attention_bias,
+                                decoding_strategy,
+                                candidate_ids=None):
+        """Performs "infer_greedy" or "infer_sample" decoding, removing the
+        finished batch items and their caches from the loop. The outputs
+        of each step are scattered back to the full batch.
+        """
+        if candidate_ids is None:
+            vocab_size = self._vocab_size
+            output_fn = None
+        else:
+            vocab_size = tf.size(candidate_ids)
+            output_fn = self._shortlist_output_fn(candidate_ids)
+        batch_size = tf.shape(start_tokens)[0]
+        seq_length = tf.zeros([batch_size], dtype=tf.int32)
+        step = tf.constant(0)
+        active_indices = tf.range(batch_size)
+        next_id = tf.expand_dims(start_tokens, 1)
+        ids_ta = tf.TensorArray(tf.int32, size=0, dynamic_size=True)
+        logits_ta = tf.TensorArray(tf.float32, size=0, dynamic_size=True)
+
+        cache = self._init_cache(memory, decode_length)
+        memory_cache = self._init_memory_cache(memory, memory_attention_bias)
+        symbols_to_logits_fn = self._symbols_to_logits_fn(
+            embedding_fn,
+            output_fn=output_fn
+        )
+
+        def _body(step, active_indices, next_id, cache, memory_cache,
+                  ids_ta, logits_ta, seq_length):
+            logits, cache = symbols_to_logits_fn(
+                next_id, step, cache, memory_cache)
+            next_id = self._sample_next_id(
+                logits, decoding_strategy, candidate_ids)
+            cur_finished = tf.equal(next_id, end_token)
+
+            scatter_indices = tf.expand_dims(active_indices, axis=1)
+            ids_ta = ids_ta.write(step, tf.scatter_nd(
+                scatter_indices, next_id, [batch_size]))
+            logits_ta = logits_ta.write(step, tf.scatter_nd(
+                scatter_indices, logits, [batch_size, vocab_size]))
+            seq_length += tf.scatter_nd(
+                scatter_indices,
+                tf.to_int32(cur_finished) * (step + 1),
+                [batch_size])
+
+            next_id = tf.expand_dims(next_id, axis=1)
+            loop_vars = (active_indices, next_id, cache, memory_cache)
+
+            def _compact():
+                keep_pos = tf.where(tf.logical_not(cur_finished))[:, 0]
+                return nest.map_structure(
+                    lambda t: tf.gather(t, keep_pos), loop_vars)
+
+            active_indices, next_id, cache, memory_cache = tf.cond(
+                tf.reduce_any(cur_finished), _compact, lambda: loop_vars)
+
+            return step+1, active_indices, next_id, cache, memory_cache, \
+                    ids_ta, logits_ta, seq_length
+
+        def _not_finished(i, active_indices, *_):
+            return (i < decode_length) & (tf.size(active_indices) > 0)
+
+        def _unknown_shape(tensor):
+            return tf.TensorShape([None] * tensor.shape.ndims)
+
+        _, _, _, _, _, ids_ta, logits_ta, seq_length = tf.while_loop(
+            _not_finished,
+            _body,
+            loop_vars=(step, active_indices, next_id, cache, memory_cache,
+                       ids_ta, logits_ta, seq_length),
+            shape_invariants=(
+                tf.TensorShape([]),
+                tf.TensorShape([None]),
+                tf.TensorShape([None, None]),
+                nest.map_structure(_unknown_shape, cache),
+                nest.map_structure(_unknown_shape, memory_cache),
+                tf.TensorShape(None),
+                tf.TensorShape(None),
+                tf.TensorShape([None])
+                )
+            )
+
+        # [max_time, batch_size, ...] -> [batch_size, max_time, ...]
+        decoded_ids = tf.transpose(ids_ta.stack(), [1, 0])
+        logits_list = tf.transpose(logits_ta.stack(), [1, 0, 2])
+        return logits_list, decoded_ids, seq_length
+
     def _beam_decode(self,
                      embedding_fn,
                      start_tokens,
@@ -677,23 +1099,64 @@ class TransformerDecoder(ModuleBase):
                      memory_attention_bias,
                      decode_length=256,
                      beam_width=5,
-                     alpha=0.6):
-        cache = self._init_cache(memory, memory_attention_bias)
+                     alpha=0.6,
+                     candidate_ids=None):
+        cache = self._init_cache(memory, decode_length)
+        # The memory cache is passed as static states of beam search, so
+        # that it is neither tiled nor reordered per beam.
+        memory_cache = self._init_memory_cache(memory, memory_attention_bias)
+
+        vocab_size = self._vocab_size
+        output_fn = None
+        if candidate_ids is not None:
+            # Beam search runs over candidate positions. The start tokens
+            # are appended to the lookup table so that all decoded
+            # positions, including the start, map to token indexes.
+            num_candidates = tf.size(candidate_ids)
+            id_table = tf.concat([candidate_ids, start_tokens], axis=0)
+            vocab_size = num_candidates
+            output_fn = self._shortlist_output_fn(candidate_ids)
+            end_token = _shortlist_index(candidate_ids, end_token)
+            start_tokens = num_candidates + tf.range(tf.size(start_tokens))
+            token_embedding_fn = embedding_fn
+            embedding_fn = lambda ids: token_embedding_fn(
+                tf.gather(id_table, ids))
+
         symbols_to_logits_fn = self._symbols_to_logits_fn(
             embedding_fn,
-            max_length=decode_length+1)
-        outputs, log_prob = beam_search.beam_search(
-            symbols_to_logits_fn,
-            start_tokens,
-            beam_width,
-            decode_length,
-            self._vocab_size,
-            alpha,
-            states=cache,
-            eos_id=end_token)
+            output_fn=output_fn)
+        if self._hparams.beam_search_backpointers:
+            if self._hparams.compact_finished:
+                raise ValueError(
+                    '"compact_finished" is not supported together with '
+                    '"beam_search_backpointers".')
+            outputs, log_prob = beam_search.beam_search_with_backpointers(
+                symbols_to_logits_fn,
+                start_tokens,
+                beam_width,
+                decode_length,
+                vocab_size,
+                alpha,
+                states=cache,
+                eos_id=end_token,
+                static_states=memory_cache)
+        else:
+            outputs, log_prob = beam_search.beam_search(
+                symbols_to_logits_fn,
+                start_tokens,
+                beam_width,
+                decode_length,
+                vocab_size,
+                alpha,
+                states=cache,
+                eos_id=end_token,
+                static_states=memory_cache,
+                compact_finished=self._hparams.compact_finished)
 
         # Ignores <BOS>
         outputs = outputs[:, :, 1:]
+        if candidate_ids is not None:
+            outputs = tf.gather(candidate_ids, outputs)
         # shape = [batch_size, seq_length, beam_width]
         outputs = tf.transpose(outputs, [0, 2, 1])
         return (outputs, log_prob)
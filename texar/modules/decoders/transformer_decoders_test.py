@@ -8,6 +8,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import numpy as np
+
 import tensorflow as tf
 
 from texar.modules.decoders.transformer_decoders import TransformerDecoder
@@ -125,5 +127,258 @@ class TransformerDecoderTest(tf.test.TestCase):
             self.assertEqual(outputs_['sample_id'].shape,
                              (self._batch_size, self._max_decode_len, 5))
 
+    def test_preallocate_cache(self):
+        """Tests inference decoding with preallocated self attention cache.
+        """
+        decoder = TransformerDecoder(
+            embedding=self._embedding,
+            hparams={'preallocate_cache': True})
+        outputs, length = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            decoding_strategy='infer_greedy',
+            beam_width=1,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT)
+        beam_outputs = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            beam_width=5,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, length_, beam_outputs_ = sess.run(
+                [outputs, length, beam_outputs])
+            self.assertIsInstance(outputs_, TransformerDecoderOutput)
+            self.assertEqual(length_.shape, (self._batch_size,))
+            self.assertEqual(beam_outputs_['sample_id'].shape,
+                             (self._batch_size, self._max_decode_len, 5))
+
+    def test_preallocate_cache_length(self):
+        """Tests that preallocating the cache requires a bounded
+        `max_decoding_length`.
+        """
+        decoder = TransformerDecoder(
+            embedding=self._embedding,
+            hparams={'preallocate_cache': True})
+        with self.assertRaises(ValueError):
+            decoder(memory=self._memory,
+                    memory_sequence_length=self._memory_sequence_length,
+                    memory_attention_bias=None,
+                    inputs=None,
+                    decoding_strategy='infer_greedy',
+                    beam_width=1,
+                    start_tokens=self._start_tokens,
+                    end_token=2,
+                    mode=tf.estimator.ModeKeys.PREDICT)
+        with self.assertRaises(ValueError):
+            decoder(memory=self._memory,
+                    memory_sequence_length=self._memory_sequence_length,
+                    memory_attention_bias=None,
+                    inputs=None,
+                    decoding_strategy='infer_greedy',
+                    beam_width=1,
+                    start_tokens=self._start_tokens,
+                    end_token=2,
+                    max_decoding_length=100000,
+                    mode=tf.estimator.ModeKeys.PREDICT)
+
+        max_decoding_length = tf.placeholder(tf.int32, shape=[])
+        outputs, _ = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            decoding_strategy='infer_greedy',
+            beam_width=1,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=max_decoding_length,
+            mode=tf.estimator.ModeKeys.PREDICT)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            with self.assertRaises(tf.errors.InvalidArgumentError):
+                sess.run(outputs, feed_dict={max_decoding_length: 100000})
+
+    def test_compact_finished(self):
+        """Tests inference decoding that removes finished batch items.
+        """
+        decoder = TransformerDecoder(
+            embedding=self._embedding,
+            hparams={'compact_finished': True})
+        outputs, length = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            decoding_strategy='infer_greedy',
+            beam_width=1,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT)
+        beam_outputs = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            beam_width=5,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, length_, beam_outputs_ = sess.run(
+                [outputs, length, beam_outputs])
+            self.assertIsInstance(outputs_, TransformerDecoderOutput)
+            self.assertEqual(outputs_.sample_id.shape[0], self._batch_size)
+            self.assertEqual(outputs_.logits.shape[0], self._batch_size)
+            self.assertEqual(length_.shape, (self._batch_size,))
+            self.assertEqual(beam_outputs_['log_prob'].shape,
+                             (self._batch_size, 5))
+
+    def test_infer_shortlist(self):
+        """Tests inference decoding over a candidate vocabulary.
+        """
+        decoder = TransformerDecoder(embedding=self._embedding)
+        candidate_ids = tf.constant([0, 2, 5, 7])
+        outputs, _ = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            decoding_strategy='infer_greedy',
+            beam_width=1,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT,
+            candidate_ids=candidate_ids)
+        beam_outputs = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            memory_attention_bias=None,
+            inputs=None,
+            beam_width=5,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT,
+            candidate_ids=candidate_ids)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, beam_outputs_ = sess.run([outputs, beam_outputs])
+            self.assertEqual(outputs_.logits.shape[-1], 4)
+            self.assertTrue(np.all(np.isin(outputs_.sample_id, [0, 2, 5, 7])))
+            self.assertEqual(beam_outputs_['sample_id'].shape,
+                             (self._batch_size, self._max_decode_len, 5))
+
+    def test_train_packed(self):
+        """Tests train_greedy decoding of packed sequences.
+        """
+        decoder = TransformerDecoder(embedding=self._embedding)
+        # Two examples in each row, followed by padding
+        segment_ids = tf.constant(
+            [[1] * 4 + [2] * 3 + [0] * 3] * self._batch_size)
+        memory_segment_ids = tf.constant(
+            [[1] * 5 + [2] * 5] * self._batch_size)
+        outputs = decoder(memory=self._memory,
+                          inputs=self._inputs,
+                          decoding_strategy='train_greedy',
+                          mode=tf.estimator.ModeKeys.TRAIN,
+                          segment_ids=segment_ids,
+                          memory_segment_ids=memory_segment_ids)
+        # Decoding the second segment alone gives the same outputs
+        outputs_single = decoder(memory=self._memory[:, 5:],
+                                 memory_sequence_length=tf.fill(
+                                     [self._batch_size], 5),
+                                 inputs=self._inputs[:, 4:7],
+                                 decoding_strategy='train_greedy',
+                                 mode=tf.estimator.ModeKeys.PREDICT)
+        outputs_packed = decoder(memory=self._memory,
+                                 inputs=self._inputs,
+                                 decoding_strategy='train_greedy',
+                                 mode=tf.estimator.ModeKeys.PREDICT,
+                                 segment_ids=segment_ids,
+                                 memory_segment_ids=memory_segment_ids)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, single_, packed_ = sess.run(
+                [outputs, outputs_single, outputs_packed])
+            self.assertEqual(outputs_.logits.shape,
+                             (self._batch_size, self._max_time,
+                              self._vocab_size))
+            np.testing.assert_allclose(
+                packed_.logits[:, 4:7], single_.logits, rtol=1e-4, atol=1e-4)
+
+        # Packed targets require the segments of the packed memory
+        with self.assertRaises(ValueError):
+            decoder(memory=self._memory,
+                    memory_sequence_length=self._memory_sequence_length,
+                    inputs=self._inputs,
+                    decoding_strategy='train_greedy',
+                    segment_ids=segment_ids)
+
+    def test_recompute(self):
+        """Tests train_greedy decoding with blocks recomputed in the backward
+        pass.
+        """
+        decoder = TransformerDecoder(
+            embedding=self._embedding,
+            hparams={'recompute': True, 'num_blocks': 2})
+        outputs = decoder(memory=self._memory,
+                          memory_sequence_length=self._memory_sequence_length,
+                          inputs=self._inputs,
+                          decoding_strategy='train_greedy',
+                          mode=tf.estimator.ModeKeys.TRAIN)
+        loss = tf.reduce_sum(outputs.logits)
+        grads = tf.gradients(loss, decoder.trainable_variables + [self._memory])
+        self.assertTrue(all(grad is not None for grad in grads))
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            grads_ = sess.run(grads)
+            self.assertEqual(grads_[-1].shape, (self._batch_size,
+                                                self._max_time, self._emb_dim))
+
+    def test_local_attention(self):
+        """Tests decoding with block-sparse local self attention.
+        """
+        decoder = TransformerDecoder(
+            embedding=self._embedding,
+            hparams={'multihead_attention': {
+                'local_attention': {'block_size': 4}}})
+        outputs = decoder(memory=self._memory,
+                          memory_sequence_length=self._memory_sequence_length,
+                          inputs=self._inputs,
+                          decoding_strategy='train_greedy',
+                          mode=tf.estimator.ModeKeys.TRAIN)
+        infer_outputs, _ = decoder(
+            memory=self._memory,
+            memory_sequence_length=self._memory_sequence_length,
+            inputs=None,
+            decoding_strategy='infer_greedy',
+            beam_width=1,
+            start_tokens=self._start_tokens,
+            end_token=2,
+            max_decoding_length=self._max_decode_len,
+            mode=tf.estimator.ModeKeys.PREDICT)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, infer_outputs_ = sess.run([outputs, infer_outputs])
+            self.assertEqual(outputs_.logits.shape,
+                             (self._batch_size, self._max_time,
+                              self._vocab_size))
+            self.assertIsInstance(infer_outputs_, TransformerDecoderOutput)
+
 if __name__ == "__main__":
     tf.test.main()
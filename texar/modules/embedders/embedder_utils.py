@@ -26,7 +26,8 @@ from texar.core import layers
 __all__ = [
     "default_embedding_hparams",
     "get_embedding",
-    "soft_embedding_lookup"
+    "soft_embedding_lookup",
+    "sparse_soft_embedding_lookup"
 ]
 
 def default_embedding_hparams():
@@ -240,3 +241,85 @@ def soft_embedding_lookup(embedding, soft_ids):
             embedding, tf.nn.softmax(decoder_outputs.logits))
     """
     return tf.tensordot(tf.to_float(soft_ids), embedding, [-1, 0])
+
+def sparse_soft_embedding_lookup(embedding, soft_ids, top_k=None,
+                                 threshold=None, renormalize=False):
+    """Sparse version of :func:`soft_embedding_lookup` that mixes only the
+    embedding vectors with the largest weights.
+
+    For each position, only the :attr:`top_k` largest weights in
+    :attr:`soft_ids`, and/or the weights no less than :attr:`threshold`, are
+    kept. The corresponding embedding vectors are gathered and mixed, instead
+    of multiplying the full weight vector with the whole embedding matrix.
+    Gradients flow to the kept weights and, as
+    :tf_main:`IndexedSlices <IndexedSlices>`, to the gathered embedding
+    rows.
+
+    Args:
+        embedding: A Tensor of shape `[num_classes] + embedding-dim` containing
+            the embedding vectors. Embedding can have dimensionality > 1, i.e.,
+            :attr:`embedding` can be of shape
+            `[num_classes, emb_dim_1, emb_dim_2, ...]`
+        soft_ids: A Tensor of weights (probabilities) used to mix the
+            embedding vectors.
+        top_k (int, optional): Number of largest weights to keep at each
+            position.
+        threshold (float, optional): Weights smaller than the threshold are
+            dropped. If :attr:`top_k` is also given, the threshold is applied
+            to the top-k weights.
+        renormalize (bool): Whether to rescale the kept weights at each
+            position to sum to 1.
+
+    Returns:
+        A Tensor of shape `shape(soft_ids)[:-1] + shape(embedding)[1:]`, same
+        as :func:`soft_embedding_lookup`.
+
+    Raises:
+        ValueError: If neither :attr:`top_k` nor :attr:`threshold` is given.
+
+    Example::
+
+        decoder_outputs, ... = decoder(...)
+        soft_seq_emb = sparse_soft_embedding_lookup(
+            embedding, tf.nn.softmax(decoder_outputs.logits), top_k=10)
+    """
+    if top_k is None and threshold is None:
+        raise ValueError("Either `top_k` or `threshold` must be given.")
+
+    soft_ids = tf.to_float(soft_ids)
+    emb_rank = embedding.shape.ndims
+
+    def _expand_weights(weights):
+        for _ in range(emb_rank - 1):
+            weights = tf.expand_dims(weights, -1)
+        return weights
+
+    if top_k is not None:
+        weights, indices = tf.nn.top_k(soft_ids, k=top_k, sorted=False)
+        if threshold is not None:
+            weights *= tf.to_float(weights >= threshold)
+        if renormalize:
+            weights /= tf.maximum(
+                tf.reduce_sum(weights, axis=-1, keepdims=True), 1e-12)
+        # shape: shape(soft_ids)[:-1] + [top_k] + shape(embedding)[1:]
+        rows = tf.nn.embedding_lookup(embedding, indices)
+        return tf.reduce_sum(rows * _expand_weights(weights), axis=-emb_rank)
+
+    # Threshold only: the number of kept entries varies across positions,
+    # so mix the kept rows with a segment sum over flattened positions.
+    flat_soft_ids = tf.reshape(soft_ids, [-1, tf.shape(soft_ids)[-1]])
+    num_positions = tf.shape(flat_soft_ids)[0]
+    coords = tf.to_int32(tf.where(flat_soft_ids >= threshold))
+    positions, indices = coords[:, 0], coords[:, 1]
+    weights = tf.gather_nd(flat_soft_ids, coords)
+    if renormalize:
+        norm = tf.unsorted_segment_sum(weights, positions, num_positions)
+        weights /= tf.maximum(tf.gather(norm, positions), 1e-12)
+    rows = tf.nn.embedding_lookup(embedding, indices)
+    outputs = tf.unsorted_segment_sum(
+        rows * _expand_weights(weights), positions, num_positions)
+    outputs = tf.reshape(
+        outputs,
+        tf.concat([tf.shape(soft_ids)[:-1], tf.shape(embedding)[1:]], axis=0))
+    outputs.set_shape(soft_ids.shape[:-1].concatenate(embedding.shape[1:]))
+    return outputs
@@ -10,6 +10,8 @@ from __future__ import unicode_literals
 
 # pylint: disable=no-member
 
+import numpy as np
+
 import tensorflow as tf
 
 from texar.modules.embedders import embedder_utils
@@ -41,6 +43,42 @@ class GetEmbeddingTest(tf.test.TestCase):
         self.assertEqual(emb.shape[1].value,
                          embedder_utils.default_embedding_hparams()["dim"])
 
+    def test_sparse_soft_embedding_lookup(self):
+        """Tests :func:`sparse_soft_embedding_lookup` against the dense
+        :func:`soft_embedding_lookup`.
+        """
+        vocab_size = 20
+        embedding = tf.Variable(tf.random_uniform([vocab_size, 8]))
+        soft_ids = tf.nn.softmax(tf.random_uniform([3, 5, vocab_size]) * 5.)
+
+        dense = embedder_utils.soft_embedding_lookup(embedding, soft_ids)
+        full_top_k = embedder_utils.sparse_soft_embedding_lookup(
+            embedding, soft_ids, top_k=vocab_size)
+        top_k = embedder_utils.sparse_soft_embedding_lookup(
+            embedding, soft_ids, top_k=4)
+        threshold = embedder_utils.sparse_soft_embedding_lookup(
+            embedding, soft_ids, threshold=0.05)
+        self.assertEqual(top_k.shape, dense.shape)
+        self.assertEqual(threshold.shape, dense.shape)
+
+        grads = tf.gradients(tf.reduce_sum(top_k), [embedding, soft_ids])
+        self.assertIsInstance(grads[0], tf.IndexedSlices)
+        self.assertIsNotNone(grads[1])
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            soft_ids_, emb_, dense_, full_top_k_, top_k_, threshold_ = \
+                sess.run([soft_ids, embedding, dense, full_top_k, top_k,
+                          threshold])
+            np.testing.assert_allclose(full_top_k_, dense_, rtol=1e-5)
+
+            kth = np.sort(soft_ids_, axis=-1)[..., -4:-3]
+            expected = np.dot(soft_ids_ * (soft_ids_ >= kth), emb_)
+            np.testing.assert_allclose(top_k_, expected, rtol=1e-5)
+
+            expected = np.dot(soft_ids_ * (soft_ids_ >= 0.05), emb_)
+            np.testing.assert_allclose(threshold_, expected, rtol=1e-5)
+
 
 if __name__ == "__main__":
     tf.test.main()
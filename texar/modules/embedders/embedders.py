@@ -188,7 +188,8 @@ class WordEmbedder(EmbedderBase):
         hparams["name"] = "word_embedder"
         return hparams
 
-    def _build(self, ids=None, soft_ids=None, mode=None, **kwargs):
+    def _build(self, ids=None, soft_ids=None, mode=None, soft_top_k=None,
+               **kwargs):
         """Embeds (soft) ids.
 
         Either :attr:`ids` or :attr:`soft_ids` must be given, and they
@@ -202,6 +203,11 @@ class WordEmbedder(EmbedderBase):
                 :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`, including
                 `TRAIN`, `EVAL`, and `PREDICT`. If `None`, dropout is
                 controlled by :func:`texar.global_mode`.
+            soft_top_k (int, optional): If given together with
+                :attr:`soft_ids`, only the embeddings of the :attr:`soft_top_k`
+                largest weights at each position are mixed (see
+                `sparse_soft_embedding_lookup` in
+                :mod:`texar.modules.embedders.embedder_utils`).
             kwargs: Additional keyword arguments for
                 :tf_main:`tf.nn.embedding_lookup <nn/embedding_lookup>` besides
                 :attr:`params` and :attr:`ids`.
@@ -240,6 +246,9 @@ class WordEmbedder(EmbedderBase):
 
         if ids is not None:
             outputs = tf.nn.embedding_lookup(embedding, ids, **kwargs)
+        elif soft_top_k is not None:
+            outputs = embedder_utils.sparse_soft_embedding_lookup(
+                embedding, soft_ids, top_k=soft_top_k)
         else:
             outputs = embedder_utils.soft_embedding_lookup(embedding, soft_ids)
 
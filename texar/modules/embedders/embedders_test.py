@@ -16,6 +16,8 @@ import tensorflow as tf
 
 from texar.modules.embedders.embedders import WordEmbedder
 from texar.modules.embedders.position_embedders import PositionEmbedder
+from texar.modules.embedders.position_embedders import \
+    SinusoidsPositionEmbedder
 from texar.context import global_mode
 
 class EmbedderTest(tf.test.TestCase):
@@ -199,5 +201,39 @@ class EmbedderTest(tf.test.TestCase):
             outputs_, soft_outputs_ = sess.run([outputs, soft_outputs])
             self.assertEqual(outputs_, soft_outputs_)
 
+    def test_sinusoids_position_embedder(self):
+        """Tests the table lookup of
+        :class:`texar.modules.SinusoidsPositionEmbedder`.
+        """
+        embedder = SinusoidsPositionEmbedder(
+            hparams={"dim": 9, "max_positions": 8})
+        embedder_no_table = SinusoidsPositionEmbedder(
+            hparams={"dim": 9, "max_positions": None})
+
+        positions = tf.constant([[0, 3, 7], [1, 2, 5]])
+        long_positions = tf.constant([[6, 7, 8, 9]])
+        outputs = embedder(positions)
+        long_outputs = embedder(long_positions)
+        self.assertEqual(outputs.shape, [2, 3, 9])
+        step_outputs = [embedder(step=tf.constant(step)) for step in [5, 10]]
+        # The table is created once in the graph
+        tables = [op for op in tf.get_default_graph().get_operations()
+                  if op.name.split('/')[-1] == 'sinusoid_table']
+        self.assertEqual(len(tables), 1)
+
+        with self.test_session() as sess:
+            outputs_, long_outputs_, step_outputs_, expected_, \
+                long_expected_, step_expected_ = sess.run(
+                    [outputs, long_outputs, step_outputs,
+                     embedder_no_table(positions),
+                     embedder_no_table(long_positions),
+                     embedder_no_table(tf.constant([5, 10]))])
+            np.testing.assert_allclose(outputs_, expected_, atol=1e-5)
+            np.testing.assert_allclose(long_outputs_, long_expected_,
+                                       atol=1e-5)
+            np.testing.assert_allclose(step_outputs_, step_expected_,
+                                       atol=1e-5)
+            self.assertEqual(expected_[0, 0, -1], 0.)
+
 if __name__ == "__main__":
     tf.test.main()
@@ -21,7 +21,9 @@ from __future__ import print_function
 
 import math
 
+import numpy as np
 import tensorflow as tf
+from tensorflow.python.framework import ops
 
 from texar.modules.embedders.embedder_base import EmbedderBase
 from texar.modules.embedders import embedder_utils
@@ -246,6 +248,11 @@ class SinusoidsPositionEmbedder(EmbedderBase):
     def __init__(self, hparams=None):
         EmbedderBase.__init__(self, hparams=hparams)
 
+        self._table_value = None
+        if self._hparams.max_positions:
+            self._table_value = self._compute_table(
+                self._hparams.max_positions)
+
     def default_hparams(self):
         """Returns a dictionary of hyperparameters with default values
         We use a geometric sequence of timescales starting with
@@ -258,42 +265,125 @@ class SinusoidsPositionEmbedder(EmbedderBase):
                 'min_timescale': 1.0,
                 'max_timescale': 10000.0,
                 'dim': 512,
+                'max_positions': 512,
                 'name':'sinusoid_posisiton_embedder',
             }
+
+        Here:
+
+        "max_positions" : int, optional
+            Size of the table of embeddings computed once at construction.
+            Positions smaller than "max_positions" are embedded by lookup
+            in the table, and larger positions are computed on the fly. If
+            `None` or `0`, all embeddings are computed on the fly.
         """
         hparams = {
             'min_timescale': 1.0,
             'max_timescale': 1.0e4,
             'dim': 512,
+            'max_positions': 512,
             'name':'sinusoid_posisiton_embedder',
         }
         return hparams
 
-    def _build(self, positions):
+    def _inv_timescales(self):
+        num_timescales = self._hparams.dim // 2
+        min_timescale = self._hparams.min_timescale
+        max_timescale = self._hparams.max_timescale
+        log_timescale_increment = (
+            math.log(float(max_timescale) / float(min_timescale)) /
+            (num_timescales - 1.))
+        return min_timescale * np.exp(
+            np.arange(num_timescales) * -log_timescale_increment)
+
+    def _compute_table(self, max_positions):
+        """Computes the embeddings of positions `[0, max_positions)` as a
+        numpy array of shape `[max_positions, dim]`.
+        """
+        dim = self._hparams.dim
+        scaled_time = np.expand_dims(np.arange(max_positions), 1) * \
+            self._inv_timescales()
+        table = np.concatenate(
+            [np.sin(scaled_time), np.cos(scaled_time),
+             np.zeros([max_positions, dim % 2])], axis=1)
+        return table.astype(np.float32)
+
+    def _get_table(self):
+        """Returns the embedding table as a constant of the current graph,
+        created only once per graph and outside control flow so that it can
+        be reused, e.g., across the steps of incremental decoding.
+
+        The constant is kept in a collection of the graph, keyed by the
+        hyperparameters that determine the table, so that the module does
+        not keep graphs alive.
+        """
+        hparams = self._hparams
+        key = '_sinusoid_table/%r/%r/%d/%d' % (
+            hparams.min_timescale, hparams.max_timescale, hparams.dim,
+            hparams.max_positions)
+        graph = tf.get_default_graph()
+        tables = graph.get_collection(key)
+        if tables:
+            return tables[0]
+        with ops.init_scope():
+            table = tf.constant(self._table_value, name='sinusoid_table')
+        graph.add_to_collection(key, table)
+        return table
+
+    def _compute_signal(self, positions):
+        """Computes the embeddings of :attr:`positions` on the fly.
+        """
+        dim = self._hparams.dim
+        position = tf.to_float(positions)
+        inv_timescales = tf.constant(self._inv_timescales(), tf.float32)
+        scaled_time = tf.expand_dims(position, -1) * inv_timescales
+        signal = tf.concat([tf.sin(scaled_time), tf.cos(scaled_time)], axis=-1)
+        if dim % 2 == 1:
+            signal = tf.concat(
+                [signal, tf.zeros_like(signal[..., :1])], axis=-1)
+        return signal
+
+    def _build(self, positions=None, step=None):
         """Embeds.
 
+        Either :attr:`positions` or :attr:`step` is required.
+
         Args:
             positions (optional): An integer tensor containing the position
-                ids to embed.
+                ids to embed, e.g., of shape `[1, length]`, or of shape
+                `[batch_size, length]` for packed sequences where positions
+                restart at the beginning of each packed segment.
+            step (optional): An integer scalar tensor, a single position to
+                embed, e.g., the current step of incremental decoding. The
+                embedding is sliced from the table when possible.
         Returns:
-            A `Tensor` of shape `[1, position_size, dim]`.
+            A `Tensor` of shape `shape(positions) + [dim]`, or of shape
+            `[dim]` if :attr:`step` is given.
         """
         dim = self._hparams.dim
-        position = tf.to_float(tf.squeeze(positions, axis=0))
-        position_size = tf.shape(position)[0]
-        num_timescales = dim // 2
-        min_timescale = self._hparams.min_timescale
-        max_timescale = self._hparams.max_timescale
-        log_timescale_increment = (
-            math.log(float(max_timescale) / float(min_timescale)) /
-            (tf.to_float(num_timescales) - 1))
-        inv_timescales = min_timescale * tf.exp(
-            tf.to_float(tf.range(num_timescales)) * -log_timescale_increment)
-        scaled_time = tf.expand_dims(position, 1) \
-            * tf.expand_dims(inv_timescales, 0)
-        signal = tf.concat([tf.sin(scaled_time), tf.cos(scaled_time)], axis=1)
-        signal = tf.pad(signal, [[0, 0], [0, tf.mod(dim, 2)]])
-        signal = tf.reshape(signal, [1, position_size, dim])
+        max_positions = self._hparams.max_positions
+        if step is not None:
+            if not max_positions:
+                return self._compute_signal(step)
+            table = self._get_table()
+            signal = tf.cond(
+                step < max_positions,
+                lambda: tf.reshape(tf.slice(table, [step, 0], [1, dim]),
+                                   [dim]),
+                lambda: self._compute_signal(step))
+            signal.set_shape([dim])
+            return signal
 
-        return signal
+        if positions is None:
+            raise ValueError('Either `positions` or `step` is required.')
+        if not max_positions:
+            signal = self._compute_signal(positions)
+        else:
+            table = self._get_table()
+            signal = tf.cond(
+                tf.reduce_max(positions) < max_positions,
+                lambda: tf.gather(table, positions),
+                lambda: self._compute_signal(positions))
+        signal.set_shape(positions.shape.concatenate([dim]))
 
+        return signal
@@ -114,6 +114,7 @@ class HierarchicalRNNEncoder(EncoderBase):
                 "encoder_minor_type": "UnidirectionalRNNEncoder",
                 "encoder_minor_hparams": {},
                 "config_share": False,
+                "skip_empty_utterances": False,
                 "name": "hierarchical_encoder_wrapper"
             }
 
@@ -149,6 +150,16 @@ class HierarchicalRNNEncoder(EncoderBase):
             Whether to use encoder_major's hyperparameters
             to construct encoder_minor.
 
+        "skip_empty_utterances" : bool
+            If `True` and `sequence_length_major` is given to :meth:`_build`,
+            the low-level sequences beyond the length of each high-level
+            sequence (e.g., the padding utterances of short dialogs) are
+            removed before the minor encoder, and their final states are
+            set to zeros. This saves computation when the max number of
+            utterances is much larger than the typical number, e.g., with
+            the "utterance_cnt" of
+            :class:`~texar.data.MonoTextData` as `sequence_length_major`.
+
         "name":
             Name of the encoder.
         """
@@ -159,6 +170,7 @@ class HierarchicalRNNEncoder(EncoderBase):
             "encoder_minor_type": "UnidirectionalRNNEncoder",
             "encoder_minor_hparams": {},
             "config_share": False,
+            "skip_empty_utterances": False,
             "@no_typecheck": [
                 'encoder_major_hparams',
                 'encoder_minor_hparams'
@@ -205,7 +217,9 @@ class HierarchicalRNNEncoder(EncoderBase):
                 the minor's final states.
             sequence_length_major (optional): The `sequence_length` argument
                 sent to major encoder. This is a 1-D Tensor of shape
-                `[B]`.
+                `[B]`. If "skip_empty_utterances" is `True`, the minor
+                encoder only encodes the first `sequence_length_major[b]`
+                low-level sequences of each batch item `b`.
             sequence_length_minor (optional): The `sequence_length` argument
                 sent to minor encoder. It can be either a 1-D Tensor of shape
                 `[B*T]`, or a 2-D Tensor of shape `[B, T]` or `[T, B]`
@@ -252,6 +266,14 @@ class HierarchicalRNNEncoder(EncoderBase):
 
         inputs = tf.reshape(inputs, shape + [inputs.shape[3]])
 
+        indices = None
+        if self._hparams.skip_empty_utterances and \
+                sequence_length_major is not None:
+            indices, num_sequences = self._get_nonempty_indices(
+                order, sequence_length_major, expand)
+            inputs, kwargs_minor = self._gather_minor(
+                indices, inputs, kwargs_minor)
+
         _, states_minor = self._encoder_minor(inputs, **kwargs_minor)
 
         self.states_minor_before_medium = states_minor
@@ -267,6 +289,14 @@ class HierarchicalRNNEncoder(EncoderBase):
                 else:
                     states_minor = fn(states_minor)
 
+        if indices is not None:
+            # Scatters the states back, with zeros for the skipped sequences
+            scattered = tf.scatter_nd(
+                indices, states_minor,
+                tf.concat([[num_sequences], tf.shape(states_minor)[1:]], 0))
+            scattered.set_shape([None] + states_minor.shape[1:].as_list())
+            states_minor = scattered
+
         self.states_minor_after_medium = states_minor
 
         states_minor = tf.reshape(
@@ -346,6 +376,39 @@ class HierarchicalRNNEncoder(EncoderBase):
 
         return expand, shape
 
+    @staticmethod
+    def _get_nonempty_indices(order, sequence_length_major, expand):
+        """Returns the indices of the low-level sequences within
+        :attr:`sequence_length_major` in the flattened batch of the minor
+        encoder, of shape `[num_nonempty, 1]`, and the size of the flattened
+        batch.
+        """
+        if order in ('btu', 'ubt'):
+            mask = tf.sequence_mask(sequence_length_major, expand[1])
+        else:
+            mask = tf.transpose(
+                tf.sequence_mask(sequence_length_major, expand[0]))
+        mask = tf.reshape(mask, [-1])
+        return tf.to_int32(tf.where(mask)), tf.size(mask)
+
+    @staticmethod
+    def _gather_minor(indices, inputs, kwargs_minor):
+        """Gathers the inputs, sequence lengths and initial states of the
+        low-level sequences at :attr:`indices`.
+        """
+        indices = tf.reshape(indices, [-1])
+        batch_axis = 1 if kwargs_minor['time_major'] else 0
+        inputs = tf.gather(inputs, indices, axis=batch_axis)
+        kwargs_minor = dict(kwargs_minor)
+        if kwargs_minor['sequence_length'] is not None:
+            kwargs_minor['sequence_length'] = tf.gather(
+                kwargs_minor['sequence_length'], indices)
+        if kwargs_minor.get('initial_state') is not None:
+            kwargs_minor['initial_state'] = nest.map_structure(
+                lambda s: tf.gather(s, indices),
+                kwargs_minor['initial_state'])
+        return inputs, kwargs_minor
+
     @staticmethod
     def flatten(x):
         """Flattens a cell state by concatenating a sequence of cell
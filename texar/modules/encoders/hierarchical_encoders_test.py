@@ -8,6 +8,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import numpy as np
+
 import tensorflow as tf
 
 from texar.modules.encoders.hierarchical_encoders import HierarchicalRNNEncoder
@@ -144,5 +146,54 @@ class HierarchicalRNNEncoderTest(tf.test.TestCase):
         outputs, _ = encoder(inputs)
         self.assertEqual(list(outputs.shape), [16, 8, 200])
 
+    def test_skip_empty_utterances(self):
+        """Tests skipping the low-level sequences beyond
+        `sequence_length_major`.
+        """
+        encoder = HierarchicalRNNEncoder(
+            hparams={"skip_empty_utterances": True})
+
+        batch_size = 4
+        max_major_time = 5
+        max_minor_time = 6
+        dim = 10
+        inputs = tf.random_uniform(
+            [batch_size, max_major_time, max_minor_time, dim],
+            maxval=1,
+            minval=-1,
+            dtype=tf.float32)
+        sequence_length_major = tf.constant([5, 2, 1, 3])
+        sequence_length_minor = tf.fill([batch_size, max_major_time], 4)
+
+        outputs, _ = encoder(
+            inputs,
+            sequence_length_major=sequence_length_major,
+            sequence_length_minor=sequence_length_minor)
+        # Encodes all low-level sequences with the same variables
+        encoder_full = HierarchicalRNNEncoder(
+            encoder_major=encoder.encoder_major,
+            encoder_minor=encoder.encoder_minor)
+        outputs_full, _ = encoder_full(
+            inputs,
+            sequence_length_major=sequence_length_major,
+            sequence_length_minor=sequence_length_minor)
+        outputs_tm, _ = encoder(
+            tf.transpose(inputs, [2, 1, 0, 3]),
+            order='utb',
+            sequence_length_major=sequence_length_major,
+            sequence_length_minor=tf.transpose(sequence_length_minor))
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            outputs_, outputs_full_, outputs_tm_ = sess.run(
+                [outputs, outputs_full, outputs_tm])
+            for b, length in enumerate([5, 2, 1, 3]):
+                np.testing.assert_allclose(
+                    outputs_[b, :length], outputs_full_[b, :length],
+                    rtol=1e-5, atol=1e-5)
+                np.testing.assert_allclose(
+                    outputs_tm_[:length, b], outputs_full_[b, :length],
+                    rtol=1e-5, atol=1e-5)
+
 if __name__ == "__main__":
     tf.test.main()
@@ -30,9 +30,62 @@ from texar.utils.mode import is_train_mode
 # pylint: disable=too-many-arguments
 
 __all__ = [
+    "init_self_attention_cache",
     "MultiheadAttentionEncoder"
 ]
 
+def init_self_attention_cache(batch_size, num_heads, num_units,
+                              max_length=None, dtype=tf.float32):
+    """Creates the self attention cache of a
+    :class:`~texar.modules.MultiheadAttentionEncoder` used in incremental
+    decoding.
+
+    Args:
+        batch_size: An int scalar, the batch size.
+        num_heads (int): Number of attention heads.
+        num_units (int): Hidden dimension of the unsplitted attention space.
+        max_length (optional): An int scalar, the maximum number of decoding
+            steps. If given, fixed-size buffers of shape
+            `[batch_size, num_heads, max_length, num_units // num_heads]`
+            are preallocated and the keys/values of each step are written
+            at the step position. If `None` (default), the cache is empty
+            and grows by one position at each step.
+        dtype: Data type of the cache.
+
+    Returns:
+        A dict with keys `"self_keys"` and `"self_values"`.
+    """
+    if max_length is None:
+        shape = [batch_size, 0, num_units]
+        return {
+            'self_keys': tf.zeros(shape, dtype=dtype),
+            'self_values': tf.zeros(shape, dtype=dtype),
+        }
+
+    shape = tf.stack(
+        [batch_size, num_heads, max_length, num_units // num_heads])
+    return {
+        'self_keys': tf.zeros(shape, dtype=dtype),
+        'self_values': tf.zeros(shape, dtype=dtype),
+    }
+
+def _write_at_step(buffer, value, step):
+    """Writes :attr:`value` of shape `[batch, num_heads, 1, depth]` into
+    position :attr:`step` of the preallocated :attr:`buffer` of shape
+    `[batch, num_heads, max_length, depth]`.
+
+    The buffer keeps a fixed shape across decoding steps, so that it is a
+    loop variable with a static shape, unlike a cache grown by
+    concatenation.
+
+    Returns the updated buffer.
+    """
+    # `[1, 1, max_length, 1]`, one at position `step`
+    step_mask = tf.reshape(
+        tf.one_hot(step, tf.shape(buffer)[2], dtype=buffer.dtype),
+        [1, 1, -1, 1])
+    return buffer * (1. - step_mask) + value * step_mask
+
 class MultiheadAttentionEncoder(EncoderBase):
     """Multihead Attention Encoder
 
@@ -79,6 +132,12 @@ class MultiheadAttentionEncoder(EncoderBase):
                 'num_units': 512,
                 'dropout_rate': 0.1,
                 'use_bias': False,
+                'local_attention': {
+                    'block_size': None,
+                    'num_neighbor_blocks': 1,
+                    'num_global_tokens': 0,
+                    'causal': False,
+                },
                 "name": "multihead_attention"
             }
 
@@ -105,6 +164,24 @@ class MultiheadAttentionEncoder(EncoderBase):
         "use_bias": bool
             Use bias when projecting the key, value and query.
 
+        "local_attention" : dict
+            Block-sparse local self attention. If "block_size" is an int,
+            self attention splits the sequence into blocks of "block_size"
+            positions, and the queries of each block only attend to the keys
+            of the "num_neighbor_blocks" blocks on each side, plus the
+            first "num_global_tokens" positions, which also attend to the
+            whole sequence. Memory and computation are then linear in the
+            sequence length. If "causal" is `True`, only the blocks on the
+            left are attended to, and queries do not attend to later
+            positions. If "block_size" is `None` (default), full attention
+            is used.
+
+            Local attention applies to self attention only, i.e., when
+            `memory` is `None` or is `queries`, and
+            `memory_attention_bias` can only mask out keys (e.g., padding).
+            In incremental decoding with a self attention cache, the
+            queries are masked to the same window as in training.
+
         "name" : str
             Name of the module.
         """
@@ -115,11 +192,17 @@ class MultiheadAttentionEncoder(EncoderBase):
             'num_units': 512,
             'dropout_rate': 0.1,
             'use_bias': False,
+            'local_attention': {
+                'block_size': None,
+                'num_neighbor_blocks': 1,
+                'num_global_tokens': 0,
+                'causal': False,
+            },
             "name": "multihead_attention",
         }
 
     def _build(self, queries, memory, memory_attention_bias,
-               cache=None, mode=None):
+               cache=None, mode=None, step=None):
         """Encodes the inputs.
 
         Args:
@@ -129,10 +212,30 @@ class MultiheadAttentionEncoder(EncoderBase):
             memory_attention_bias: A 3d tensor with shape of
                 [batch, length_key, num_units].
             cache: Memory cache only when inferencing the sentence from sractch.
+                For encoder-decoder attention, `cache['memory_keys']` and
+                `cache['memory_values']` can hold the keys and values
+                precomputed with :meth:`project_memory`, of shape
+                `[memory_batch, num_heads, length_key, depth]`. The batch
+                size of :attr:`queries` can then be a multiple of
+                `memory_batch` (e.g., `memory_batch * beam_width` in beam
+                search), in which case consecutive query rows share the same
+                memory without tiling it.
+                The self attention cache is either growing, i.e.,
+                `cache['self_keys']` is of shape `[batch, time, num_units]`
+                and is extended by concatenation at each step, or
+                preallocated, i.e., `cache['self_keys']` is of shape
+                `[batch, num_heads, max_time, num_units // num_heads]`, the
+                keys/values of the current step are written at position
+                :attr:`step`, and only the first `step + 1` positions are
+                attended to. See
+                :func:`~texar.modules.init_self_attention_cache`.
             mode (optional): A tensor taking value in
                 :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`, including
                 `TRAIN`, `EVAL` and `PREDICT`. Controls dropout mode.
                 If `None` (default), :func:`texar.global_mode` is used.
+            step (optional): An int scalar Tensor, the index of the current
+                decoding step. Required if the self attention cache is
+                preallocated.
 
         Returns:
             A Tensor of shape `[batch_size, max_time, dim]` containing the
@@ -146,18 +249,45 @@ class MultiheadAttentionEncoder(EncoderBase):
                 raise ValueError("Value depth (%d) must be divisible by "
                                  "the number of attention heads (%d)." %(\
                                  num_units, num_heads))
+            precomputed_memory = False
+            is_local = self._hparams.local_attention.block_size is not None \
+                and (memory is None or memory is queries)
             if memory is None:
                 # Self Attention
                 Q = self.Q_dense(queries)
                 K = self.K_dense(queries)
                 V = self.V_dense(queries)
 
-                if cache is not None:
-                    # 'decoder self attention when dynamic decoding'
-                    K = tf.concat([cache['self_keys'], K], axis=1)
-                    V = tf.concat([cache['self_values'], V], axis=1)
-                    cache['self_keys'] = K
-                    cache['self_values'] = V
+                if cache is not None and \
+                        cache['self_keys'].shape.ndims == 4:
+                    # 'decoder self attention with preallocated cache'
+                    if step is None:
+                        raise ValueError(
+                            "`step` is required when the self attention "
+                            "cache is preallocated.")
+                    cache['self_keys'] = _write_at_step(
+                        cache['self_keys'], self._split_heads(K), step)
+                    cache['self_values'] = _write_at_step(
+                        cache['self_values'], self._split_heads(V), step)
+                    # Attends to the decoded positions only
+                    K_ = cache['self_keys'][:, :, :step + 1]
+                    V_ = cache['self_values'][:, :, :step + 1]
+                else:
+                    if cache is not None:
+                        # 'decoder self attention when dynamic decoding'
+                        K = tf.concat([cache['self_keys'], K], axis=1)
+                        V = tf.concat([cache['self_values'], V], axis=1)
+                        cache['self_keys'] = K
+                        cache['self_values'] = V
+                    K_ = self._split_heads(K)
+                    V_ = self._split_heads(V)
+            elif cache is not None and \
+                    cache['memory_keys'].shape.ndims == 4:
+                # 'encoder decoder attention with precomputed memory'
+                Q = self.Q_dense(queries)
+                K_ = cache['memory_keys']
+                V_ = cache['memory_values']
+                precomputed_memory = True
             else:
                 # encoder decoder attention
                 Q = self.Q_dense(queries)
@@ -170,22 +300,47 @@ class MultiheadAttentionEncoder(EncoderBase):
                             [cache["memory_keys"], cache["memory_values"]])
                 else:
                     K, V = [self.K_dense(memory), self.V_dense(memory)]
+                K_ = self._split_heads(K)
+                V_ = self._split_heads(V)
 
             Q_ = self._split_heads(Q)
-            K_ = self._split_heads(K)
-            V_ = self._split_heads(V)
             #[batch_size, num_heads, seq_length, memory_depth]
             key_depth_per_head = num_units // num_heads
             Q_ *= key_depth_per_head**-0.5
 
-            logits = tf.matmul(Q_, K_, transpose_b=True)
-            if memory_attention_bias is not None:
-                logits += memory_attention_bias
-            weights = tf.nn.softmax(logits, name="attention_weights")
-            weights = tf.layers.dropout(weights,
-                                        rate=self._hparams.dropout_rate,
-                                        training=is_train_mode(mode))
-            outputs = tf.matmul(weights, V_)
+            if precomputed_memory:
+                # Folds the queries sharing the same memory row into the
+                # query length dimension, so that memory is not tiled.
+                query_shape = shape_list(Q_)
+                memory_batch_size = tf.shape(K_)[0]
+                Q_ = tf.reshape(Q_, [memory_batch_size, -1] + query_shape[1:])
+                Q_ = tf.transpose(Q_, [0, 2, 1, 3, 4])
+                Q_ = tf.reshape(
+                    Q_, [memory_batch_size, num_heads, -1, query_shape[-1]])
+
+            if is_local and cache is None:
+                outputs = self._local_attention(
+                    Q_, K_, V_, memory_attention_bias, mode)
+            else:
+                logits = tf.matmul(Q_, K_, transpose_b=True)
+                if memory_attention_bias is not None:
+                    logits += memory_attention_bias
+                if is_local:
+                    if step is None:
+                        step = tf.shape(K_)[2] - 1
+                    logits += self._local_window_bias(tf.shape(K_)[2], step)
+                weights = tf.nn.softmax(logits, name="attention_weights")
+                weights = layers.dropout(weights,
+                                         rate=self._hparams.dropout_rate,
+                                         training=is_train_mode(mode))
+                outputs = tf.matmul(weights, V_)
+
+            if precomputed_memory:
+                outputs = tf.reshape(
+                    outputs,
+                    [memory_batch_size, num_heads, -1] + query_shape[2:])
+                outputs = tf.transpose(outputs, [0, 2, 1, 3, 4])
+                outputs = tf.reshape(outputs, query_shape)
 
             outputs = self._combine_heads(outputs)
             outputs = self.O_dense(outputs)
@@ -197,6 +352,170 @@ class MultiheadAttentionEncoder(EncoderBase):
 
         return outputs
 
+    def _local_attention(self, Q_, K_, V_, bias, mode):
+        """Block-sparse local self attention.
+
+        Args:
+            Q_, K_, V_: Scaled queries, keys and values of shape
+                `[batch, num_heads, length, depth]`.
+            bias: `None` or a bias of keys, of shape
+                `[batch, 1, 1, length]`.
+
+        Returns:
+            A Tensor of shape `[batch, num_heads, length, depth]`.
+        """
+        hparams = self._hparams.local_attention
+        block_size = hparams.block_size
+        num_neighbors = hparams.num_neighbor_blocks
+        num_global = hparams.num_global_tokens
+        causal = hparams.causal
+        if bias is not None and bias.shape.ndims == 4 and \
+                bias.shape[2].value != 1:
+            raise ValueError(
+                "Local attention only supports biases that mask out keys, "
+                "of shape `[batch, 1, 1, length]`.")
+
+        batch_size, num_heads, length, depth = shape_list(Q_)
+        num_blocks = (length + block_size - 1) // block_size
+        padded_length = num_blocks * block_size
+        offsets = list(range(-num_neighbors, 1 if causal else
+                             num_neighbors + 1))
+
+        def _to_blocks(x):
+            # [batch, heads, length, ...] -> [batch, heads, blocks, size, ...]
+            shape = shape_list(x)
+            x = tf.pad(x, [[0, 0], [0, 0], [0, padded_length - length]] +
+                       [[0, 0]] * (len(shape) - 3))
+            return tf.reshape(
+                x, shape[:2] + [num_blocks, block_size] + shape[3:])
+
+        def _window(x, pad_value=0):
+            # Concats the neighboring blocks of each block along axis 3
+            paddings = [[0, 0]] * x.shape.ndims
+            paddings[2] = [num_neighbors, 0 if causal else num_neighbors]
+            x = tf.pad(x, paddings, constant_values=pad_value)
+            return tf.concat(
+                [x[:, :, num_neighbors+o:num_neighbors+o+num_blocks]
+                 for o in offsets], axis=3)
+
+        # Masks out padded and out-of-window keys, as well as global
+        # keys, which are attended to separately
+        positions = tf.reshape(
+            tf.range(padded_length), [1, 1, num_blocks, block_size])
+        query_positions = tf.expand_dims(positions, -1)
+        key_positions = tf.expand_dims(_window(positions, pad_value=-1), 3)
+        visible = tf.logical_and(key_positions >= num_global,
+                                 key_positions < length)
+        if causal:
+            visible = tf.logical_and(
+                visible, key_positions <= query_positions)
+        local_bias = (1. - tf.cast(visible, Q_.dtype)) * -1e18
+
+        Q_blocks = _to_blocks(Q_)
+        K_blocks = _window(_to_blocks(K_))
+        V_blocks = _window(_to_blocks(V_))
+        # [batch, heads, blocks, block_size, window_size]
+        logits = tf.matmul(Q_blocks, K_blocks, transpose_b=True) + local_bias
+        key_bias = None
+        if bias is not None:
+            key_bias = tf.reshape(bias, [tf.shape(bias)[0], 1, length])
+            logits += tf.expand_dims(_window(_to_blocks(key_bias)), 3)
+
+        if num_global > 0:
+            # Every query attends to the global keys
+            K_global = K_[:, :, :num_global]
+            V_global = V_[:, :, :num_global]
+            global_positions = tf.reshape(
+                tf.range(tf.shape(K_global)[2]), [1, 1, 1, 1, -1])
+            global_logits = tf.matmul(
+                tf.reshape(Q_blocks, [batch_size, num_heads, -1, depth]),
+                K_global, transpose_b=True)
+            global_logits = tf.reshape(
+                global_logits,
+                [batch_size, num_heads, num_blocks, block_size, -1])
+            if causal:
+                global_logits += (1. - tf.cast(
+                    global_positions <= query_positions, Q_.dtype)) * -1e18
+            if key_bias is not None:
+                global_logits += tf.reshape(
+                    key_bias[:, :, :num_global], [-1, 1, 1, 1,
+                                                 tf.shape(K_global)[2]])
+            logits = tf.concat([global_logits, logits], axis=-1)
+            V_blocks = tf.concat(
+                [tf.tile(tf.expand_dims(V_global, 2),
+                         [1, 1, num_blocks, 1, 1]), V_blocks], axis=3)
+
+        weights = tf.nn.softmax(logits, name="attention_weights")
+        weights = layers.dropout(weights,
+                                 rate=self._hparams.dropout_rate,
+                                 training=is_train_mode(mode))
+        outputs = tf.matmul(weights, V_blocks)
+        outputs = tf.reshape(
+            outputs, [batch_size, num_heads, padded_length, depth])
+        outputs = outputs[:, :, :length]
+
+        if num_global > 0:
+            # The global queries attend to the whole sequence
+            Q_global = Q_[:, :, :num_global]
+            global_logits = tf.matmul(Q_global, K_, transpose_b=True)
+            if bias is not None:
+                global_logits += bias
+            if causal:
+                global_logits += (1. - tf.cast(
+                    tf.expand_dims(tf.range(length), 0) <= tf.expand_dims(
+                        tf.range(tf.shape(Q_global)[2]), 1),
+                    Q_.dtype)) * -1e18
+            global_weights = tf.nn.softmax(global_logits)
+            global_weights = layers.dropout(
+                global_weights,
+                rate=self._hparams.dropout_rate,
+                training=is_train_mode(mode))
+            outputs = tf.concat(
+                [tf.matmul(global_weights, V_),
+                 outputs[:, :, num_global:]], axis=2)
+
+        return outputs
+
+    def _local_window_bias(self, length, query_position):
+        """Returns a bias of shape `[1, 1, 1, length]` restricting the
+        query at :attr:`query_position` to its local attention window, used
+        in incremental decoding.
+        """
+        hparams = self._hparams.local_attention
+        key_positions = tf.range(length)
+        query_block = query_position // hparams.block_size
+        visible = key_positions >= \
+            (query_block - hparams.num_neighbor_blocks) * hparams.block_size
+        if not hparams.causal:
+            last_block = query_block + hparams.num_neighbor_blocks
+            visible = tf.logical_and(
+                visible, key_positions < (last_block + 1) * hparams.block_size)
+        num_global = hparams.num_global_tokens
+        visible = tf.logical_or(
+            visible, tf.logical_or(key_positions < num_global,
+                                   query_position < num_global))
+        bias = (1. - tf.to_float(visible)) * -1e18
+        return tf.reshape(bias, [1, 1, 1, length])
+
+    def project_memory(self, memory):
+        """Projects the memory into the keys and values of encoder-decoder
+        attention, split into heads. The results can be put into
+        `cache['memory_keys']` and `cache['memory_values']` of :meth:`_build`
+        so that the projection is performed only once in incremental
+        decoding.
+
+        Args:
+            memory: A 3d tensor with shape of [batch, length_key, depth_key].
+
+        Returns:
+            A tuple `(keys, values)`, each of shape
+            `[batch, num_heads, length_key, num_units // num_heads]`.
+        """
+        with tf.variable_scope(self.variable_scope):
+            K_ = self._split_heads(self.K_dense(memory))
+            V_ = self._split_heads(self.V_dense(memory))
+        return K_, V_
+
     def _split_heads(self, x):
         """Split channels (dimension 2) into multiple heads,
         becomes dimension 1).
@@ -0,0 +1,131 @@
+#
+"""
+Unit tests for multihead attention.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.modules.encoders.multihead_attention import \
+    MultiheadAttentionEncoder
+
+# pylint: disable=invalid-name
+
+
+class MultiheadAttentionEncoderTest(tf.test.TestCase):
+    """Tests :class:`~texar.modules.MultiheadAttentionEncoder` class.
+    """
+
+    def setUp(self):
+        tf.test.TestCase.setUp(self)
+        self._batch_size = 2
+        self._max_time = 10
+        self._hparams = {'num_units': 16, 'output_dim': 16, 'num_heads': 2}
+        self._inputs = tf.random_uniform(
+            [self._batch_size, self._max_time, 16], maxval=1.)
+
+    def _run_with_shared_weights(self, local_attention, mask, padding=None):
+        """Runs local attention and full attention masked with :attr:`mask`
+        using the same weights.
+        """
+        hparams = dict(self._hparams, local_attention=local_attention)
+        local = MultiheadAttentionEncoder(hparams=hparams)
+        full = MultiheadAttentionEncoder(hparams=self._hparams)
+
+        key_bias = None
+        full_bias = (1. - mask) * -1e18
+        if padding is not None:
+            key_bias = tf.constant(
+                (padding * -1e18).reshape([self._batch_size, 1, 1, -1]),
+                tf.float32)
+            full_bias = full_bias + key_bias
+        mode = tf.estimator.ModeKeys.PREDICT
+        local_outputs = local(self._inputs, None, key_bias, mode=mode)
+        full_outputs = full(self._inputs, None,
+                            tf.constant(full_bias, tf.float32), mode=mode)
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run([tf.assign(v_full, v_local) for v_local, v_full in zip(
+                local.trainable_variables, full.trainable_variables)])
+            return sess.run([local_outputs, full_outputs])
+
+    def test_local_attention(self):
+        """Tests block-sparse local attention against masked full attention.
+        """
+        positions = np.arange(self._max_time)
+        blocks = positions // 3
+        mask = np.abs(blocks[:, None] - blocks[None, :]) <= 1
+        mask |= (positions[:, None] < 1) | (positions[None, :] < 1)
+        padding = np.zeros([self._batch_size, self._max_time])
+        padding[0, 7:] = 1.
+        local_, full_ = self._run_with_shared_weights(
+            {'block_size': 3, 'num_global_tokens': 1},
+            mask.astype(np.float32), padding)
+        self.assertEqual(local_.shape, (self._batch_size, self._max_time, 16))
+        np.testing.assert_allclose(local_[0, :7], full_[0, :7], rtol=1e-5,
+                                   atol=1e-5)
+        np.testing.assert_allclose(local_[1], full_[1], rtol=1e-5, atol=1e-5)
+
+    def test_causal_local_attention(self):
+        """Tests causal block-sparse local attention.
+        """
+        positions = np.arange(self._max_time)
+        blocks = positions // 4
+        mask = (blocks[:, None] - blocks[None, :] <= 1) & \
+            (positions[None, :] <= positions[:, None])
+        local_, full_ = self._run_with_shared_weights(
+            {'block_size': 4, 'causal': True}, mask.astype(np.float32))
+        np.testing.assert_allclose(local_, full_, rtol=1e-5, atol=1e-5)
+
+    def test_precomputed_memory(self):
+        """Tests that attending to the memory projected once gives the same
+        outputs as projecting the memory at every decoding step.
+        """
+        beam_width = 3
+        num_steps = 4
+        encoder = MultiheadAttentionEncoder(hparams=self._hparams)
+        mode = tf.estimator.ModeKeys.PREDICT
+
+        padding = np.zeros([self._batch_size, self._max_time])
+        padding[0, 6:] = 1.
+        bias = (padding * -1e18).reshape([self._batch_size, 1, 1, -1])
+        tiled_bias = tf.constant(
+            np.repeat(bias, beam_width, axis=0), tf.float32)
+        bias = tf.constant(bias, tf.float32)
+        tiled_memory = tf.reshape(
+            tf.tile(tf.expand_dims(self._inputs, 1), [1, beam_width, 1, 1]),
+            [self._batch_size * beam_width, self._max_time, 16])
+        queries = tf.random_uniform(
+            [num_steps, self._batch_size * beam_width, 1, 16], maxval=1.)
+
+        memory_keys, memory_values = None, None
+        projected_outputs, cached_outputs = [], []
+        for step in range(num_steps):
+            projected_outputs.append(encoder(
+                queries[step], tiled_memory, tiled_bias, mode=mode))
+            if memory_keys is None:
+                memory_keys, memory_values = \
+                    encoder.project_memory(self._inputs)
+            cache = {'memory_keys': memory_keys,
+                     'memory_values': memory_values}
+            cached_outputs.append(encoder(
+                queries[step], self._inputs, bias, cache=cache, mode=mode))
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            projected_, cached_ = sess.run(
+                [projected_outputs, cached_outputs])
+            for projected, cached in zip(projected_, cached_):
+                self.assertEqual(
+                    cached.shape, (self._batch_size * beam_width, 1, 16))
+                np.testing.assert_allclose(cached, projected, rtol=1e-5,
+                                           atol=1e-5)
+
+if __name__ == "__main__":
+    tf.test.main()
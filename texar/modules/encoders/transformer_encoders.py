@@ -195,10 +195,17 @@ class TransformerEncoder(EncoderBase):
                     'dropout_rate': 0.1,
                     'output_dim': 512,
                     'use_bias': False,
+                    'local_attention': {
+                        'block_size': None,
+                        'num_neighbor_blocks': 1,
+                        'num_global_tokens': 0,
+                        'causal': False,
+                    },
                 },
                 "initializer": None,
                 "name": "transformer_encoder"
                 'use_bert_config': False,
+                'recompute': False,
             }
 
         Here:
@@ -217,6 +224,14 @@ class TransformerEncoder(EncoderBase):
                 2. The attention bias for padding tokens.
                 3. The residual connections between the internal tensors.
 
+        "recompute": bool
+            If `True`, the intermediate activations of each block are
+            recomputed in the backward pass instead of being stored, and
+            only the block outputs are kept. This reduces activation memory
+            in training roughly by a factor of the number of sublayers per
+            block, at the cost of one more forward pass of each block.
+            See :func:`~texar.core.recompute_grad`.
+
         "position_embedder_type":
             Choose from "sinusoids" or "variables".
 
@@ -258,6 +273,10 @@ class TransformerEncoder(EncoderBase):
                 `~texar.modules.encoder.MultiheadAttentionEncoder.
                 default_harams` for details.
 
+            Setting "local_attention.block_size" uses block-sparse local
+            self attention, whose cost is linear in the sequence length.
+            It does not support :attr:`segment_ids` in :meth:`_build`.
+
         "initializer" : dict, optional
             Hyperparameters of the default initializer that initializes
             variables created in this module.
@@ -270,6 +289,7 @@ class TransformerEncoder(EncoderBase):
             'num_blocks': 6,
             'dim': 512,
             'use_bert_config': False,
+            'recompute': False,
             'position_embedder_type': 'sinusoids',
             'position_size': None,
             'position_embedder_hparams': None,
@@ -283,13 +303,75 @@ class TransformerEncoder(EncoderBase):
                 'dropout_rate': 0.1,
                 'output_dim': 512,
                 'use_bias': False,
+                'local_attention': {
+                    'block_size': None,
+                    'num_neighbor_blocks': 1,
+                    'num_global_tokens': 0,
+                    'causal': False,
+                },
             },
             'initializer': None,
             'name': 'transformer_encoder',
         }
 
+    def _block(self, i, x, encoder_self_attention_bias, pad_remover, mode):
+        """Applies the :attr:`i`-th block (self attention and position-wise
+        feed-forward network) on :attr:`x`.
+        """
+        multihead_attention = self.multihead_attention_list[i]
+        # trivial difference between BERT and original Transformer
+        if self._hparams.use_bert_config:
+            _queries_input = x
+        else:
+            _queries_input = layers.layer_normalize(x)
+
+        attention_output = multihead_attention(
+            queries=_queries_input,
+            memory=_queries_input,
+            memory_attention_bias=encoder_self_attention_bias,
+            mode=mode,
+        )
+        attention_output = layers.dropout(
+            attention_output,
+            rate=self._hparams.residual_dropout,
+            training=is_train_mode(mode),
+        )
+        x = x + attention_output
+        with tf.variable_scope('output'):
+            if self._hparams.use_bert_config:
+                x = layers.layer_normalize(x)
+                y = x
+            else:
+                y = layers.layer_normalize(x)
+        poswise_network = self.poswise_networks[i]
+        with tf.variable_scope(poswise_network.variable_scope):
+            original_shape = shape_list(y)
+            y = tf.reshape(y, [-1, self._hparams.dim])
+            if pad_remover:
+                y = tf.expand_dims(pad_remover.remove(y), axis=0)
+                # [1, batch_size*seq_length, hidden_dim]
+            layer_output = poswise_network(y, mode=mode)
+            sub_output = layers.dropout(
+                layer_output,
+                rate=self._hparams.residual_dropout,
+                training=is_train_mode(mode)
+            )
+            if pad_remover:
+                sub_output = tf.reshape(pad_remover.restore(tf.squeeze(\
+                    sub_output, axis=0)), original_shape \
+                )
+            else:
+                sub_output = tf.reshape(sub_output, original_shape)
+
+            x = x + sub_output
+            if self._hparams.use_bert_config:
+                x = layers.layer_normalize(x)
+
+        return x
+
     # pylint: disable=arguments-differ, too-many-branches, too-many-statements
-    def _build(self, inputs, sequence_length, mode=None):
+    def _build(self, inputs, sequence_length=None, mode=None,
+               segment_ids=None, positions=None):
         """Encodes the inputs.
 
         Args:
@@ -299,36 +381,62 @@ class TransformerEncoder(EncoderBase):
                 :attr:`hparams`.
             sequence_length: A 1D Tensor of shape `[batch_size]`. Input tokens
                 beyond respective sequence lengths are masked out
-                automatically.
+                automatically. Can be `None` if :attr:`segment_ids` is given.
             mode (optional): A tensor taking value in
                 :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`,
                 including `TRAIN`, `EVAL`, and `PREDICT`. Used to toggle
                 dropout.
                 If `None` (default), :func:`texar.global_mode` is used.
+            segment_ids (optional): An int Tensor of shape
+                `[batch_size, max_time]` for packed sequences, where each
+                row contains several examples, e.g., as produced by
+                :func:`~texar.utils.transformer_utils.pack_sequences`.
+                Tokens only attend to tokens of the same segment, and
+                segment id `0` denotes padding.
+            positions (optional): An int Tensor of shape
+                `[batch_size, max_time]`, the positions of tokens within
+                their segments. Only used when :attr:`segment_ids` is given.
+                If `None`, positions are inferred from :attr:`segment_ids`.
 
         Returns:
             A Tensor of shape `[batch_size, max_time, dim]` containing the
             encoded vectors.
         """
+        if segment_ids is None and sequence_length is None:
+            raise ValueError(
+                'Either `sequence_length` or `segment_ids` is required.')
+        if segment_ids is not None:
+            segment_ids = tf.to_int32(segment_ids)
+            inputs_padding = tf.to_float(tf.equal(segment_ids, 0))
+            if sequence_length is None:
+                sequence_length = tf.reduce_sum(
+                    tf.to_int32(tf.not_equal(segment_ids, 0)), axis=1)
+
         # Multiply input embedding with the sqrt of its dimension for
         # normalization
         if not self._hparams.use_bert_config:
             inputs = inputs * self._hparams.dim**0.5
-            inputs = mask_sequences(inputs, sequence_length, tensor_rank=3)
+            if segment_ids is None:
+                inputs = mask_sequences(
+                    inputs, sequence_length, tensor_rank=3)
+            else:
+                inputs = inputs * tf.expand_dims(1. - inputs_padding, -1)
         _, lengths, _ = shape_list(inputs)
 
-        inputs_padding = 1 - tf.sequence_mask(
-            sequence_length, tf.shape(inputs)[1], dtype=tf.float32)
-        if self._hparams.use_bert_config:
-            ignore_padding = attn.attention_bias_ignore_padding(
-                inputs_padding, bias_value=-1e4)
+        bias_value = -1e4 if self._hparams.use_bert_config else -1e18
+        if segment_ids is None:
+            inputs_padding = 1 - tf.sequence_mask(
+                sequence_length, tf.shape(inputs)[1], dtype=tf.float32)
+            encoder_self_attention_bias = attn.attention_bias_ignore_padding(
+                inputs_padding, bias_value=bias_value)
+            positions = tf.expand_dims(tf.range(lengths, dtype=tf.int32), 0)
         else:
-            ignore_padding = attn.attention_bias_ignore_padding(
-                inputs_padding)
-
-        encoder_self_attention_bias = ignore_padding
+            encoder_self_attention_bias = attn.attention_bias_segment(
+                segment_ids, bias_value=bias_value)
+            if positions is None:
+                positions = utils.transformer_utils.get_segment_positions(
+                    segment_ids)
 
-        positions = tf.expand_dims(tf.range(lengths, dtype=tf.int32), 0)
         pos_embeds = self.position_embedder(positions)
 
         input_embedding = inputs + pos_embeds
@@ -350,55 +458,16 @@ class TransformerEncoder(EncoderBase):
             pad_remover = utils.transformer_utils.PadRemover(inputs_padding)
 
         for i in range(self._hparams.num_blocks):
-            with tf.variable_scope("layer_{}".format(i)):
-                multihead_attention = self.multihead_attention_list[i]
-                # trivial difference between BERT and original Transformer
-                if self._hparams.use_bert_config:
-                    _queries_input = x
+            with tf.variable_scope("layer_{}".format(i)) as block_scope:
+                if self._hparams.recompute:
+                    x = layers.recompute_grad(
+                        lambda x_, i_=i: self._block(
+                            i_, x_, encoder_self_attention_bias, pad_remover,
+                            mode),
+                        [x], variables=block_scope.trainable_variables)
                 else:
-                    _queries_input = layers.layer_normalize(x)
-
-                attention_output = multihead_attention(
-                    queries=_queries_input,
-                    memory=_queries_input,
-                    memory_attention_bias=encoder_self_attention_bias,
-                    mode=mode,
-                )
-                attention_output = tf.layers.dropout(
-                    attention_output,
-                    rate=self._hparams.residual_dropout,
-                    training=is_train_mode(mode),
-                )
-                x = x + attention_output
-                with tf.variable_scope('output'):
-                    if self._hparams.use_bert_config:
-                        x = layers.layer_normalize(x)
-                        y = x
-                    else:
-                        y = layers.layer_normalize(x)
-                poswise_network = self.poswise_networks[i]
-                with tf.variable_scope(poswise_network.variable_scope):
-                    original_shape = shape_list(y)
-                    y = tf.reshape(y, [-1, self._hparams.dim])
-                    if pad_remover:
-                        y = tf.expand_dims(pad_remover.remove(y), axis=0)
-                        # [1, batch_size*seq_length, hidden_dim]
-                    layer_output = poswise_network(y, mode=mode)
-                    sub_output = tf.layers.dropout(
-                        layer_output,
-                        rate=self._hparams.residual_dropout,
-                        training=is_train_mode(mode)
-                    )
-                    if pad_remover:
-                        sub_output = tf.reshape(pad_remover.restore(tf.squeeze(\
-                            sub_output, axis=0)), original_shape \
-                        )
-                    else:
-                        sub_output = tf.reshape(sub_output, original_shape)
-
-                    x = x + sub_output
-                    if self._hparams.use_bert_config:
-                        x = layers.layer_normalize(x)
+                    x = self._block(
+                        i, x, encoder_self_attention_bias, pad_remover, mode)
 
         if not self._hparams.use_bert_config:
             x = layers.layer_normalize(x)
@@ -20,6 +20,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import math
+
 import tensorflow as tf
 
 from texar.module_base import ModuleBase
@@ -35,6 +37,114 @@ __all__ = [
     'MemNetRNNLike',
 ]
 
+def _batch_gather(params, indices):
+    """Gathers slices of :attr:`params` of shape `[batch_size, n, ...]` at
+    :attr:`indices` of shape `[batch_size, k]`, for each batch item.
+    """
+    batch_size = tf.shape(indices)[0]
+    batch_indices = tf.tile(
+        tf.expand_dims(tf.range(batch_size), 1), [1, tf.shape(indices)[1]])
+    return tf.gather_nd(params, tf.stack([batch_indices, indices], axis=-1))
+
+def _kmeans(x, n, num_clusters, num_steps):
+    """Runs :attr:`num_steps` steps of k-means on the rows of each batch
+    item of :attr:`x` of shape `[batch_size, n, dim]`, starting from evenly
+    spaced rows.
+
+    Returns:
+        A tuple `(centroids, assignments, distances)`, where `centroids` is
+        of shape `[batch_size, num_clusters, dim]`, and `assignments` and
+        `distances` are the nearest centroid of each row and the squared
+        distance to it, of shape `[batch_size, n]`.
+    """
+    stride = n // num_clusters
+    centroids = x[:, :stride * num_clusters:stride]
+    x_sq = tf.reduce_sum(tf.square(x), -1, keepdims=True)
+
+    def _assign(centroids):
+        distances = x_sq - 2. * tf.matmul(x, centroids, transpose_b=True) \
+            + tf.expand_dims(tf.reduce_sum(tf.square(centroids), -1), 1)
+        return (tf.argmin(distances, -1, output_type=tf.int32),
+                tf.reduce_min(distances, -1))
+
+    for _ in range(num_steps):
+        assignments, _ = _assign(centroids)
+        one_hot = tf.one_hot(assignments, num_clusters, dtype=x.dtype)
+        counts = tf.expand_dims(tf.reduce_sum(one_hot, 1), -1)
+        sums = tf.matmul(one_hot, x, transpose_a=True)
+        # Empty clusters keep their centroids
+        empty = tf.cast(tf.equal(counts, 0.), x.dtype)
+        centroids = sums / tf.maximum(counts, 1.) + empty * centroids
+    assignments, distances = _assign(centroids)
+    return centroids, assignments, distances
+
+def _build_memory_index(m, c, memory_size, num_clusters, num_kmeans_steps,
+                        capacity_factor):
+    """Clusters the memory slots of each batch item with k-means on their
+    input memory embeddings, and lists the slots of each cluster.
+
+    Each list holds at most
+    `ceil(capacity_factor * memory_size / num_clusters)` slots. Slots
+    beyond the capacity of their cluster, i.e., those farthest from the
+    centroid, are dropped.
+
+    Args:
+        m: Output of A operation, of shape `[batch_size, memory_size, dim]`.
+        c: Output of C operation, of shape `[batch_size, memory_size, dim]`.
+        memory_size (int): Number of memory slots.
+        num_clusters (int): Number of clusters.
+        num_kmeans_steps (int): Number of k-means steps.
+        capacity_factor (float): Capacity of each cluster list, relative
+            to the mean cluster size.
+
+    Returns:
+        A dict of the centroids of shape `[batch_size, num_clusters, dim]`,
+        the clustered `m` and `c` of shape
+        `[batch_size, num_clusters, capacity, dim]`, the memory positions
+        of the listed slots of shape `[batch_size, num_clusters, capacity]`,
+        and a float mask of the same shape of the list entries that are not
+        padding.
+    """
+    num_clusters = min(num_clusters, memory_size)
+    capacity = min(
+        memory_size,
+        int(math.ceil(capacity_factor * memory_size / num_clusters)))
+    dim = m.shape[-1].value
+    # Keeps the static batch size, e.g., to store the index in variables
+    batch_size = m.shape[0].value or -1
+
+    centroids, assignments, distances = _kmeans(
+        m, memory_size, num_clusters, num_kmeans_steps)
+
+    # Sorts the slots by cluster, and by distance to the centroid within
+    # each cluster
+    distances = tf.to_float(tf.maximum(distances, 0.))
+    distances /= 2. * tf.reduce_max(distances, 1, keepdims=True) + 1e-6
+    _, order = tf.nn.top_k(-(tf.to_float(assignments) + distances),
+                           k=memory_size)
+
+    counts = tf.reduce_sum(
+        tf.one_hot(assignments, num_clusters, dtype=tf.int32), 1)
+    starts = tf.cumsum(counts, axis=1, exclusive=True)
+    offsets = tf.range(capacity)
+    valid = tf.less(offsets, tf.expand_dims(counts, -1))
+    positions = tf.minimum(tf.expand_dims(starts, -1) + offsets,
+                           memory_size - 1)
+    slots = _batch_gather(
+        order, tf.reshape(positions, [-1, num_clusters * capacity]))
+
+    def _cluster(x):
+        return tf.reshape(_batch_gather(x, slots),
+                          [batch_size, num_clusters, capacity, dim])
+
+    return {
+        "centroids": centroids,
+        "m": _cluster(m),
+        "c": _cluster(c),
+        "slots": tf.reshape(slots, [batch_size, num_clusters, capacity]),
+        "valid": tf.cast(valid, m.dtype),
+    }
+
 class MemNetSingleLayer(ModuleBase):
     """An A-C layer for memory network.
 
@@ -70,7 +180,8 @@ class MemNetSingleLayer(ModuleBase):
             "name": "memnet_single_layer"
         }
 
-    def _build(self, u, m, c, **kwargs):
+    def _build(self, u, m, c, index=None, top_k=None, num_probes=None,
+               **kwargs):
         """An A-C operation with memory and query vector.
 
         Args:
@@ -79,19 +190,32 @@ class MemNetSingleLayer(ModuleBase):
                 `[None, memory_size, memory_dim]`.
             c (Tensor): Output of C operation. Should be in shape
                 `[None, memory_size, memory_dim]`.
+            index (dict, optional): Clustered memory created by
+                :func:`_build_memory_index`. If given, the query only
+                attends to the :attr:`top_k` slots of highest scores among
+                the slots of the :attr:`num_probes` clusters whose centroids
+                have the highest scores, and :attr:`m` and :attr:`c` are
+                ignored.
+            top_k (int, optional): Number of slots attended to. Required if
+                :attr:`index` is given.
+            num_probes (int, optional): Number of clusters searched.
+                Required if :attr:`index` is given.
 
         Returns:
             A `Tensor` of shape same as :attr:`u`.
         """
-        # Input memory representation
-        p = tf.matmul(m, tf.expand_dims(u, axis=2))
-        p = tf.transpose(p, perm=[0, 2, 1])
+        if index is None:
+            # Input memory representation
+            p = tf.matmul(m, tf.expand_dims(u, axis=2))
+            p = tf.transpose(p, perm=[0, 2, 1])
 
-        p = tf.nn.softmax(p) # equ. (1)
+            p = tf.nn.softmax(p) # equ. (1)
 
-        # Output memory representation
-        o = tf.matmul(p, c) # equ. (2)
-        o = tf.squeeze(o, axis=[1])
+            # Output memory representation
+            o = tf.matmul(p, c) # equ. (2)
+            o = tf.squeeze(o, axis=[1])
+        else:
+            o = self._approximate_address(u, index, top_k, num_probes)
 
         if self._H:
             u = tf.matmul(u, self._H) # RNN-like style
@@ -105,6 +229,44 @@ class MemNetSingleLayer(ModuleBase):
 
         return u_
 
+    @staticmethod
+    def _approximate_address(u, index, top_k, num_probes,
+                             return_slots=False):
+        """Computes equ. (1) and (2) over the top-k retrieved slots.
+
+        If :attr:`return_slots` is `True`, also returns the memory positions
+        of the attended slots, of shape `[batch_size, top_k]`.
+        """
+        num_clusters, cluster_size = index["slots"].shape.as_list()[1:]
+        num_probes = min(num_probes, num_clusters)
+        dim = u.shape[-1].value
+
+        # Selects the clusters closest to the query
+        centroid_scores = tf.squeeze(
+            tf.matmul(index["centroids"], tf.expand_dims(u, 2)), 2)
+        _, probes = tf.nn.top_k(centroid_scores, k=num_probes)
+        num_candidates = num_probes * cluster_size
+        m = tf.reshape(_batch_gather(index["m"], probes),
+                       [-1, num_candidates, dim])
+        c = tf.reshape(_batch_gather(index["c"], probes),
+                       [-1, num_candidates, dim])
+        valid = tf.reshape(_batch_gather(index["valid"], probes),
+                           [-1, num_candidates])
+
+        # Attends to the top-k slots of the selected clusters
+        scores = tf.squeeze(tf.matmul(m, tf.expand_dims(u, 2)), 2)
+        scores += (1. - valid) * scores.dtype.min
+        top_scores, slots = tf.nn.top_k(
+            scores, k=min(top_k, num_candidates))
+        p = tf.nn.softmax(top_scores) # equ. (1)
+        o = tf.reduce_sum(
+            tf.expand_dims(p, -1) * _batch_gather(c, slots), 1) # equ. (2)
+        if return_slots:
+            candidates = tf.reshape(_batch_gather(index["slots"], probes),
+                                    [-1, num_candidates])
+            return o, _batch_gather(candidates, slots)
+        return o
+
 class MemNetBase(ModuleBase):
     """Base class inherited by all memory network classes.
 
@@ -479,6 +641,15 @@ class MemNetRNNLike(MemNetBase):
                 "use_H": True,
                 "dropout_rate": 0,
                 "variational": False,
+                "addressing": {
+                    "type": "exact",
+                    "top_k": 32,
+                    "num_clusters": 256,
+                    "num_probes": 8,
+                    "num_kmeans_steps": 3,
+                    "capacity_factor": 2.,
+                    "exact_max_memory_size": 4096,
+                },
                 "name": "memnet_rnnlike",
             }
 
@@ -519,16 +690,92 @@ class MemNetRNNLike(MemNetBase):
 
         "variational" : bool
             Whether to share dropout masks after each hop.
+
+        "addressing" : dict
+            How each hop addresses the memory.
+
+            - "type" : `"exact"` (default) attends to all memory slots. \
+            `"approximate"` clusters the slots into "num_clusters" \
+            clusters with "num_kmeans_steps" steps of k-means on their \
+            input memory embeddings. At each hop, the query is scored \
+            against the centroids, and only attends to the "top_k" slots \
+            of highest scores among the slots of the "num_probes" best \
+            clusters. The cost of a hop then depends on the number of \
+            clusters and the cluster size instead of "memory_size". As \
+            building the index costs more than exact addressing, the \
+            index is not built by the module: build it with \
+            :meth:`build_memory_index`, e.g., once for a memory shared \
+            across batches, and pass it to the module as \
+            :attr:`memory_index`.
+            - "capacity_factor" : Each cluster keeps at most this many \
+            times the mean cluster size of slots, nearest to its centroid \
+            first.
+            - "exact_max_memory_size" : If "memory_size" is not larger \
+            than this value, exact addressing is used when \
+            :attr:`memory_index` is not given, regardless of "type".
         """
         hparams = MemNetBase.default_hparams()
         hparams.update({
             "use_H": True,
+            "addressing": {
+                "type": "exact",
+                "top_k": 32,
+                "num_clusters": 256,
+                "num_probes": 8,
+                "num_kmeans_steps": 3,
+                "capacity_factor": 2.,
+                "exact_max_memory_size": 4096,
+            },
             "name": "memnet_rnnlike"
         })
         return hparams
 
+    def build_memory_index(self, memory=None, soft_memory=None, mode=None):
+        """Embeds the memory and builds the index used by approximate
+        addressing (see the "addressing" hyperparameter).
+
+        The index is meant to be built once for a memory that does not
+        change across batches (e.g., a knowledge base), and passed to each
+        call of the module through :attr:`memory_index`. E.g., keep the
+        index of a memory of static batch size in non-trainable local
+        variables, which are initialized after the embeddings, and run an
+        op assigning a new index to them only when the memory or the
+        embeddings change:
+
+        .. code-block:: python
+
+            index = memnet.build_memory_index(memory=memory)
+            cached_index = {
+                name: tf.Variable(
+                    value, trainable=False,
+                    collections=[tf.GraphKeys.LOCAL_VARIABLES])
+                for name, value in index.items()}
+            rebuild_index_op = tf.group(*[
+                tf.assign(cached_index[name], value)
+                for name, value in index.items()])
+
+            logits = memnet(memory_index=cached_index, query=query)
+
+        Args:
+            memory (optional): Memory used in A/C operations. See
+                :meth:`_build`.
+            soft_memory (optional): Soft memory used in A/C operations. See
+                :meth:`_build`.
+            mode (optional): A tensor taking value in
+                :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`.
+
+        Returns:
+            A dict of Tensors.
+        """
+        addressing = self._hparams.addressing
+        return _build_memory_index(
+            self._A(memory, soft_memory, mode=mode),
+            self._C(memory, soft_memory, mode=mode),
+            self._memory_size, addressing.num_clusters,
+            addressing.num_kmeans_steps, addressing.capacity_factor)
+
     def _build(self, memory=None, query=None, soft_memory=None, soft_query=None,
-               mode=None, **kwargs):
+               mode=None, memory_index=None, **kwargs):
         """Pass the :attr:`memory` and :attr:`query` through the memory network
         and return the :attr:`logits` after the final matrix.
 
@@ -569,7 +816,23 @@ class MemNetRNNLike(MemNetBase):
                 :tf_main:`tf.estimator.ModeKeys <estimator/ModeKeys>`, including
                 `TRAIN`, `EVAL`, and `PREDICT`. If `None`, dropout is
                 controlled by :func:`texar.global_mode`.
+            memory_index (dict, optional): The index of the memory created
+                by :meth:`build_memory_index`. If given, approximate
+                addressing is used with this index, and :attr:`memory` and
+                :attr:`soft_memory` are ignored. Required if "type" of the
+                "addressing" hyperparameter is `"approximate"` and
+                "memory_size" is larger than "exact_max_memory_size".
         """
+        addressing = self._hparams.addressing
+        if addressing.type not in ("exact", "approximate"):
+            raise ValueError(
+                "Unknown addressing type: {}".format(addressing.type))
+        if memory_index is None and addressing.type == "approximate" and \
+                self._memory_size > addressing.exact_max_memory_size:
+            raise ValueError(
+                "`memory_index` is required by approximate addressing. "
+                "Build it with `build_memory_index`.")
+
         if self._B is not None:
             def _unsqueeze(x):
                 return x if x is None else tf.expand_dims(x, 1)
@@ -577,8 +840,11 @@ class MemNetRNNLike(MemNetBase):
                 self._B(_unsqueeze(query), _unsqueeze(soft_query), mode=mode),
                 1)
         self._u = [query]
-        self._m = self._A(memory, soft_memory, mode=mode)
-        self._c = self._C(memory, soft_memory, mode=mode)
+        if memory_index is None:
+            self._m = self._A(memory, soft_memory, mode=mode)
+            self._c = self._C(memory, soft_memory, mode=mode)
+        else:
+            self._m = self._c = None
 
         keep_prob = switch_dropout(1-self.hparams.dropout_rate, mode=mode)
         if self.hparams.variational:
@@ -589,8 +855,16 @@ class MemNetRNNLike(MemNetBase):
             def _variational_dropout(val):
                 return tf.div(val, keep_prob) * binary_tensor
 
+        ac_kwargs = {}
+        if memory_index is not None:
+            ac_kwargs = {
+                "index": memory_index,
+                "top_k": addressing.top_k,
+                "num_probes": addressing.num_probes,
+            }
+
         for _ in range(self._n_hops):
-            u_ = self._AC(self._u[-1], self._m, self._c)
+            u_ = self._AC(self._u[-1], self._m, self._c, **ac_kwargs)
             if self._relu_dim == 0:
                 pass
             elif self._relu_dim == self._memory_dim:
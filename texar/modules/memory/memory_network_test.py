@@ -6,6 +6,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
+
 import tensorflow as tf
 
 from texar.modules.memory.memory_network import MemNetRNNLike
@@ -95,5 +97,72 @@ class MemNetRNNLikeTest(tf.test.TestCase):
                         self._test_memory_dim(combine_mode, soft_memory,
                                               soft_query, use_B)
 
+    def test_approximate_addressing(self):
+        """Tests approximate memory addressing.
+        """
+        memory_size = 7
+        batch_size = 2
+        raw_memory_dim = 11
+        hparams = {
+            "n_hops": 2,
+            "memory_size": memory_size,
+            "A": {"embedding": {"dim": 10},
+                  "temporal_embedding": {"dim": 10}},
+            "C": {"embedding": {"dim": 10},
+                  "temporal_embedding": {"dim": 10}},
+            "relu_dim": 5,
+        }
+        memory = tf.tile(tf.expand_dims(
+            tf.range(memory_size, dtype=tf.int32), 0), [batch_size, 1])
+        query = tf.random_uniform([batch_size, 10])
+
+        memnet = MemNetRNNLike(raw_memory_dim=raw_memory_dim,
+                               hparams=hparams)
+        logits = memnet(memory=memory, query=query)
+
+        # Searching all clusters and slots equals exact addressing
+        hparams["addressing"] = {
+            "type": "approximate",
+            "top_k": 9,
+            "num_clusters": 3,
+            "num_probes": 3,
+            "capacity_factor": 3.,
+            "exact_max_memory_size": 0,
+        }
+        memnet_approx = MemNetRNNLike(raw_memory_dim=raw_memory_dim,
+                                      hparams=hparams)
+        # The index is not built by the module
+        with self.assertRaises(ValueError):
+            memnet_approx(memory=memory, query=query)
+        memory_index = memnet_approx.build_memory_index(memory=memory)
+        logits_approx = memnet_approx(memory_index=memory_index, query=query)
+        # An index cached in variables gives the same results
+        cached_index = {
+            name: tf.Variable(value, trainable=False,
+                              collections=[tf.GraphKeys.LOCAL_VARIABLES])
+            for name, value in memory_index.items()}
+        logits_index = memnet_approx(memory_index=cached_index, query=query)
+
+        hparams["addressing"].update({"top_k": 2, "num_probes": 1})
+        memnet_topk = MemNetRNNLike(raw_memory_dim=raw_memory_dim,
+                                    hparams=hparams)
+        logits_topk = memnet_topk(
+            memory_index=memnet_topk.build_memory_index(memory=memory),
+            query=query)
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run([tf.assign(v_approx, v) for v, v_approx in zip(
+                memnet.trainable_variables,
+                memnet_approx.trainable_variables)])
+            sess.run(tf.local_variables_initializer())
+            logits_, logits_approx_, logits_index_, logits_topk_ = sess.run(
+                [logits, logits_approx, logits_index, logits_topk])
+            np.testing.assert_allclose(logits_, logits_approx_, rtol=1e-5,
+                                       atol=1e-5)
+            np.testing.assert_allclose(logits_index_, logits_approx_,
+                                       rtol=1e-5, atol=1e-5)
+            self.assertEqual(logits_topk_.shape, (batch_size, raw_memory_dim))
+
 if __name__ == "__main__":
     tf.test.main()
@@ -24,6 +24,7 @@ import tensorflow as tf
 from texar.modules.networks.network_base import FeedForwardNetworkBase
 from texar.modules.networks.network_base import _build_layers
 from texar.core.layers import get_pooling_layer_hparams, get_activation_fn
+from texar.core.layers import MaxReducePooling1D, AverageReducePooling1D
 from texar.utils.utils import uniquify_str
 from texar.utils.shapes import mask_sequences
 from texar.hyperparams import HParams
@@ -53,6 +54,54 @@ def _to_list(value, name=None, list_length=None):
                          % (name, list_length))
     return value
 
+_FUSED_POOLING = {
+    "MaxReducePooling1D": "max",
+    "AverageReducePooling1D": "average",
+    MaxReducePooling1D: "max",
+    AverageReducePooling1D: "average",
+}
+
+_FUSED_CONV_KWARGS = {
+    "padding", "use_bias", "kernel_initializer", "bias_initializer",
+    "kernel_regularizer", "bias_regularizer", "trainable"
+}
+
+def _get_multi_width_conv_hparams(filters, kernel_size, activation_fn,
+                                  conv_kwargs, pool_hparams, name):
+    """Returns the hparams of a :class:`~texar.core.MultiWidthConv1D` layer
+    equivalent to the parallel conv and pooling layers, or `None` if the
+    layers cannot be fused.
+    """
+    pooling = _FUSED_POOLING.get(pool_hparams["type"], None)
+    if pooling is None:
+        return None
+    pool_kwargs = dict(pool_hparams.get("kwargs", None) or {})
+    pool_kwargs.pop("name", None)
+    if pool_kwargs.pop("data_format", "channels_last") != "channels_last" \
+            or pool_kwargs:
+        return None
+
+    conv_kwargs = dict(conv_kwargs)
+    if conv_kwargs.pop("strides", 1) not in (1, [1], (1,)) or \
+            conv_kwargs.pop("dilation_rate", 1) not in (1, [1], (1,)) or \
+            conv_kwargs.pop("data_format", "channels_last") != \
+                "channels_last":
+        return None
+    if not set(conv_kwargs.keys()).issubset(_FUSED_CONV_KWARGS):
+        return None
+    if conv_kwargs.get("padding", "valid").lower() not in ("valid", "same"):
+        return None
+
+    kwargs = {
+        "filters": filters,
+        "kernel_size": list(kernel_size),
+        "pooling": pooling,
+        "activation": activation_fn,
+        "name": name
+    }
+    kwargs.update(conv_kwargs)
+    return {"type": "MultiWidthConv1D", "kwargs": kwargs}
+
 class Conv1DNetwork(FeedForwardNetworkBase):
     """Simple Conv-1D network which consists of a sequence of conv layers
     followed with a sequence of dense layers.
@@ -106,6 +155,7 @@ class Conv1DNetwork(FeedForwardNetworkBase):
                 "conv_activation": "relu",
                 "conv_activation_kwargs": None,
                 "other_conv_kwargs": None,
+                "fuse_parallel_convs": False,
                 # (2) Pooling layers
                 "pooling": "MaxPooling1D",
                 "pool_size": None,
@@ -169,6 +219,19 @@ class Conv1DNetwork(FeedForwardNetworkBase):
                 :tf_main:`tf.layers.Conv1D <layers/Conv1d>` constructor, e.g.,
                 "data_format", "padding", etc.
 
+            "fuse_parallel_convs" : bool
+                If `True`, a conv layer with multiple kernel sizes followed
+                by pooling over the whole input (i.e., "pool_size" is `None`)
+                is computed with a single
+                :class:`~texar.core.MultiWidthConv1D` layer, i.e., one
+                convolution with zero-padded kernels and one pooling,
+                instead of a :class:`~texar.core.MergeLayer` of the
+                respective conv and pooling layers. The outputs are the
+                same. Layers whose "other_conv_kwargs" or
+                "other_pool_kwargs" are not supported by
+                :class:`~texar.core.MultiWidthConv1D` (e.g., "strides" > 1,
+                or "data_format" of `channels_first`) are not fused.
+
         2. For **pooling** layers:
 
             "pooling" : str or class or instance
@@ -273,6 +336,7 @@ class Conv1DNetwork(FeedForwardNetworkBase):
             "conv_activation": "relu",
             "conv_activation_kwargs": None,
             "other_conv_kwargs": None,
+            "fuse_parallel_convs": False,
             # Pooling layers
             "pooling": "MaxPooling1D",
             "pool_size": None,
@@ -370,8 +434,15 @@ class Conv1DNetwork(FeedForwardNetworkBase):
                 conv_kwargs_ij.update(other_kwargs)
                 hparams_i.append(
                     {"type": "Conv1D", "kwargs": conv_kwargs_ij})
+            fused_hparams = None
+            if len(hparams_i) > 1 and self._hparams.fuse_parallel_convs:
+                fused_hparams = _get_multi_width_conv_hparams(
+                    filters[i], kernel_size[i], activation_fn, other_kwargs,
+                    pool_hparams[i], name="conv_pool_%d" % (i+1))
             if len(hparams_i) == 1:
                 conv_pool_hparams.append([hparams_i[0], pool_hparams[i]])
+            elif fused_hparams is not None:
+                conv_pool_hparams.append(fused_hparams)
             else:  # creates MergeLayer
                 mrg_kwargs_layers = []
                 for hparams_ij in hparams_i:
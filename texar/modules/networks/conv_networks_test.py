@@ -8,6 +8,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import numpy as np
+
 import tensorflow as tf
 
 import texar as tx
@@ -121,6 +123,41 @@ class Conv1DNetworkTest(tf.test.TestCase):
         outputs_1 = network_1(inputs_1, sequence_length=seq_length)
         self.assertEqual(outputs_1.shape, [3, 128])
 
+    def test_fuse_parallel_convs(self):
+        """Tests fusing the parallel conv layers of different kernel sizes.
+        """
+        inputs = tf.random_uniform([3, 16, 20], maxval=1.)
+        for conv_kwargs, pooling in [(None, "MaxPooling"),
+                                     ({"padding": "same"}, "AveragePooling")]:
+            hparams = {
+                "kernel_size": [2, 3, 5],
+                "filters": 8,
+                "other_conv_kwargs": conv_kwargs,
+                "pooling": pooling,
+            }
+            network = Conv1DNetwork(hparams)
+            network_fused = Conv1DNetwork(
+                dict(hparams, fuse_parallel_convs=True))
+            self.assertTrue(isinstance(
+                network_fused.layer_by_name("conv_pool_1"),
+                tx.core.MultiWidthConv1D))
+
+            mode = tf.estimator.ModeKeys.PREDICT
+            outputs = network(inputs, mode=mode)
+            outputs_fused = network_fused(inputs, mode=mode)
+            self.assertEqual(outputs_fused.shape, [3, 128])
+            self.assertEqual(len(network.trainable_variables),
+                             len(network_fused.trainable_variables))
+
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                sess.run([tf.assign(v_fused, v) for v, v_fused in zip(
+                    network.trainable_variables,
+                    network_fused.trainable_variables)])
+                outputs_, outputs_fused_ = sess.run([outputs, outputs_fused])
+                np.testing.assert_allclose(outputs_, outputs_fused_,
+                                           rtol=1e-5, atol=1e-5)
+
 
 if __name__ == "__main__":
     tf.test.main()
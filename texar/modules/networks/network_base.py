@@ -23,7 +23,7 @@ import tensorflow as tf
 
 from texar.module_base import ModuleBase
 from texar.utils import TexarError
-from texar.core.layers import get_layer
+from texar.core.layers import get_layer, dropout
 from texar.utils.utils import uniquify_str
 from texar.utils.mode import is_train_mode
 
@@ -119,8 +119,14 @@ class FeedForwardNetworkBase(ModuleBase):
 
         prev_outputs = inputs
         for layer_id, layer in enumerate(self._layers):
-            if isinstance(layer, tf.layers.Dropout) or \
-                    isinstance(layer, tf.layers.BatchNormalization):
+            if isinstance(layer, tf.layers.Dropout):
+                # Through `dropout`, so that the mask is reproducible
+                # within `recompute_grad`
+                outputs = dropout(
+                    prev_outputs, rate=layer.rate,
+                    noise_shape=layer.noise_shape, seed=layer.seed,
+                    training=training)
+            elif isinstance(layer, tf.layers.BatchNormalization):
                 outputs = layer(prev_outputs, training=training)
             else:
                 outputs = layer(prev_outputs)
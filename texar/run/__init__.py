@@ -22,3 +22,4 @@ from __future__ import print_function
 # pylint: disable=wildcard-import
 
 from texar.run.executor import *
+from texar.run.inference_engine import *
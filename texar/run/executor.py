@@ -18,16 +18,69 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+import time
+
+import numpy as np
+import six
+
 import tensorflow as tf
 
 from texar.utils.dtypes import maybe_hparams_to_dict
 
 # pylint: disable=too-many-instance-attributes, too-many-arguments
+# pylint: disable=invalid-name, wrong-import-position
+
+model_pb2, predict_pb2, prediction_log_pb2 = None, None, None
+try:
+    from tensorflow_serving.apis import model_pb2
+    from tensorflow_serving.apis import predict_pb2
+    from tensorflow_serving.apis import prediction_log_pb2
+except ImportError:
+    pass
 
 __all__ = [
     "Executor"
 ]
 
+_WARMUP_REQUESTS_FILENAME = 'tf_serving_warmup_requests'
+
+def _dummy_value(tensor):
+    shape = [1 if dim is None else dim for dim in tensor.shape.as_list()]
+    if tensor.dtype == tf.string:
+        return np.full(shape, b'', dtype=object)
+    return np.ones(shape, dtype=tensor.dtype.as_numpy_dtype)
+
+def _write_warmup_requests(export_path, receiver_tensors, warmup_features,
+                           num_requests):
+    """Writes warmup requests of the SavedModel for TensorFlow Serving.
+    """
+    if predict_pb2 is None:
+        tf.logging.warning('`tensorflow_serving` is not installed. Skips '
+                           'writing warmup requests.')
+        return None
+    if warmup_features is None:
+        warmup_features = {name: _dummy_value(tensor)
+                           for name, tensor in receiver_tensors.items()}
+
+    request = predict_pb2.PredictRequest(
+        model_spec=model_pb2.ModelSpec(
+            signature_name=tf.saved_model.signature_constants.\
+                DEFAULT_SERVING_SIGNATURE_DEF_KEY))
+    for name, value in six.iteritems(warmup_features):
+        request.inputs[name].CopyFrom(tf.make_tensor_proto(
+            value, dtype=receiver_tensors[name].dtype))
+    log = prediction_log_pb2.PredictionLog(
+        predict_log=prediction_log_pb2.PredictLog(request=request))
+
+    warmup_dir = os.path.join(export_path, 'assets.extra')
+    tf.gfile.MakeDirs(warmup_dir)
+    warmup_path = os.path.join(warmup_dir, _WARMUP_REQUESTS_FILENAME)
+    with tf.python_io.TFRecordWriter(warmup_path) as writer:
+        for _ in range(num_requests):
+            writer.write(log.SerializeToString())
+    return warmup_path
+
 class Executor(object):
     """Class that executes training, evaluation, prediction, export, and other
     actions of :tf_main:`Estimator <estimator/Estimator>`.
@@ -68,8 +121,9 @@ class Executor(object):
             exor.train_and_evaluate(
                 max_train_steps=10000,
                 eval_steps=100)
+            exor.export(export_dir='./export')
 
-    See `bin/train.py` for the usage in detail.
+    See `bin/train.py` and `bin/export.py` for the usage in detail.
     """
 
     def __init__(self,
@@ -173,3 +227,127 @@ class Executor(object):
         eval_spec = self._get_eval_spec(steps=eval_steps)
         tf.estimator.train_and_evaluate(self._estimator, train_spec, eval_spec)
 
+    def _freeze_predict_graph(self, checkpoint_path, serving_input_fn):
+        """Builds the PREDICT graph and freezes the variables in the
+        checkpoint into constants, keeping only the ops needed to compute
+        the predictions.
+        """
+        with tf.Graph().as_default() as graph:
+            receiver = serving_input_fn()
+            spec = self._model(receiver.features, None, self._model_hparams,
+                               tf.estimator.ModeKeys.PREDICT,
+                               config=self._config)
+            predictions = spec.predictions
+            if not isinstance(predictions, dict):
+                predictions = {'output': predictions}
+            outputs = {
+                key: value for key, value in six.iteritems(predictions)
+                if isinstance(value, tf.Tensor)
+                and key not in receiver.features
+            }
+            # Lookup tables (e.g., of vocabularies) are not variables and
+            # are initialized when the SavedModel is loaded.
+            table_init_op = tf.tables_initializer(name='init_all_tables')
+
+            output_node_names = [t.op.name for t in outputs.values()]
+            output_node_names.append(table_init_op.name)
+            input_node_names = [
+                t.op.name for t in receiver.receiver_tensors.values()]
+
+            saver = tf.train.Saver()
+            with tf.Session(config=self._session_config) as sess:
+                saver.restore(sess, checkpoint_path)
+                # Only the ops the outputs depend on are kept, which
+                # excludes optimizer slots, summaries, and losses.
+                graph_def = tf.graph_util.convert_variables_to_constants(
+                    sess, graph.as_graph_def(), output_node_names)
+
+        graph_def = tf.graph_util.remove_training_nodes(
+            graph_def, protected_nodes=output_node_names + input_node_names)
+
+        tensor_names = {
+            'inputs': {key: t.name for key, t in
+                       six.iteritems(receiver.receiver_tensors)},
+            'outputs': {key: t.name for key, t in six.iteritems(outputs)},
+            'main_op': table_init_op.name
+        }
+        return graph_def, tensor_names, receiver.receiver_tensors
+
+    def export(self, export_dir, checkpoint_path=None, serving_input_fn=None,
+               warmup_features=None, num_warmup_requests=1, as_text=False):
+        """Exports the model as a SavedModel for serving.
+
+        The PREDICT-mode graph of the model is built and frozen, i.e.,
+        variables are converted into constants and only the ops needed to
+        compute the predictions are kept. Training-only ops, such as the
+        optimizer and its slot variables, losses, and summaries, are
+        removed, and dropout is disabled by the PREDICT mode. A warmup
+        request file is written to `assets.extra/` so that TensorFlow
+        Serving runs the model once before serving the first request.
+
+        Args:
+            export_dir (str): The directory in which the SavedModel is
+                written, under a timestamped subdirectory.
+            checkpoint_path (str, optional): Path of the checkpoint to
+                export. If `None`, the latest checkpoint in
+                :attr:`config.model_dir` is used.
+            serving_input_fn (optional): A function that takes no argument
+                and returns a
+                :tf_main:`ServingInputReceiver
+                <estimator/export/ServingInputReceiver>`. If `None`, uses
+                :meth:`get_serving_input_fn` of the model, e.g.,
+                :meth:`texar.models.Seq2seqBase.get_serving_input_fn`.
+            warmup_features (dict, optional): A dict mapping the names of
+                the receiver tensors to numpy arrays, used as the warmup
+                request. If `None`, a request with a batch of one
+                single-token example is used.
+            num_warmup_requests (int): The number of warmup requests.
+                Writing warmup requests requires the `tensorflow_serving`
+                package and is skipped if it is not installed, or if
+                :attr:`num_warmup_requests` is `0`.
+            as_text (bool): Whether to write the SavedModel proto in text
+                format.
+
+        Returns:
+            The path of the exported SavedModel.
+        """
+        if checkpoint_path is None:
+            checkpoint_path = tf.train.latest_checkpoint(
+                self._config.model_dir)
+            if checkpoint_path is None:
+                raise ValueError('No checkpoint found in {}.'.format(
+                    self._config.model_dir))
+        if serving_input_fn is None:
+            serving_input_fn = self._model.get_serving_input_fn()
+
+        graph_def, tensor_names, receiver_tensors = \
+            self._freeze_predict_graph(checkpoint_path, serving_input_fn)
+
+        export_path = os.path.join(export_dir, str(int(time.time())))
+        with tf.Graph().as_default() as graph:
+            tf.import_graph_def(graph_def, name='')
+            signature = tf.saved_model.signature_def_utils.\
+                predict_signature_def(
+                    inputs={key: graph.get_tensor_by_name(name) for key, name
+                            in six.iteritems(tensor_names['inputs'])},
+                    outputs={key: graph.get_tensor_by_name(name) for key, name
+                             in six.iteritems(tensor_names['outputs'])})
+            builder = tf.saved_model.builder.SavedModelBuilder(export_path)
+            with tf.Session(config=self._session_config) as sess:
+                builder.add_meta_graph_and_variables(
+                    sess,
+                    [tf.saved_model.tag_constants.SERVING],
+                    signature_def_map={
+                        tf.saved_model.signature_constants.\
+                            DEFAULT_SERVING_SIGNATURE_DEF_KEY: signature},
+                    main_op=graph.get_operation_by_name(
+                        tensor_names['main_op']),
+                    clear_devices=True)
+            builder.save(as_text=as_text)
+
+        if num_warmup_requests > 0:
+            _write_warmup_requests(export_path, receiver_tensors,
+                                   warmup_features, num_warmup_requests)
+
+        tf.logging.info('Exported SavedModel to %s', export_path)
+        return export_path
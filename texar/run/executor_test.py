@@ -77,6 +77,25 @@ class ExecutorTest(tf.test.TestCase):
         exor.train(max_steps=20)
         exor.evaluate(steps=5)
 
+        export_dir = tempfile.mkdtemp()
+        export_path = exor.export(export_dir)
+        with tf.Graph().as_default():
+            with self.test_session() as sess:
+                meta_graph = tf.saved_model.loader.load(
+                    sess, [tf.saved_model.tag_constants.SERVING], export_path)
+                self.assertEqual(len(tf.global_variables()), 0)
+                signature = meta_graph.signature_def[
+                    tf.saved_model.signature_constants.\
+                        DEFAULT_SERVING_SIGNATURE_DEF_KEY]
+                sample_id = sess.run(
+                    signature.outputs['decode.outputs.sample_id'].name,
+                    feed_dict={
+                        signature.inputs['source_text_ids'].name: [[4, 5, 6]],
+                        signature.inputs['source_length'].name: [3]
+                    })
+                self.assertEqual(sample_id.shape[0], 1)
+        shutil.rmtree(export_dir)
+
         shutil.rmtree(model_dir)
 
 if __name__ == "__main__":
@@ -0,0 +1,499 @@
+# Copyright 2018 The Texar Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+A local inference engine that serves concurrent requests with dynamic
+batching.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import bisect
+import threading
+import traceback
+from collections import deque
+from timeit import default_timer
+
+import numpy as np
+
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+from texar.context import global_mode
+from texar.hyperparams import HParams
+
+# pylint: disable=too-many-instance-attributes, too-many-arguments
+# pylint: disable=protected-access
+
+__all__ = [
+    "InferenceRequest",
+    "InferenceEngine"
+]
+
+class InferenceRequest(object):
+    """A request submitted to :class:`InferenceEngine`. Works as a future of
+    the inference results.
+
+    Args:
+        source: A list or 1D numpy array of the source sequence.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.length = len(source)
+        self.submit_time = default_timer()
+        self.finish_time = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def _finish(self, result=None, exception=None):
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self.finish_time = default_timer()
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for fn in callbacks:
+            self._run_callback(fn)
+
+    def _run_callback(self, fn):
+        # Exceptions of user callbacks must not stop the worker thread
+        try:
+            fn(self)
+        except Exception: # pylint: disable=broad-except
+            tf.logging.error(
+                'Exception raised by the done callback of an inference '
+                'request:\n%s', traceback.format_exc())
+
+    def done(self):
+        """Returns `True` if the inference of the request has finished.
+        """
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Waits for and returns the inference results of the request, i.e.,
+        the row of each fetched array corresponding to the request.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait.
+                If `None`, waits until the request finishes.
+
+        Raises:
+            The exception raised when running the batch of the request, or
+            `RuntimeError` if the request does not finish within
+            :attr:`timeout`.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError("Inference request timed out.")
+        if self._exception is not None:
+            raise self._exception # pylint: disable=raising-bad-type
+        return self._result
+
+    def exception(self, timeout=None):
+        """Waits for the request and returns the exception raised when
+        running it, or `None` if it succeeded.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError("Inference request timed out.")
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Attaches a callable that is called with the request as its only
+        argument when the request finishes. If the request has already
+        finished, :attr:`fn` is called immediately. Exceptions raised by
+        :attr:`fn` are logged and ignored.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        self._run_callback(fn)
+
+    @property
+    def latency(self):
+        """Seconds between submitting and finishing the request, or `None`
+        if the request has not finished.
+        """
+        if self.finish_time is None:
+            return None
+        return self.finish_time - self.submit_time
+
+
+class InferenceEngine(object):
+    """An inference engine that wraps a built inference graph, e.g., the
+    beam search or greedy decoding graph of a
+    :class:`~texar.modules.TransformerDecoder` or
+    :class:`~texar.modules.AttentionRNNDecoder` based seq2seq model, and
+    serves concurrent requests from threads or asyncio.
+
+    Requests are grouped by source length into buckets. A bucket is run as
+    a batch as soon as it holds "max_batch_size" requests, or once its
+    oldest request has waited for "max_latency_ms". Sources of a batch are
+    padded to the same length, and each request receives the row of every
+    fetched array corresponding to it.
+
+    Args:
+        sess: A :tf_main:`tf.Session <Session>` in which the variables of
+            the inference graph have been restored or initialized.
+        fetches: The batch-major Tensors (or a nested structure of them)
+            to evaluate, e.g., the decoded `sample_id`. The first
+            dimension of each Tensor must be the batch dimension.
+        inputs: The placeholder of source sequences, of shape
+            `[batch_size, max_time]`.
+        sequence_length (optional): The placeholder of source lengths, of
+            shape `[batch_size]`. If `None`, source lengths are not fed,
+            e.g., when the graph infers them from the padding.
+        feed_dict (optional): Additional feeds for each run. The global
+            mode (:func:`~texar.global_mode`) is fed with
+            :tf_main:`PREDICT <estimator/ModeKeys>` unless given here.
+        hparams (dict or HParams, optional): Hyperparameters. Missing
+            hyperparamerter will be set to default values. See
+            :meth:`default_hparams` for the hyperparameter sturcture and
+            default values.
+
+    Example:
+
+        .. code-block:: python
+
+            encoder_input = tf.placeholder(tf.int64, shape=(None, None))
+            # ... build the encoder, and decode with beam search
+            predictions = decoder(..., beam_width=5)
+            inferred_ids = predictions['sample_id'][:, :, 0]
+
+            saver.restore(sess, ckpt_path)
+            engine = InferenceEngine(
+                sess, fetches=inferred_ids, inputs=encoder_input,
+                hparams={'max_batch_size': 64, 'max_latency_ms': 20})
+            engine.start()
+
+            # From any thread
+            ids = engine.infer(source_ids)
+            # Or from a coroutine
+            ids = await engine.infer_async(source_ids)
+
+            print(engine.stats())
+            engine.stop()
+
+    The engine can also be used as a context manager, which starts and
+    stops it.
+    """
+
+    def __init__(self,
+                 sess,
+                 fetches,
+                 inputs,
+                 sequence_length=None,
+                 feed_dict=None,
+                 hparams=None):
+        self._hparams = HParams(hparams, self.default_hparams())
+        if self._hparams.max_batch_size <= 0:
+            raise ValueError('"max_batch_size" must be > 0.')
+
+        self._sess = sess
+        self._fetches = fetches
+        self._inputs = inputs
+        self._sequence_length = sequence_length
+        self._feed_dict = dict(feed_dict or {})
+        with sess.graph.as_default():
+            self._feed_dict.setdefault(
+                global_mode(), tf.estimator.ModeKeys.PREDICT)
+
+        self._boundaries = sorted(self._hparams.bucket_boundaries)
+        self._buckets = [deque() for _ in range(len(self._boundaries) + 1)]
+        self._num_pending = 0
+        self._cond = threading.Condition()
+        self._stopped = True
+        self._threads = []
+
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @staticmethod
+    def default_hparams():
+        """Returns a dictionary of hyperparameters with default values.
+
+        .. code-block:: python
+
+            {
+                "max_batch_size": 32,
+                "max_latency_ms": 10.,
+                "bucket_boundaries": [16, 32, 64, 128],
+                "pad_id": 0,
+                "num_threads": 1,
+                "stats_window_size": 10000,
+                "name": "inference_engine"
+            }
+
+        Here:
+
+        "max_batch_size" : int
+            Maximum number of requests in a batch.
+
+        "max_latency_ms" : float
+            Maximum time in milliseconds a request waits for its batch to
+            fill up before the batch is run.
+
+        "bucket_boundaries" : list
+            Upper length boundaries of the buckets into which requests are
+            grouped by source length, e.g., `[16, 32]` makes buckets of
+            lengths `< 16`, `[16, 32)` and `>= 32`. Only requests in the
+            same bucket are batched together, which reduces padding.
+
+        "pad_id" :
+            The value used to pad the sources of a batch.
+
+        "num_threads" : int
+            Number of threads that run batches concurrently.
+
+        "stats_window_size" : int
+            Number of latest requests used to compute latency percentiles.
+
+        "name" : str
+            Name of the engine.
+        """
+        return {
+            "max_batch_size": 32,
+            "max_latency_ms": 10.,
+            "bucket_boundaries": [16, 32, 64, 128],
+            "pad_id": 0,
+            "num_threads": 1,
+            "stats_window_size": 10000,
+            "name": "inference_engine",
+        }
+
+    def start(self):
+        """Starts the threads that batch and run requests.
+        """
+        with self._cond:
+            if not self._stopped:
+                return
+            self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._run_loop,
+                             name='%s_%d' % (self._hparams.name, i))
+            for i in range(self._hparams.num_threads)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """Runs the pending requests and stops the engine.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, source):
+        """Submits a source sequence for inference.
+
+        Args:
+            source: A list or 1D numpy array of the source sequence, e.g.,
+                token ids, without padding.
+
+        Returns:
+            An instance of :class:`InferenceRequest`, whose
+            :meth:`~InferenceRequest.result` returns the inference results.
+        """
+        request = InferenceRequest(source)
+        bucket = bisect.bisect_right(self._boundaries, request.length)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("The inference engine is not running.")
+            self._buckets[bucket].append(request)
+            self._num_pending += 1
+            self._cond.notify()
+        return request
+
+    def infer(self, source, timeout=None):
+        """Submits a source sequence and waits for its inference results.
+        See :meth:`submit` and :meth:`InferenceRequest.result`.
+        """
+        return self.submit(source).result(timeout)
+
+    def infer_async(self, source, loop=None):
+        """Submits a source sequence and returns an :mod:`asyncio` future of
+        its inference results, to be awaited in a coroutine.
+
+        Args:
+            source: A list or 1D numpy array of the source sequence.
+            loop (optional): The event loop of the future. If `None`, the
+                current event loop is used.
+        """
+        import asyncio
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def _set_future(request):
+            if future.cancelled():
+                return
+            if request._exception is not None:
+                future.set_exception(request._exception)
+            else:
+                future.set_result(request._result)
+
+        request = self.submit(source)
+        request.add_done_callback(
+            lambda request: loop.call_soon_threadsafe(_set_future, request))
+        return future
+
+    def _pop_batch(self, now):
+        """Pops the requests of a batch that is ready to run.
+
+        Returns:
+            A tuple `(requests, wait_time)`. `requests` is `None` if no
+            batch is ready, in which case `wait_time` is the number of
+            seconds until the next deadline, or `None` if no request is
+            pending.
+        """
+        max_batch_size = self._hparams.max_batch_size
+        oldest_bucket, oldest_time = None, None
+        for bucket in self._buckets:
+            if len(bucket) >= max_batch_size:
+                oldest_bucket = bucket
+                break
+            if bucket and (oldest_time is None or
+                           bucket[0].submit_time < oldest_time):
+                oldest_bucket, oldest_time = bucket, bucket[0].submit_time
+        else:
+            if oldest_bucket is None:
+                return None, None
+            wait_time = oldest_time + self._hparams.max_latency_ms / 1000. \
+                - now
+            if wait_time > 0 and not self._stopped:
+                return None, wait_time
+
+        requests = [oldest_bucket.popleft() for _ in
+                    range(min(max_batch_size, len(oldest_bucket)))]
+        self._num_pending -= len(requests)
+        return requests, None
+
+    def _run_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    requests, wait_time = self._pop_batch(default_timer())
+                    if requests is not None:
+                        break
+                    if self._stopped and self._num_pending == 0:
+                        return
+                    self._cond.wait(wait_time)
+            self._run_batch(requests)
+
+    def _run_batch(self, requests):
+        lengths = [request.length for request in requests]
+        max_length = max(lengths)
+        inputs = np.full([len(requests), max_length], self._hparams.pad_id,
+                         dtype=self._inputs.dtype.as_numpy_dtype)
+        for i, request in enumerate(requests):
+            inputs[i, :request.length] = request.source
+
+        feed_dict = dict(self._feed_dict)
+        feed_dict[self._inputs] = inputs
+        if self._sequence_length is not None:
+            feed_dict[self._sequence_length] = lengths
+
+        start_time = default_timer()
+        try:
+            outputs = self._sess.run(self._fetches, feed_dict=feed_dict)
+            run_time = default_timer() - start_time
+            # Fetches that are not batch-major fail here, before any
+            # request is finished
+            results = [nest.map_structure(lambda x, i=i: x[i], outputs)
+                       for i in range(len(requests))]
+        except Exception as e: # pylint: disable=broad-except
+            for request in requests:
+                request._finish(exception=e)
+            return
+
+        for request, result in zip(requests, results):
+            request._finish(result=result)
+
+        with self._stats_lock:
+            self._num_requests += len(requests)
+            self._num_batches += 1
+            self._num_tokens += sum(lengths)
+            self._num_padded_tokens += len(requests) * max_length
+            self._run_time += run_time
+            self._latencies.extend(request.latency for request in requests)
+
+    def reset_stats(self):
+        """Resets the statistics returned by :meth:`stats`.
+        """
+        with self._stats_lock:
+            self._stats_start_time = default_timer()
+            self._num_requests = 0
+            self._num_batches = 0
+            self._num_tokens = 0
+            self._num_padded_tokens = 0
+            self._run_time = 0.
+            self._latencies = deque(maxlen=self._hparams.stats_window_size)
+
+    def stats(self):
+        """Returns a `dict` of serving statistics since the engine is
+        created or :meth:`reset_stats` is called:
+
+        - **"num_requests"**: Number of finished requests.
+        - **"num_batches"**: Number of batches run.
+        - **"throughput"**: Finished requests per second.
+        - **"latency_p50"**, **"latency_p90"**, **"latency_p99"**: \
+        Percentiles of request latency in milliseconds, over the latest \
+        "stats_window_size" requests.
+        - **"mean_batch_size"**: Average number of requests per batch.
+        - **"batch_fill"**: Average ratio of batch size to \
+        "max_batch_size".
+        - **"padding_efficiency"**: Ratio of source tokens to padded \
+        source tokens in the batches run.
+        - **"run_time_fraction"**: Fraction of wall time spent in \
+        :meth:`tf.Session.run`.
+        """
+        with self._stats_lock:
+            elapsed = default_timer() - self._stats_start_time
+            num_batches = max(self._num_batches, 1)
+            stats = {
+                "num_requests": self._num_requests,
+                "num_batches": self._num_batches,
+                "throughput": self._num_requests / max(elapsed, 1e-12),
+                "mean_batch_size": self._num_requests / num_batches,
+                "batch_fill": self._num_requests / num_batches /
+                              self._hparams.max_batch_size,
+                "padding_efficiency":
+                    self._num_tokens / max(self._num_padded_tokens, 1),
+                "run_time_fraction": self._run_time / max(elapsed, 1e-12),
+            }
+            latencies = np.array(self._latencies) * 1000.
+        for p in [50, 90, 99]:
+            stats["latency_p%d" % p] = \
+                float(np.percentile(latencies, p)) if latencies.size else None
+        return stats
+
+    @property
+    def hparams(self):
+        """The hyperparameter of the engine.
+        """
+        return self._hparams
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+"""
+Unit tests for the inference engine.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.run.inference_engine import InferenceEngine
+
+
+class InferenceEngineTest(tf.test.TestCase):
+    """Tests :class:`texar.run.inference_engine.InferenceEngine`
+    """
+
+    def setUp(self):
+        tf.test.TestCase.setUp(self)
+        self._inputs = tf.placeholder(tf.int32, shape=[None, None])
+        self._length = tf.placeholder(tf.int32, shape=[None])
+        self._fetches = {
+            'sum': tf.reduce_sum(self._inputs, axis=1),
+            'length': self._length,
+        }
+
+    def test_infer(self):
+        """Tests concurrent requests are batched and answered correctly.
+        """
+        sources = [list(range(1, n + 1)) for n in [3, 20, 5, 40, 3, 7] * 5]
+        results = [None] * len(sources)
+
+        with self.test_session() as sess:
+            engine = InferenceEngine(
+                sess, self._fetches, self._inputs, self._length,
+                hparams={'max_batch_size': 4, 'max_latency_ms': 50,
+                         'bucket_boundaries': [8, 32]})
+
+            def _infer(i):
+                results[i] = engine.infer(sources[i], timeout=30)
+
+            with engine:
+                threads = [threading.Thread(target=_infer, args=(i,))
+                           for i in range(len(sources))]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            for source, result in zip(sources, results):
+                self.assertEqual(result['sum'], np.sum(source))
+                self.assertEqual(result['length'], len(source))
+
+            stats = engine.stats()
+            self.assertEqual(stats['num_requests'], len(sources))
+            self.assertLessEqual(stats['mean_batch_size'], 4)
+            self.assertGreater(stats['num_batches'], 1)
+            self.assertLessEqual(stats['padding_efficiency'], 1.)
+            self.assertIsNotNone(stats['latency_p99'])
+
+    def test_flush_on_stop(self):
+        """Tests pending requests are run when the engine stops.
+        """
+        with self.test_session() as sess:
+            engine = InferenceEngine(
+                sess, self._fetches, self._inputs, self._length,
+                hparams={'max_batch_size': 8, 'max_latency_ms': 1e6})
+            engine.start()
+            requests = [engine.submit([1, 2, 3]) for _ in range(3)]
+            engine.stop()
+            for request in requests:
+                self.assertEqual(request.result(timeout=0)['sum'], 6)
+            self.assertEqual(engine.stats()['num_batches'], 1)
+
+    def test_raising_callback(self):
+        """Tests that exceptions of done callbacks do not stop the engine.
+        """
+        def _callback(_):
+            raise ValueError("Callback error.")
+
+        with self.test_session() as sess:
+            engine = InferenceEngine(
+                sess, self._fetches, self._inputs, self._length,
+                hparams={'max_batch_size': 1, 'max_latency_ms': 1})
+            with engine:
+                request = engine.submit([1, 2, 3])
+                request.add_done_callback(_callback)
+                self.assertEqual(request.result(timeout=30)['sum'], 6)
+                self.assertEqual(engine.infer([4, 5], timeout=30)['sum'], 9)
+
+    def test_non_batch_major_fetches(self):
+        """Tests that requests fail, rather than hang, when a fetch can not
+        be sliced by request.
+        """
+        fetches = {'sum': tf.reduce_sum(self._inputs)}
+        with self.test_session() as sess:
+            engine = InferenceEngine(
+                sess, fetches, self._inputs, self._length,
+                hparams={'max_batch_size': 1, 'max_latency_ms': 1})
+            with engine:
+                request = engine.submit([1, 2, 3])
+                self.assertIsInstance(request.exception(timeout=30),
+                                      IndexError)
+                with self.assertRaises(IndexError):
+                    engine.infer([4, 5], timeout=30)
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -29,3 +29,4 @@ from texar.utils.variables import *
 from texar.utils.mode import *
 from texar.utils.average_recorder import *
 from texar.utils.utils_io import *
+from texar.utils.quantization import *
@@ -191,7 +191,9 @@ def beam_search(symbols_to_logits_fn,
                                 alpha,
                                 eos_id,
                                 states=None,
-                                stop_early=True):
+                                stop_early=True,
+                                static_states=None,
+                                compact_finished=False):
     """Beam search with length penalties.
 
     Requires a function that can take the currently decoded sybmols and
@@ -236,11 +238,22 @@ def beam_search(symbols_to_logits_fn,
         eos_id: ID for end of sentence.
         stop_early: a boolean - stop once best sequence is provably
         determined.
+        static_states: dict (possibly nested) of states of shape
+            [batch_size, ...] that are shared by the beams of a batch item
+            and do not change across steps, e.g., the encoder memory. They
+            are neither tiled nor reordered, and are passed to
+            symbols_to_logits_fn as the 4th argument if given.
+        compact_finished: a boolean - once the best sequences of a batch
+            item are provably determined, remove it (and its states) from
+            the loop, so that later steps only compute on the batch items
+            still being decoded. Requires `stop_early`.
     Returns:
         Tuple of
         (decoded beams [batch_size, beam_size, decode_length]
          decoding probablities [batch_size, beam_size])
     """
+    if compact_finished and not stop_early:
+        raise ValueError("`compact_finished` requires `stop_early`.")
     batch_size = shape_list(initial_ids)[0]
 
     # Assume initial_ids are prob 1.0
@@ -294,6 +307,7 @@ def beam_search(symbols_to_logits_fn,
                  log probs of these sequences,
                  Finished flags of these sequences)
         """
+        batch_size = shape_list(finished_seq)[0]
         # First append a column of 0'ids to finished to make the same
         # length with finished scores
         finished_seq = tf.concat(
@@ -336,6 +350,7 @@ def beam_search(symbols_to_logits_fn,
                  log probs of these sequences,
                  Finished flags of these sequences)
         """
+        batch_size = shape_list(curr_seq)[0]
         # Set the scores of the finished seq in curr_seq to large negative
         # values
         curr_scores += tf.to_float(curr_finished) * -INF
@@ -343,7 +358,7 @@ def beam_search(symbols_to_logits_fn,
             curr_log_probs, curr_finished, beam_size, batch_size,
             "grow_alive", states)
 
-    def grow_topk(i, alive_seq, alive_log_probs, states):
+    def grow_topk(i, alive_seq, alive_log_probs, states, static_states):
         r"""Inner beam seach loop.
 
         This function takes the current alive sequences, and grows them to
@@ -363,6 +378,7 @@ def beam_search(symbols_to_logits_fn,
             alive_log_probs: probabilities of these sequences.
                 [batch_size, beam_size]
             states: dict (possibly nested) of decoding states.
+            static_states: dict (possibly nested) of static decoding states.
         Returns:
             Tuple of
                 (Topk sequences extended by the next word,
@@ -371,14 +387,19 @@ def beam_search(symbols_to_logits_fn,
                  Flags indicating which of these sequences have finished
                  decoding, dict of transformed decoding states)
         """
+        batch_size = shape_list(alive_seq)[0]
         # Get the logits for all the possible next symbols
         flat_ids = tf.reshape(alive_seq, [batch_size * beam_size, -1])
 
         # (batch_size * beam_size, decoded_length)
         if states:
             flat_states = nest.map_structure(_merge_beam_dim, states)
-            flat_logits, flat_states = symbols_to_logits_fn(flat_ids, i,
-                flat_states)
+            if static_states is None:
+                flat_logits, flat_states = symbols_to_logits_fn(
+                    flat_ids, i, flat_states)
+            else:
+                flat_logits, flat_states = symbols_to_logits_fn(
+                    flat_ids, i, flat_states, static_states)
             states = nest.map_structure(
                 lambda t: _unmerge_beam_dim(t, batch_size, beam_size),
                 flat_states)
@@ -441,7 +462,7 @@ def beam_search(symbols_to_logits_fn,
         return topk_seq, topk_log_probs, topk_scores, topk_finished, states
 
     def inner_loop(i, alive_seq, alive_log_probs, finished_seq,
-            finished_scores, finished_flags, states):
+            finished_scores, finished_flags, states, static_states=None):
         """Inner beam seach loop.
 
         There are three groups of tensors, alive, finished, and topk.
@@ -477,6 +498,7 @@ def beam_search(symbols_to_logits_fn,
             finished_flags: finished bools for each of these sequences.
                 [batch_size, beam_size]
             states: dict (possibly nested) of decoding states.
+            static_states: dict (possibly nested) of static decoding states.
 
         Returns:
             Tuple of
@@ -495,7 +517,7 @@ def beam_search(symbols_to_logits_fn,
         # 2. Extract the ones that have finished and haven't finished
         # 3. Recompute the contents of finished based on scores.
         topk_seq, topk_log_probs, topk_scores, topk_finished, states =\
-            grow_topk(i, alive_seq, alive_log_probs, states)
+            grow_topk(i, alive_seq, alive_log_probs, states, static_states)
         alive_seq, alive_log_probs, _, states = grow_alive(
             topk_seq, topk_scores, topk_log_probs, topk_finished, states)
         finished_seq, finished_scores, finished_flags, _ = grow_finished(
@@ -505,17 +527,13 @@ def beam_search(symbols_to_logits_fn,
         return (i + 1, alive_seq, alive_log_probs, finished_seq,
             finished_scores, finished_flags, states)
 
-    def _is_finished(i, unused_alive_seq, alive_log_probs,
-            unused_finished_seq, finished_scores, finished_in_finished,
-            unused_states):
-        """Checking termination condition.
-
-        We terminate when we decoded up to decode_length or the lowest
-        scoring item in finished has a greater score that the higest prob
-        item in alive divided by the max length penalty
+    def _bound_is_met(alive_log_probs, finished_scores,
+                      finished_in_finished):
+        """Checks, for each batch item, whether the lowest scoring item in
+        finished has a greater score that the higest prob item in alive
+        divided by the max length penalty.
 
         Args:
-            i: loop index
             alive_log_probs: probabilities of the beams. [batch_size,
                 beam_size]
             finished_scores: scores for each of these sequences.
@@ -524,10 +542,8 @@ def beam_search(symbols_to_logits_fn,
             sequences. [batch_size, beam_size]
 
         Returns:
-            Bool.
+            Bools of shape [batch_size].
         """
-        if not stop_early:
-            return tf.less(i, decode_length)
         max_length_penalty = tf.pow(((5. + tf.to_float(decode_length)) \
             / 6.), alpha)
         # The best possible score of the most likley alive sequence
@@ -550,31 +566,155 @@ def beam_search(symbols_to_logits_fn,
             (1. - tf.to_float(tf.reduce_any(finished_in_finished,
             1))) * -INF)
 
-        bound_is_met = tf.reduce_all(
-            tf.greater(lowest_score_of_fininshed_in_finished,
-            lower_bound_alive_scores))
+        return tf.greater(lowest_score_of_fininshed_in_finished,
+                          lower_bound_alive_scores)
+
+    def _is_finished(i, unused_alive_seq, alive_log_probs,
+            unused_finished_seq, finished_scores, finished_in_finished,
+            *unused_states):
+        """Checking termination condition.
+
+        We terminate when we decoded up to decode_length or the lowest
+        scoring item in finished has a greater score that the higest prob
+        item in alive divided by the max length penalty
+
+        Args:
+            i: loop index
+            alive_log_probs: probabilities of the beams. [batch_size,
+                beam_size]
+            finished_scores: scores for each of these sequences.
+                [batch_size, beam_size]
+            finished_in_finished: finished bools for each of these
+            sequences. [batch_size, beam_size]
+
+        Returns:
+            Bool.
+        """
+        if not stop_early:
+            return tf.less(i, decode_length)
+        bound_is_met = tf.reduce_all(_bound_is_met(
+            alive_log_probs, finished_scores, finished_in_finished))
 
         return tf.logical_and(
             tf.less(i, decode_length), tf.logical_not(bound_is_met))
 
-    (_, alive_seq, alive_log_probs, finished_seq, finished_scores,
-     finished_flags, _) = tf.while_loop(
-        _is_finished,
-        inner_loop, [
-            tf.constant(0), alive_seq, alive_log_probs, finished_seq,
-            finished_scores, finished_flags, states
-        ],
-        shape_invariants=[
-            tf.TensorShape([]),
-            tf.TensorShape([None, None, None]),
-            alive_log_probs.get_shape(),
-            tf.TensorShape([None, None, None]),
-            finished_scores.get_shape(),
-            finished_flags.get_shape(),
-            nest.map_structure(get_state_shape_invariants, states),
-        ],
-        parallel_iterations=1,
-        back_prop=False)
+    def _scatter_rows(out_seq, out_scores, indices, seq, scores):
+        """Writes the sequences and scores of the batch items at
+        `indices` into the full-batch outputs, padding the sequences with
+        0s to a common length.
+        """
+        length = tf.maximum(tf.shape(out_seq)[2], tf.shape(seq)[2])
+        out_seq = tf.pad(out_seq, [[0, 0], [0, 0],
+                                   [0, length - tf.shape(out_seq)[2]]])
+        seq = tf.pad(seq, [[0, 0], [0, 0], [0, length - tf.shape(seq)[2]]])
+        indices = tf.expand_dims(indices, axis=1)
+        out_seq += tf.scatter_nd(
+            indices, seq, [batch_size, beam_size, length])
+        out_scores += tf.scatter_nd(
+            indices, scores, [batch_size, beam_size])
+        return out_seq, out_scores
+
+    def compact_inner_loop(i, alive_seq, alive_log_probs, finished_seq,
+                           finished_scores, finished_flags, states,
+                           static_states, active_indices, out_seq,
+                           out_scores):
+        """Inner beam search loop that removes the batch items whose
+        best sequences are determined.
+
+        Args:
+            static_states: dict (possibly nested) of static decoding
+                states of the batch items being decoded.
+            active_indices: indexes of the batch items being decoded in
+                the full batch. [num_active]
+            out_seq: decoded beams of the removed batch items in the full
+                batch. [batch_size, beam_size, length]
+            out_scores: decoding probablities of the removed batch items in
+                the full batch. [batch_size, beam_size]
+        """
+        (i, alive_seq, alive_log_probs, finished_seq, finished_scores,
+         finished_flags, states) = inner_loop(
+             i, alive_seq, alive_log_probs, finished_seq, finished_scores,
+             finished_flags, states,
+             static_states if use_static_states else None)
+        loop_vars = (alive_seq, alive_log_probs, finished_seq,
+                     finished_scores, finished_flags, states, static_states,
+                     active_indices)
+
+        rows_done = _bound_is_met(
+            alive_log_probs, finished_scores, finished_flags)
+
+        def _compact():
+            done_pos = tf.where(rows_done)[:, 0]
+            new_out_seq, new_out_scores = _scatter_rows(
+                out_seq, out_scores,
+                tf.gather(active_indices, done_pos),
+                tf.gather(finished_seq, done_pos),
+                tf.gather(finished_scores, done_pos))
+            keep_pos = tf.where(tf.logical_not(rows_done))[:, 0]
+            kept = nest.map_structure(
+                lambda t: tf.gather(t, keep_pos), loop_vars)
+            return kept + (new_out_seq, new_out_scores)
+
+        def _identity():
+            return loop_vars + (out_seq, out_scores)
+
+        outputs = tf.cond(tf.reduce_any(rows_done), _compact, _identity)
+        return (i,) + tuple(outputs)
+
+    def _unknown_shape(tensor):
+        return tf.TensorShape([None] * tensor.shape.ndims)
+
+    use_static_states = static_states is not None
+    if compact_finished:
+        if not use_static_states:
+            static_states = {}
+        (_, alive_seq, alive_log_probs, finished_seq, finished_scores,
+         finished_flags, _, _, active_indices, out_seq, out_scores) = \
+            tf.while_loop(
+                _is_finished,
+                compact_inner_loop, [
+                    tf.constant(0), alive_seq, alive_log_probs,
+                    finished_seq, finished_scores, finished_flags, states,
+                    static_states, tf.range(batch_size),
+                    tf.zeros([batch_size, beam_size, 0], tf.int32),
+                    tf.zeros([batch_size, beam_size])
+                ],
+                shape_invariants=[
+                    tf.TensorShape([]),
+                    tf.TensorShape([None, None, None]),
+                    tf.TensorShape([None, None]),
+                    tf.TensorShape([None, None, None]),
+                    tf.TensorShape([None, None]),
+                    tf.TensorShape([None, None]),
+                    nest.map_structure(_unknown_shape, states),
+                    nest.map_structure(_unknown_shape, static_states),
+                    tf.TensorShape([None]),
+                    tf.TensorShape([None, None, None]),
+                    tf.TensorShape([None, None]),
+                ],
+                parallel_iterations=1,
+                back_prop=False)
+    else:
+        (_, alive_seq, alive_log_probs, finished_seq, finished_scores,
+         finished_flags, _) = tf.while_loop(
+            _is_finished,
+            lambda *loop_vars: inner_loop(*loop_vars,
+                                          static_states=static_states),
+            [
+                tf.constant(0), alive_seq, alive_log_probs, finished_seq,
+                finished_scores, finished_flags, states
+            ],
+            shape_invariants=[
+                tf.TensorShape([]),
+                tf.TensorShape([None, None, None]),
+                alive_log_probs.get_shape(),
+                tf.TensorShape([None, None, None]),
+                finished_scores.get_shape(),
+                finished_flags.get_shape(),
+                nest.map_structure(get_state_shape_invariants, states),
+            ],
+            parallel_iterations=1,
+            back_prop=False)
 
     alive_seq.set_shape((None, beam_size, None))
     finished_seq.set_shape((None, beam_size, None))
@@ -589,4 +729,279 @@ def beam_search(symbols_to_logits_fn,
         tf.reduce_any(finished_flags, 1), finished_seq, alive_seq)
     finished_scores = tf.where(
         tf.reduce_any(finished_flags, 1), finished_scores, alive_log_probs)
+
+    if compact_finished:
+        # Scatters the batch items still being decoded back
+        finished_seq, finished_scores = _scatter_rows(
+            out_seq, out_scores, active_indices, finished_seq,
+            finished_scores)
+        finished_seq.set_shape((None, beam_size, None))
+
     return finished_seq, finished_scores
+
+def _backtrace(cand_ids, cand_parents, alive_cands, end_steps, end_cands,
+               num_steps):
+    """Reconstructs hypotheses from the backpointers recorded by
+    :func:`beam_search_with_backpointers`.
+
+    Args:
+        cand_ids: Token ids of the top 2*beam candidates at each step.
+            [num_steps, batch_size, 2*beam_size]
+        cand_parents: Alive beam (of the previous step) each candidate
+            extends. [num_steps, batch_size, 2*beam_size]
+        alive_cands: Candidates selected as the alive beams at each step.
+            [num_steps, batch_size, beam_size]
+        end_steps: Step at which each hypothesis ends, or -1 for empty
+            hypotheses. [batch_size, beam_size]
+        end_cands: Candidate index of each hypothesis at its end step.
+            [batch_size, beam_size]
+        num_steps: Number of decoding steps.
+    Returns:
+        Decoded ids [batch_size, beam_size, num_steps], padded with 0s after
+        the end of each hypothesis.
+    """
+    batch_size, beam_size = shape_list(end_steps)
+    batch_pos = compute_batch_indices(batch_size, beam_size)
+    ids_ta = tf.TensorArray(tf.int32, size=num_steps)
+
+    def _body(t, cur_cands, ids_ta):
+        # Hypotheses ending at step t are traced from here on
+        cur_cands = tf.where(tf.equal(end_steps, t), end_cands, cur_cands)
+        coordinates = tf.stack([batch_pos, cur_cands], axis=2)
+        ids = tf.gather_nd(cand_ids[t], coordinates)
+        ids = tf.where(tf.less_equal(t, end_steps), ids, tf.zeros_like(ids))
+        ids_ta = ids_ta.write(t, ids)
+        parents = tf.gather_nd(cand_parents[t], coordinates)
+        prev_cands = tf.gather_nd(alive_cands[tf.maximum(t - 1, 0)],
+                                  tf.stack([batch_pos, parents], axis=2))
+        return t - 1, prev_cands, ids_ta
+
+    _, _, ids_ta = tf.while_loop(
+        lambda t, *_: tf.greater_equal(t, 0),
+        _body,
+        [num_steps - 1, tf.zeros_like(end_cands), ids_ta],
+        back_prop=False)
+
+    # (num_steps, batch_size, beam_size) -> (batch_size, beam_size, num_steps)
+    return tf.transpose(ids_ta.stack(), [1, 2, 0])
+
+
+def beam_search_with_backpointers(symbols_to_logits_fn,
+                                  initial_ids,
+                                  beam_size,
+                                  decode_length,
+                                  vocab_size,
+                                  alpha,
+                                  eos_id,
+                                  states=None,
+                                  stop_early=True,
+                                  static_states=None):
+    """Beam search with length penalties that keeps backpointers instead of
+    the full sequences in the loop.
+
+    Searches the same hypotheses as :func:`beam_search`, but at each step
+    only the token ids and parent beams of the candidates are written into
+    `TensorArray` s, and the final hypotheses are reconstructed with a
+    single backtrace after the loop. This avoids growing and reordering
+    `[batch_size, beam_size, decoded_length]` sequences at every step.
+
+    Args:
+        symbols_to_logits_fn: Interface to the model, to provide logits.
+            Different from :func:`beam_search`, it takes the ids decoded at
+            the last step only, of shape `[batch_size * beam_size, 1]`,
+            and returns `[batch_size * beam_size, vocab_size]`.
+        initial_ids: Ids to start off the decoding, this will be the first
+            thing handed to symbols_to_logits_fn (after expanding to beam
+            size) [batch_size]
+        beam_size: Size of the beam.
+        decode_length: Number of steps to decode for.
+        vocab_size: Size of the vocab, must equal the size of the logits
+            returned by symbols_to_logits_fn
+        alpha: alpha for length penalty.
+        eos_id: ID for end of sentence.
+        states: dict (possibly nested) of decoding states.
+        stop_early: a boolean - stop once best sequence is provably
+            determined.
+        static_states: dict (possibly nested) of states shared by the beams
+            of a batch item. See :func:`beam_search`.
+    Returns:
+        Tuple of
+        (decoded beams [batch_size, beam_size, decode_length]
+         decoding probablities [batch_size, beam_size])
+    """
+    batch_size = shape_list(initial_ids)[0]
+
+    # Assume initial_ids are prob 1.0
+    initial_log_probs = tf.constant([[0.] + [-float("inf")] * (
+        beam_size - 1)])
+    alive_log_probs = tf.tile(initial_log_probs, [batch_size, 1])
+    alive_ids = _expand_to_beam_size(initial_ids, beam_size)
+    if states:
+        states = nest.map_structure(
+            lambda state: _expand_to_beam_size(state, beam_size), states)
+    else:
+        states = {}
+
+    # A finished hypothesis is identified by the step it ends at and its
+    # index among the 2*beam candidates of that step.
+    finished_scores = tf.ones([batch_size, beam_size]) * -INF
+    finished_flags = tf.zeros([batch_size, beam_size], tf.bool)
+    finished_steps = -tf.ones([batch_size, beam_size], tf.int32)
+    finished_cands = tf.zeros([batch_size, beam_size], tf.int32)
+
+    cand_ids_ta = tf.TensorArray(tf.int32, size=0, dynamic_size=True)
+    cand_parents_ta = tf.TensorArray(tf.int32, size=0, dynamic_size=True)
+    alive_cands_ta = tf.TensorArray(tf.int32, size=0, dynamic_size=True)
+
+    batch_pos = compute_batch_indices(batch_size, beam_size)
+    cand_range = tf.tile(
+        tf.expand_dims(tf.range(beam_size * 2), 0), [batch_size, 1])
+
+    def inner_loop(i, alive_ids, alive_log_probs, finished_scores,
+                   finished_flags, finished_steps, finished_cands,
+                   cand_ids_ta, cand_parents_ta, alive_cands_ta, states):
+        """Inner beam search loop. See :func:`beam_search` for the
+        algorithm.
+        """
+        flat_ids = tf.reshape(alive_ids, [batch_size * beam_size, 1])
+        if states:
+            flat_states = nest.map_structure(_merge_beam_dim, states)
+            if static_states is None:
+                flat_logits, flat_states = symbols_to_logits_fn(
+                    flat_ids, i, flat_states)
+            else:
+                flat_logits, flat_states = symbols_to_logits_fn(
+                    flat_ids, i, flat_states, static_states)
+            states = nest.map_structure(
+                lambda t: _unmerge_beam_dim(t, batch_size, beam_size),
+                flat_states)
+        else:
+            flat_logits = symbols_to_logits_fn(flat_ids)
+        logits = tf.reshape(flat_logits, [batch_size, beam_size, -1])
+
+        candidate_log_probs = log_prob_from_logits(logits)
+        log_probs = candidate_log_probs + tf.expand_dims(alive_log_probs,
+                                                         axis=2)
+        length_penalty = tf.pow(((5. + tf.to_float(i + 1)) / 6.), alpha)
+        curr_scores = log_probs / length_penalty
+        flat_curr_scores = tf.reshape(curr_scores,
+                                      [-1, beam_size * vocab_size])
+        topk_scores, topk_ids = tf.nn.top_k(flat_curr_scores,
+                                            k=beam_size * 2)
+        topk_log_probs = topk_scores * length_penalty
+        topk_parents = topk_ids // vocab_size
+        topk_ids %= vocab_size
+        topk_finished = tf.equal(topk_ids, eos_id)
+
+        # Grows alive with the top unfinished candidates. States are
+        # gathered once, directly from the parents of the new alive beams.
+        alive_scores = topk_scores + tf.to_float(topk_finished) * -INF
+        _, alive_cands = tf.nn.top_k(alive_scores, k=beam_size)
+        alive_coordinates = tf.stack([batch_pos, alive_cands], axis=2)
+        alive_ids = tf.gather_nd(topk_ids, alive_coordinates)
+        alive_log_probs = tf.gather_nd(topk_log_probs, alive_coordinates)
+        if states:
+            alive_parents = tf.gather_nd(topk_parents, alive_coordinates)
+            state_coordinates = tf.stack([batch_pos, alive_parents], axis=2)
+            states = nest.map_structure(
+                lambda state: tf.gather_nd(state, state_coordinates), states)
+
+        # Grows finished with the top finished candidates
+        curr_finished_scores = tf.concat(
+            [finished_scores,
+             topk_scores + (1. - tf.to_float(topk_finished)) * -INF], axis=1)
+        curr_finished_flags = tf.concat(
+            [finished_flags, topk_finished], axis=1)
+        curr_finished_steps = tf.concat(
+            [finished_steps, tf.fill(tf.shape(topk_ids), i)], axis=1)
+        curr_finished_cands = tf.concat(
+            [finished_cands, cand_range], axis=1)
+        _, finished_topk = tf.nn.top_k(curr_finished_scores, k=beam_size)
+        finished_coordinates = tf.stack([batch_pos, finished_topk], axis=2)
+        finished_scores = tf.gather_nd(
+            curr_finished_scores, finished_coordinates)
+        finished_flags = tf.gather_nd(
+            curr_finished_flags, finished_coordinates)
+        finished_steps = tf.gather_nd(
+            curr_finished_steps, finished_coordinates)
+        finished_cands = tf.gather_nd(
+            curr_finished_cands, finished_coordinates)
+
+        cand_ids_ta = cand_ids_ta.write(i, topk_ids)
+        cand_parents_ta = cand_parents_ta.write(i, topk_parents)
+        alive_cands_ta = alive_cands_ta.write(i, alive_cands)
+
+        return (i + 1, alive_ids, alive_log_probs, finished_scores,
+                finished_flags, finished_steps, finished_cands,
+                cand_ids_ta, cand_parents_ta, alive_cands_ta, states)
+
+    def _is_finished(i, unused_alive_ids, alive_log_probs, finished_scores,
+                     finished_in_finished, *unused_args):
+        """Checking termination condition. See :func:`beam_search`.
+        """
+        if not stop_early:
+            return tf.less(i, decode_length)
+        max_length_penalty = tf.pow(((5. + tf.to_float(decode_length)) \
+            / 6.), alpha)
+        lower_bound_alive_scores = alive_log_probs[:, 0] /\
+            max_length_penalty
+        lowest_score_of_fininshed_in_finished = tf.reduce_min(
+            finished_scores * tf.to_float(finished_in_finished), axis=1)
+        lowest_score_of_fininshed_in_finished += (
+            (1. - tf.to_float(tf.reduce_any(finished_in_finished, 1)))
+            * -INF)
+        bound_is_met = tf.reduce_all(
+            tf.greater(lowest_score_of_fininshed_in_finished,
+                       lower_bound_alive_scores))
+        return tf.logical_and(
+            tf.less(i, decode_length), tf.logical_not(bound_is_met))
+
+    (num_steps, _, alive_log_probs, finished_scores, finished_flags,
+     finished_steps, finished_cands, cand_ids_ta, cand_parents_ta,
+     alive_cands_ta, _) = tf.while_loop(
+         _is_finished,
+         inner_loop, [
+             tf.constant(0), alive_ids, alive_log_probs, finished_scores,
+             finished_flags, finished_steps, finished_cands,
+             cand_ids_ta, cand_parents_ta, alive_cands_ta, states
+         ],
+         shape_invariants=[
+             tf.TensorShape([]),
+             alive_ids.get_shape(),
+             alive_log_probs.get_shape(),
+             finished_scores.get_shape(),
+             finished_flags.get_shape(),
+             finished_steps.get_shape(),
+             finished_cands.get_shape(),
+             tf.TensorShape(None),
+             tf.TensorShape(None),
+             tf.TensorShape(None),
+             nest.map_structure(get_state_shape_invariants, states),
+         ],
+         parallel_iterations=1,
+         back_prop=False)
+
+    cand_ids = cand_ids_ta.stack()
+    cand_parents = cand_parents_ta.stack()
+    alive_cands = alive_cands_ta.stack()
+
+    # Accounting for corner case: It's possible that no sequence in alive
+    # for a particular batch item ever reached EOS. In that case, we
+    # should just take the alive hypotheses, which end at the last step.
+    has_finished = tf.reduce_any(finished_flags, 1)
+    end_steps = tf.where(
+        has_finished, finished_steps, tf.fill(tf.shape(finished_steps),
+                                              num_steps - 1))
+    end_cands = tf.where(has_finished, finished_cands,
+                         alive_cands[num_steps - 1])
+    scores = tf.where(has_finished, finished_scores, alive_log_probs)
+
+    seq = _backtrace(cand_ids, cand_parents, alive_cands, end_steps,
+                     end_cands, num_steps)
+    # Empty finished slots are all 0s, as in :func:`beam_search`
+    initial_seq = _expand_to_beam_size(initial_ids, beam_size)
+    initial_seq = tf.where(tf.greater_equal(end_steps, 0), initial_seq,
+                           tf.zeros_like(initial_seq))
+    seq = tf.concat([tf.expand_dims(initial_seq, axis=2), seq], axis=2)
+    seq.set_shape((None, beam_size, None))
+    return seq, scores
@@ -0,0 +1,102 @@
+"""
+Unit tests for beam search.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=no-member
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.utils import beam_search
+
+
+class BeamSearchTest(tf.test.TestCase):
+    """Tests beam search functions.
+    """
+
+    def setUp(self):
+        tf.test.TestCase.setUp(self)
+        self._batch_size = 3
+        self._vocab_size = 11
+        self._dim = 8
+        self._beam_size = 4
+        self._decode_length = 9
+        self._eos_id = 2
+
+        rng = np.random.RandomState(0)
+        self._embedding = tf.constant(
+            rng.randn(self._vocab_size, self._dim), dtype=tf.float32)
+        self._transition = tf.constant(
+            rng.randn(self._dim, self._dim), dtype=tf.float32)
+        self._projection = tf.constant(
+            rng.randn(self._dim, self._vocab_size), dtype=tf.float32)
+
+    def _symbols_to_logits_fn(self, ids, step, states):
+        # pylint: disable=unused-argument
+        inputs = tf.nn.embedding_lookup(self._embedding, ids[:, -1])
+        h = tf.tanh(tf.matmul(states['h'], self._transition) + inputs)
+        logits = tf.matmul(h, self._projection)
+        return logits, {'h': h}
+
+    def test_beam_search_with_backpointers(self):
+        """Tests :func:`beam_search_with_backpointers` finds the same
+        hypotheses as :func:`beam_search`.
+        """
+        initial_ids = tf.fill([self._batch_size], 1)
+        states = {'h': tf.zeros([self._batch_size, self._dim])}
+
+        seq, scores = beam_search.beam_search(
+            self._symbols_to_logits_fn, initial_ids, self._beam_size,
+            self._decode_length, self._vocab_size, alpha=0.6,
+            eos_id=self._eos_id, states=states)
+        bp_seq, bp_scores = beam_search.beam_search_with_backpointers(
+            self._symbols_to_logits_fn, initial_ids, self._beam_size,
+            self._decode_length, self._vocab_size, alpha=0.6,
+            eos_id=self._eos_id, states=states)
+
+        with self.test_session() as sess:
+            seq_, scores_, bp_seq_, bp_scores_ = sess.run(
+                [seq, scores, bp_seq, bp_scores])
+            np.testing.assert_array_equal(seq_, bp_seq_)
+            np.testing.assert_allclose(scores_, bp_scores_, rtol=1e-5)
+
+    def test_compact_finished(self):
+        """Tests :func:`beam_search` with `compact_finished` and
+        `static_states` finds the same hypotheses as without them.
+        """
+        initial_ids = tf.fill([self._batch_size], 1)
+        states = {'h': tf.zeros([self._batch_size, self._dim])}
+        bias = tf.random_uniform([self._batch_size, self._vocab_size])
+
+        def _symbols_to_logits_fn(ids, step, states, static_states):
+            logits, states = self._symbols_to_logits_fn(ids, step, states)
+            # Beams of a batch item share the same static states
+            beam_size = tf.shape(ids)[0] // tf.shape(static_states['bias'])[0]
+            logits += tf.reshape(
+                tf.tile(static_states['bias'], [1, beam_size]),
+                [-1, self._vocab_size])
+            return logits, states
+
+        outputs = [
+            beam_search.beam_search(
+                _symbols_to_logits_fn, initial_ids, self._beam_size,
+                self._decode_length, self._vocab_size, alpha=0.6,
+                eos_id=self._eos_id, states=states,
+                static_states={'bias': bias},
+                compact_finished=compact_finished)
+            for compact_finished in [False, True]
+        ]
+
+        with self.test_session() as sess:
+            (seq_, scores_), (compact_seq_, compact_scores_) = \
+                sess.run(outputs)
+            np.testing.assert_array_equal(seq_, compact_seq_)
+            np.testing.assert_allclose(scores_, compact_scores_, rtol=1e-5)
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,386 @@
+# Copyright 2018 The Texar Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Post-training int8 weight quantization for inference.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import re
+import time
+import contextlib
+
+import numpy as np
+
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+# pylint: disable=too-many-arguments, too-many-locals, invalid-name
+
+__all__ = [
+    "quantize_weights",
+    "dequantize_weights",
+    "quantize_checkpoint",
+    "get_quantized_variable_getter",
+    "quantized_inference_scope",
+    "evaluate_quantization"
+]
+
+_QUANTIZED_SUFFIX = '/quantized'
+_SCALE_SUFFIX = '/quantization_scale'
+_QMAX = 127
+# Names of the slot variables of optimizers
+_OPTIMIZER_SLOT_PATTERN = \
+    r'/(adam_m|adam_v|Adam[^/]*|Momentum|Adagrad|RMSProp[^/]*)$'
+
+
+def quantize_weights(value, channel_axis=-1):
+    """Symmetrically quantizes a float array into int8, with one scale for
+    each channel along :attr:`channel_axis`.
+
+    Args:
+        value: A float numpy array.
+        channel_axis (int): The axis of channels. E.g., `-1` for the kernel
+            of a dense layer (one scale for each output unit), or `0` for
+            an embedding table (one scale for each token).
+
+    Returns:
+        A tuple `(quantized, scale)`, where `quantized` is an int8 array of
+        the same shape as :attr:`value`, and `scale` is a float32 array
+        with size `1` in all axes except :attr:`channel_axis`, such that
+        `value ~= quantized * scale`.
+    """
+    value = np.asarray(value, dtype=np.float32)
+    channel_axis = channel_axis % value.ndim
+    reduce_axes = tuple(i for i in range(value.ndim) if i != channel_axis)
+    max_abs = np.max(np.abs(value), axis=reduce_axes, keepdims=True)
+    scale = np.where(max_abs > 0, max_abs / _QMAX, 1.).astype(np.float32)
+    quantized = np.clip(np.round(value / scale), -_QMAX, _QMAX)
+    return quantized.astype(np.int8), scale
+
+def dequantize_weights(quantized, scale):
+    """Recovers float weights from the outputs of :func:`quantize_weights`.
+    """
+    return quantized.astype(np.float32) * scale
+
+def _should_quantize(name, value, include, exclude, min_size):
+    if value.dtype != np.float32 or value.ndim != 2:
+        return False
+    if value.size < min_size:
+        return False
+    if include is not None and not re.search(include, name):
+        return False
+    if exclude is not None and re.search(exclude, name):
+        return False
+    return True
+
+def quantize_checkpoint(checkpoint_path, output_path, include=None,
+                        exclude=None, row_wise='embedder', min_size=1024):
+    """Converts a trained checkpoint into a checkpoint with int8 weights.
+
+    Each 2D float32 variable with at least :attr:`min_size` elements, e.g.,
+    the kernels of dense layers (attention projections, position-wise
+    feed-forward networks, output layers) and embedding tables, is
+    replaced with an int8 variable named `<name>/quantized` and a float32
+    per-channel scale named `<name>/quantization_scale`. Other variables
+    are copied unchanged.
+
+    Optimizer slots (e.g., `<name>/adam_m` or `<name>/Adam`) are copied
+    unchanged and are excluded from the byte counts.
+
+    The resulting checkpoint is loaded into an inference graph built
+    within :func:`quantized_inference_scope`, which keeps the weights in
+    int8.
+
+    Args:
+        checkpoint_path (str): Path of the checkpoint to convert.
+        output_path (str): Path prefix of the quantized checkpoint.
+        include (str, optional): A regular expression. If given, only
+            variables whose names match it are quantized.
+        exclude (str, optional): A regular expression. Variables whose
+            names match it are not quantized.
+        row_wise (str, optional): A regular expression. Variables whose
+            names match it, e.g., embedding tables, are scaled for each row
+            instead of each column.
+        min_size (int): Minimum number of elements of quantized variables.
+
+    Returns:
+        A dict with keys:
+
+        - **"quantized_variables"**: The names of the quantized variables.
+        - **"original_bytes"**: Total size of the original variables, \
+        excluding optimizer slots.
+        - **"quantized_bytes"**: Total size of the converted variables, \
+        excluding optimizer slots.
+        - **"max_abs_error"**: A dict mapping the name of each quantized \
+        variable to the maximum absolute rounding error of its elements.
+    """
+    reader = tf.train.load_checkpoint(checkpoint_path)
+    values = {}
+    slot_names = set()
+    original_bytes = 0
+    max_abs_error = {}
+    for name, _ in tf.train.list_variables(checkpoint_path):
+        value = reader.get_tensor(name)
+        if re.search(_OPTIMIZER_SLOT_PATTERN, name):
+            values[name] = value
+            slot_names.add(name)
+            continue
+        original_bytes += np.asarray(value).nbytes
+        if not _should_quantize(name, value, include, exclude, min_size):
+            values[name] = value
+            continue
+        axis = 0 if row_wise and re.search(row_wise, name) else -1
+        quantized, scale = quantize_weights(value, channel_axis=axis)
+        values[name + _QUANTIZED_SUFFIX] = quantized
+        values[name + _SCALE_SUFFIX] = scale
+        max_abs_error[name] = float(np.max(np.abs(
+            dequantize_weights(quantized, scale) - value)))
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not tf.gfile.Exists(output_dir):
+        tf.gfile.MakeDirs(output_dir)
+
+    with tf.Graph().as_default():
+        var_list = {}
+        feed_dict = {}
+        for name, value in values.items():
+            value = np.asarray(value)
+            initial_value = tf.placeholder(
+                tf.as_dtype(value.dtype), shape=value.shape)
+            feed_dict[initial_value] = value
+            var_list[name] = tf.Variable(initial_value, trainable=False)
+        saver = tf.train.Saver(var_list)
+        with tf.Session() as sess:
+            sess.run(tf.variables_initializer(list(var_list.values())),
+                     feed_dict=feed_dict)
+            saver.save(sess, output_path)
+
+    return {
+        'quantized_variables': sorted(max_abs_error.keys()),
+        'original_bytes': original_bytes,
+        'quantized_bytes': sum(np.asarray(value).nbytes
+                               for name, value in values.items()
+                               if name not in slot_names),
+        'max_abs_error': max_abs_error
+    }
+
+def get_quantized_variable_getter(checkpoint_path):
+    """Returns a custom getter for
+    :tf_main:`variable_scope <variable_scope>` that replaces each variable
+    quantized in the checkpoint (see :func:`quantize_checkpoint`) with an
+    int8 variable and a float32 scale variable, and returns the
+    dequantized weights to the module using them. Modules thus hold int8
+    weights in memory and run without modification.
+
+    The dequantization is created outside of any control flow context,
+    e.g., the `while_loop` of dynamic decoding, so that it runs once in
+    each `session.run` rather than at every decoding step. The float
+    weights are transient within the run.
+
+    Args:
+        checkpoint_path (str): Path of a checkpoint created by
+            :func:`quantize_checkpoint`.
+
+    Returns:
+        A custom getter function.
+    """
+    shapes = dict(tf.train.list_variables(checkpoint_path))
+    quantized = {}
+    for name, shape in shapes.items():
+        if name.endswith(_QUANTIZED_SUFFIX):
+            base_name = name[:-len(_QUANTIZED_SUFFIX)]
+            quantized[base_name] = (shape, shapes[base_name + _SCALE_SUFFIX])
+
+    def _getter(getter, name, *args, **kwargs):
+        if name not in quantized:
+            return getter(name, *args, **kwargs)
+        shape, scale_shape = quantized[name]
+        dtype = kwargs.get('dtype')
+        dtype = tf.as_dtype(dtype).base_dtype if dtype else tf.float32
+        getter_kwargs = {k: kwargs[k] for k in
+                         ('reuse', 'collections', 'caching_device')
+                         if k in kwargs}
+        # Clears the control flow context
+        with tf.control_dependencies(None):
+            weights = getter(name + _QUANTIZED_SUFFIX, shape=shape,
+                             dtype=tf.int8, initializer=tf.zeros_initializer(),
+                             trainable=False, **getter_kwargs)
+            scale = getter(name + _SCALE_SUFFIX, shape=scale_shape,
+                           dtype=tf.float32, initializer=tf.ones_initializer(),
+                           trainable=False, **getter_kwargs)
+            return tf.cast(weights, dtype) * tf.cast(scale, dtype)
+
+    return _getter
+
+@contextlib.contextmanager
+def quantized_inference_scope(checkpoint_path):
+    """A context manager in which variables quantized in the checkpoint are
+    created as int8 variables with scales, and are dequantized when used.
+    See :func:`get_quantized_variable_getter`.
+
+    Modules capture their variable scope when they are created, hence both
+    the creation and the calls of modules must happen within the scope.
+    Then restore all variables from the quantized checkpoint as usual,
+    e.g., with :tf_main:`tf.train.Saver <train/Saver>`.
+
+    Example:
+
+        .. code-block:: python
+
+            tx.utils.quantize_checkpoint('model/model.ckpt', 'int8/model.ckpt')
+
+            with tx.utils.quantized_inference_scope('int8/model.ckpt'):
+                embedder = tx.modules.WordEmbedder(vocab_size=vocab_size)
+                encoder = tx.modules.TransformerEncoder()
+                outputs = encoder(embedder(inputs), sequence_length)
+
+            saver = tf.train.Saver()
+            saver.restore(sess, 'int8/model.ckpt')
+
+    Args:
+        checkpoint_path (str): Path of a checkpoint created by
+            :func:`quantize_checkpoint`.
+    """
+    getter = get_quantized_variable_getter(checkpoint_path)
+    with tf.variable_scope(tf.get_variable_scope(), custom_getter=getter,
+                           auxiliary_name_scope=False):
+        yield
+
+def _checkpoint_bytes(checkpoint_path):
+    reader = tf.train.load_checkpoint(checkpoint_path)
+    shapes = reader.get_variable_to_shape_map()
+    return sum(int(np.prod(shapes[name])) * dtype.size
+               for name, dtype in reader.get_variable_to_dtype_map().items()
+               if not re.search(_OPTIMIZER_SLOT_PATTERN, name))
+
+def _resident_bytes():
+    """Returns the resident memory of the process, or `None` if it can not
+    be read (e.g., on systems without `/proc`).
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, AttributeError, ValueError):
+        return None
+
+def _run_inference(build_fn, checkpoint_path, feed_dicts, quantized,
+                   num_warmup_runs):
+    with tf.Graph().as_default():
+        if quantized:
+            with quantized_inference_scope(checkpoint_path):
+                fetches = build_fn()
+        else:
+            fetches = build_fn()
+        weight_bytes = sum(
+            v.shape.num_elements() * v.dtype.base_dtype.size
+            for v in tf.global_variables())
+        saver = tf.train.Saver()
+        config = tf.ConfigProto(device_count={'GPU': 0})
+        start_resident_bytes = _resident_bytes()
+        with tf.Session(config=config) as sess:
+            saver.restore(sess, checkpoint_path)
+            for feed_dict in feed_dicts[:num_warmup_runs]:
+                sess.run(fetches, feed_dict=feed_dict)
+            outputs = []
+            run_time = 0.
+            for feed_dict in feed_dicts:
+                start = time.time()
+                outputs.append(sess.run(fetches, feed_dict=feed_dict))
+                run_time += time.time() - start
+            resident_bytes = _resident_bytes()
+    if resident_bytes is not None:
+        resident_bytes -= start_resident_bytes
+    return outputs, {
+        'latency_ms': 1000. * run_time / len(feed_dicts),
+        'checkpoint_bytes': _checkpoint_bytes(checkpoint_path),
+        'weight_bytes': weight_bytes,
+        'resident_bytes': resident_bytes
+    }
+
+def _output_agreement(outputs, quantized_outputs):
+    num_equal = 0
+    num_total = 0
+    for output, quantized_output in zip(outputs, quantized_outputs):
+        for x, y in zip(nest.flatten(output), nest.flatten(quantized_output)):
+            x, y = np.asarray(x), np.asarray(y)
+            if x.shape != y.shape or not np.issubdtype(x.dtype, np.integer):
+                continue
+            num_equal += np.sum(x == y)
+            num_total += x.size
+    return float(num_equal) / num_total if num_total > 0 else None
+
+def evaluate_quantization(build_fn, checkpoint_path, quantized_checkpoint_path,
+                          feed_dicts=None, metric_fn=None, num_warmup_runs=1):
+    """Compares the float model with its int8-weight version on CPU, in
+    terms of evaluation metrics, latency, checkpoint size, and measured
+    memory.
+
+    Args:
+        build_fn (callable): A function that builds the inference graph,
+            including creating the modules, and returns the fetches to run,
+            e.g., the decoded sample ids. It is called once in a new graph
+            for each of the two models.
+        checkpoint_path (str): Path of the float checkpoint.
+        quantized_checkpoint_path (str): Path of the checkpoint created by
+            :func:`quantize_checkpoint` from :attr:`checkpoint_path`.
+        feed_dicts (list, optional): A list of feed dicts, one for each
+            evaluation batch. Since the graphs are built by
+            :attr:`build_fn`, the keys are tensor names, e.g.,
+            `{'source_ids:0': ...}`. If `None`, the fetches are run once
+            without feeding, e.g., when reading data with an iterator.
+        metric_fn (callable, optional): A function that takes the list of
+            fetched results of all batches and returns a dict of metrics,
+            e.g., accuracy and BLEU computed with
+            :func:`~texar.evals.accuracy` and
+            :func:`~texar.evals.corpus_bleu`.
+        num_warmup_runs (int): Number of leading batches that are run once
+            more before timing.
+
+    Returns:
+        A dict with keys "float" and "quantized", each a dict of the
+        metrics, "latency_ms" (mean per-batch latency), "checkpoint_bytes"
+        (total size of the variables in the checkpoint, excluding optimizer
+        slots), "weight_bytes"
+        (total size of the variables of the graph), and "resident_bytes"
+        (growth of the measured resident memory of the process from
+        before creating the session to after running all batches, or
+        `None` where it can not be measured), and key "delta" containing
+        the difference (quantized minus float) of each of these values. The
+        fraction of integer outputs (e.g., sample ids) of the quantized
+        model that equal those of the float model is in "output_agreement".
+    """
+    if feed_dicts is None:
+        feed_dicts = [None]
+    # The quantized model runs first, so that it can not reuse the memory
+    # freed by the float model
+    quantized_outputs, quantized_report = _run_inference(
+        build_fn, quantized_checkpoint_path, feed_dicts, True,
+        num_warmup_runs)
+    outputs, report = _run_inference(
+        build_fn, checkpoint_path, feed_dicts, False, num_warmup_runs)
+    if metric_fn is not None:
+        report.update(metric_fn(outputs))
+        quantized_report.update(metric_fn(quantized_outputs))
+
+    return {
+        'float': report,
+        'quantized': quantized_report,
+        'delta': {key: quantized_report[key] - report[key]
+                  for key in report if report[key] is not None},
+        'output_agreement': _output_agreement(outputs, quantized_outputs)
+    }
@@ -0,0 +1,103 @@
+"""
+Unit tests for int8 weight quantization.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=no-member
+
+import os
+import tempfile
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.utils import quantization
+from texar.modules.embedders.embedders import WordEmbedder
+
+class QuantizationTest(tf.test.TestCase):
+    """Tests int8 weight quantization.
+    """
+
+    def test_quantize_weights(self):
+        """Tests :func:`texar.utils.quantize_weights`.
+        """
+        value = np.random.randn(16, 8).astype(np.float32)
+        quantized, scale = quantization.quantize_weights(value)
+        self.assertEqual(quantized.dtype, np.int8)
+        self.assertEqual(scale.shape, (1, 8))
+        error = np.abs(quantization.dequantize_weights(quantized, scale)
+                       - value)
+        self.assertTrue(np.all(error <= scale / 2 + 1e-6))
+
+        _, scale = quantization.quantize_weights(value, channel_axis=0)
+        self.assertEqual(scale.shape, (16, 1))
+
+    def test_quantized_inference(self):
+        """Tests quantizing a checkpoint and running the quantized model.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        ckpt_path = os.path.join(tmp_dir, 'model.ckpt')
+        quantized_ckpt_path = os.path.join(tmp_dir, 'int8', 'model.ckpt')
+
+        def _build():
+            ids = tf.placeholder(tf.int32, [None, 5], name='ids')
+            embedder = WordEmbedder(vocab_size=100, hparams={'dim': 32})
+            outputs = tf.layers.dense(embedder(ids), 64)
+            return tf.argmax(outputs, axis=-1)
+
+        with tf.Graph().as_default():
+            _build()
+            # An optimizer slot, which is not quantized
+            tf.Variable(tf.zeros([32, 64]), name='dense/kernel/Adam')
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                tf.train.Saver().save(sess, ckpt_path)
+
+        info = quantization.quantize_checkpoint(ckpt_path, quantized_ckpt_path)
+        self.assertEqual(info['quantized_variables'],
+                         ['dense/kernel', 'word_embedder/w'])
+        self.assertLess(info['quantized_bytes'], info['original_bytes'] / 3)
+
+        feed_dicts = [{'ids:0': np.random.randint(100, size=[4, 5])}
+                      for _ in range(3)]
+        report = quantization.evaluate_quantization(
+            _build, ckpt_path, quantized_ckpt_path, feed_dicts=feed_dicts)
+        self.assertLess(report['quantized']['checkpoint_bytes'],
+                        report['float']['checkpoint_bytes'])
+        self.assertLess(report['quantized']['weight_bytes'],
+                        report['float']['weight_bytes'] / 3)
+        self.assertIn('resident_bytes', report['quantized'])
+        self.assertGreater(report['output_agreement'], 0.5)
+        self.assertIn('latency_ms', report['delta'])
+
+    def test_quantized_variables(self):
+        """Tests that modules in the quantized inference scope hold int8
+        weights.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        ckpt_path = os.path.join(tmp_dir, 'model.ckpt')
+        quantized_ckpt_path = os.path.join(tmp_dir, 'int8', 'model.ckpt')
+
+        with tf.Graph().as_default():
+            tf.layers.dense(tf.zeros([2, 32]), 64)
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                tf.train.Saver().save(sess, ckpt_path)
+        quantization.quantize_checkpoint(ckpt_path, quantized_ckpt_path)
+
+        with tf.Graph().as_default():
+            with quantization.quantized_inference_scope(quantized_ckpt_path):
+                tf.layers.dense(tf.zeros([2, 32]), 64)
+            dtypes = {v.op.name: v.dtype.base_dtype
+                      for v in tf.global_variables()}
+            self.assertEqual(dtypes['dense/kernel/quantized'], tf.int8)
+            self.assertEqual(dtypes['dense/kernel/quantization_scale'],
+                             tf.float32)
+            self.assertNotIn('dense/kernel', dtypes)
+
+if __name__ == "__main__":
+    tf.test.main()
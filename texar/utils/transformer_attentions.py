@@ -31,6 +31,7 @@ __all__ = [
     'attention_bias_lower_triangle',
     'attention_bias_ignore_padding',
     'attention_bias_local',
+    'attention_bias_segment',
 ]
 
 def attention_bias_lower_triangle(length, bias_value=-1e18):
@@ -85,6 +86,32 @@ def attention_bias_ignore_padding(memory_padding, bias_value=-1e18):
     ret = memory_padding * bias_value
     return tf.expand_dims(tf.expand_dims(ret, axis=1), axis=1)
 
+def attention_bias_segment(query_segment_ids, memory_segment_ids=None,
+                           bias_value=-1e18):
+    """Create an bias tensor to be added to attention logits for packed
+    sequences, so that a query only attends to memory positions of the
+    same segment. Segment id `0` denotes padding, which is never attended
+    to.
+
+    Args:
+        query_segment_ids: an int `Tensor` with shape
+            [batch, query_length].
+        memory_segment_ids (optional): an int `Tensor` with shape
+            [batch, memory_length]. If `None`, :attr:`query_segment_ids`
+            is used, i.e., for self attention.
+
+    Returns:
+        a `Tensor` with shape [batch, 1, query_length, memory_length].
+    """
+    if memory_segment_ids is None:
+        memory_segment_ids = query_segment_ids
+    same_segment = tf.equal(tf.expand_dims(query_segment_ids, 2),
+                            tf.expand_dims(memory_segment_ids, 1))
+    not_padding = tf.expand_dims(tf.not_equal(memory_segment_ids, 0), 1)
+    mask = tf.to_float(tf.logical_and(same_segment, not_padding))
+    ret = bias_value * (1.0 - mask)
+    return tf.expand_dims(ret, axis=1)
+
 def _ones_matrix_band_part(rows, cols, num_lower, num_upper,
     out_shape=None):
     """Matrix band part of ones.
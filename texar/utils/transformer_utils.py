@@ -23,6 +23,8 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 
+import numpy as np
+
 import tensorflow as tf
 
 # pylint: disable=invalid-name, too-many-arguments, too-many-locals
@@ -112,6 +114,126 @@ class PadRemover(object):
             )
         return x
 
+def pack_sequences(sequences, max_length, pad_id=0):
+    """Packs variable-length examples into fixed-length rows, so that
+    many short examples share one row instead of each being padded to
+    the maximum length of the batch.
+
+    Examples are placed greedily into the first row with enough room left
+    (first-fit). Examples in a row are distinguished by their segment ids,
+    which start from `1` in each row, and `0` denotes padding. Positions
+    restart from `0` at the beginning of each segment.
+
+    If each example is a tuple of sequences (e.g., a source and a target
+    sequence), the fields are packed into the same rows with the same
+    segment ids, so that segment `i` of the packed source corresponds to
+    segment `i` of the packed target.
+
+    Packing runs in Python on examples already read into memory, e.g.,
+    before feeding the rows through placeholders. The :mod:`texar.data`
+    modules do not pack examples or emit segment ids.
+
+    Example:
+
+        .. code-block:: python
+
+            ids, segment_ids, positions = pack_sequences(
+                [[4, 5, 6], [7, 8], [9]], max_length=4)
+            # ids == [[4, 5, 6, 9], [7, 8, 0, 0]]
+            # segment_ids == [[1, 1, 1, 2], [1, 1, 0, 0]]
+            # positions == [[0, 1, 2, 0], [0, 1, 0, 0]]
+
+    Args:
+        sequences: A list of examples, where each example is either a
+            list of token ids, or a tuple of lists of token ids (one for
+            each field).
+        max_length (int or list): Length of the packed rows. Can be a list
+            of one length for each field.
+        pad_id (int): The id used to pad the rows.
+
+    Returns:
+        A tuple `(ids, segment_ids, positions)` of int numpy arrays of
+        shape `[num_rows, max_length]`. If the examples are tuples, a list
+        of such tuples, one for each field.
+    """
+    if len(sequences) == 0:
+        raise ValueError('`sequences` must not be empty.')
+    is_tuple = isinstance(sequences[0], tuple)
+    examples = sequences if is_tuple else [(seq,) for seq in sequences]
+    num_fields = len(examples[0])
+    if not isinstance(max_length, (list, tuple)):
+        max_length = [max_length] * num_fields
+
+    rows = []
+    used = []
+    for example in examples:
+        lengths = [len(field) for field in example]
+        if any(l > m for l, m in zip(lengths, max_length)):
+            raise ValueError(
+                'Example of length {} does not fit in max_length {}.'.format(
+                    lengths, max_length))
+        for row, row_used in zip(rows, used):
+            if all(u + l <= m
+                   for u, l, m in zip(row_used, lengths, max_length)):
+                break
+        else:
+            row = []
+            row_used = [0] * num_fields
+            rows.append(row)
+            used.append(row_used)
+        row.append(example)
+        for i, length in enumerate(lengths):
+            row_used[i] += length
+
+    outputs = []
+    for i in range(num_fields):
+        ids = np.full([len(rows), max_length[i]], pad_id, dtype=np.int64)
+        segment_ids = np.zeros([len(rows), max_length[i]], dtype=np.int64)
+        positions = np.zeros([len(rows), max_length[i]], dtype=np.int64)
+        for r, row in enumerate(rows):
+            start = 0
+            for s, example in enumerate(row):
+                length = len(example[i])
+                ids[r, start:start+length] = example[i]
+                segment_ids[r, start:start+length] = s + 1
+                positions[r, start:start+length] = np.arange(length)
+                start += length
+        outputs.append((ids, segment_ids, positions))
+
+    return outputs if is_tuple else outputs[0]
+
+def get_segment_positions(segment_ids):
+    """Computes the positions of tokens within their segments from the
+    segment ids of packed sequences.
+
+    The tokens of each segment must be contiguous, and `0` denotes
+    padding, as produced by :func:`pack_sequences`. Padding can be
+    anywhere in a row, e.g., between segments, and segments can be
+    numbered in any order.
+
+    Args:
+        segment_ids: An int Tensor of shape `[batch_size, length]`.
+
+    Returns:
+        An int Tensor of shape `[batch_size, length]`. Padding positions
+        are `0`.
+    """
+    with tf.name_scope("segment_positions"):
+        segment_ids = tf.to_int32(segment_ids)
+        length = tf.shape(segment_ids)[1]
+        num_segments = tf.reduce_max(segment_ids) + 1
+        # [batch_size, length, num_segments]
+        one_hot = tf.one_hot(segment_ids, num_segments, dtype=tf.int32)
+        indexes = tf.reshape(tf.range(length), [1, -1, 1])
+        # Index of the first token of each segment, `[batch_size,
+        # num_segments]`
+        starts = tf.reduce_min(
+            one_hot * indexes + (1 - one_hot) * length, axis=1)
+        token_starts = tf.reduce_sum(
+            one_hot * tf.expand_dims(starts, 1), axis=2)
+        positions = tf.range(length) - token_starts
+        return positions * tf.to_int32(tf.not_equal(segment_ids, 0))
+
 def embedding_to_padding(emb):
     """Calculates the padding mask based on which embeddings are all zero.
     We have hacked symbol_modality to return all-zero embeddings
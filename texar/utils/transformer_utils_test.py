@@ -0,0 +1,82 @@
+"""
+Unit tests for Transformer utility functions.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# pylint: disable=no-member
+
+import numpy as np
+
+import tensorflow as tf
+
+from texar.utils import transformer_utils
+from texar.utils import transformer_attentions as attn
+
+class TransformerUtilsTest(tf.test.TestCase):
+    """Tests Transformer utility functions.
+    """
+
+    def test_pack_sequences(self):
+        """Tests :func:`texar.utils.transformer_utils.pack_sequences`.
+        """
+        ids, segment_ids, positions = transformer_utils.pack_sequences(
+            [[4, 5, 6], [7, 8], [9]], max_length=4)
+        np.testing.assert_array_equal(ids, [[4, 5, 6, 9], [7, 8, 0, 0]])
+        np.testing.assert_array_equal(
+            segment_ids, [[1, 1, 1, 2], [1, 1, 0, 0]])
+        np.testing.assert_array_equal(
+            positions, [[0, 1, 2, 0], [0, 1, 0, 0]])
+
+        src, tgt = transformer_utils.pack_sequences(
+            [([1, 2], [3]), ([4], [5, 6, 7])], max_length=[3, 3])
+        np.testing.assert_array_equal(src[0], [[1, 2, 0], [4, 0, 0]])
+        np.testing.assert_array_equal(tgt[0], [[3, 0, 0], [5, 6, 7]])
+
+        with self.assertRaises(ValueError):
+            transformer_utils.pack_sequences([[1, 2, 3]], max_length=2)
+
+    def test_get_segment_positions(self):
+        """Tests :func:`texar.utils.transformer_utils.get_segment_positions`.
+        """
+        _, segment_ids, positions = transformer_utils.pack_sequences(
+            [[4, 5, 6], [7, 8], [9], [1, 2, 3, 4]], max_length=5)
+        positions_t = transformer_utils.get_segment_positions(segment_ids)
+        with self.test_session() as sess:
+            positions_ = sess.run(positions_t)
+            np.testing.assert_array_equal(positions_, positions)
+
+    def test_get_segment_positions_inner_padding(self):
+        """Tests :func:`texar.utils.transformer_utils.get_segment_positions`
+        with padding between segments and unordered segment ids.
+        """
+        segment_ids = [[2, 2, 0, 1, 1, 1, 0, 3],
+                       [0, 1, 1, 0, 0, 2, 2, 2]]
+        positions_t = transformer_utils.get_segment_positions(segment_ids)
+        with self.test_session() as sess:
+            positions_ = sess.run(positions_t)
+            np.testing.assert_array_equal(
+                positions_, [[0, 1, 0, 0, 1, 2, 0, 0],
+                             [0, 0, 1, 0, 0, 0, 1, 2]])
+
+    def test_attention_bias_segment(self):
+        """Tests
+        :func:`texar.utils.transformer_attentions.attention_bias_segment`.
+        """
+        segment_ids = tf.constant([[1, 1, 2, 0]])
+        bias = attn.attention_bias_segment(segment_ids)
+        with self.test_session() as sess:
+            bias_ = sess.run(bias)
+            self.assertEqual(bias_.shape, (1, 1, 4, 4))
+            allowed = bias_[0, 0] == 0
+            np.testing.assert_array_equal(
+                allowed,
+                [[True, True, False, False],
+                 [True, True, False, False],
+                 [False, False, True, False],
+                 [False, False, False, False]])
+
+if __name__ == "__main__":
+    tf.test.main()